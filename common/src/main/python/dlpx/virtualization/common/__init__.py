@@ -5,3 +5,4 @@
 __path__ = __import__('pkgutil').extend_path(__path__, __name__)
 
 from dlpx.virtualization.common._common_classes import *
+from dlpx.virtualization.common._deadline import *
@@ -11,16 +11,141 @@ This module defines the non autogenerated classes used as input/output for
 plugin operations. These are used instead of protobuf generated classes to
 hide the implemenatation details for protobufs and also to provide the
 correct types.
+
+Instances are immutable once built, and are compared and hashed by the
+values of their fields, so they can be used as dict keys. Every plugin
+operation converts the connections and environments of its request with
+from_proto, and they are almost always the same few. So from_proto interns
+what it builds: equal protobuf messages convert to the same shared instance,
+until the intern table of that class holds _MAX_INTERNED instances and
+starts over. Objects built with the constructors are never interned. Two
+objects may therefore describe the same connection without being the same
+object, so compare them with == rather than is.
+
+RemoteConnection and RemoteEnvironment also build their protobuf message
+once and copy it into every message they are converted into afterwards, as
+the same connection is usually passed to many library calls.
 """
 
 __all__ = [
     "RemoteConnection",
     "RemoteEnvironment",
     "RemoteHost",
-    "RemoteUser"]
+    "RemoteUser",
+    "ValueObject"]
+
+
+class ValueObject(object):
+    """Base of the immutable classes that are compared by value, here and in
+    dlpx.virtualization.platform.
+
+    Subclasses keep their fields in __slots__, expose them through read-only
+    properties and return their values, in the order of the constructor's
+    arguments, from _values().
+    """
+    __slots__ = ()
+
+    def _values(self):
+        raise NotImplementedError
+
+    def _hash_values(self):
+        """Returns the values the hash is computed from, all of them by
+        default. Subclasses with unhashable fields return a subset.
+        """
+        return self._values()
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    def __hash__(self):
+        return hash(self._hash_values())
+
+    def __reduce__(self):
+        # Without a __dict__, instances are pickled by calling the
+        # constructor again.
+        return type(self), self._values()
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__,
+                               ', '.join(repr(v) for v in self._values()))
+
+
+# The maximum number of instances of each class interned by from_proto.
+_MAX_INTERNED = 1024
+
+
+class _InternTable(object):
+    """The instances built by the from_proto method of one class, keyed by
+    the tuple of the fields of the message they were built from.
+
+    When full, the table is emptied rather than tracking which instances are
+    least recently used, which keeps lookups as cheap as a dict lookup.
+    Concurrent from_proto calls may build the same instance twice, which is
+    harmless as the instances are immutable.
+    """
+
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._instances = {}
+
+    def __len__(self):
+        return len(self._instances)
+
+    def get(self, key):
+        return self._instances.get(key)
+
+    def add(self, key, instance):
+        if len(self._instances) >= self._max_size:
+            self._instances.clear()
+        self._instances[key] = instance
+        return instance
+
+    def clear(self):
+        self._instances.clear()
+
+
+def _host_key(host):
+    return host.name, host.reference, host.binary_path, host.scratch_path
+
+
+def _user_key(user):
+    return user.name, user.reference
 
 
-class RemoteConnection(object):
+def _environment_key(environment):
+    return (environment.name, environment.reference) + _host_key(
+        environment.host)
+
+
+def _connection_key(connection):
+    return _environment_key(connection.environment) + _user_key(
+        connection.user)
+
+
+_INTERNED_CONNECTIONS = _InternTable(_MAX_INTERNED)
+_INTERNED_ENVIRONMENTS = _InternTable(_MAX_INTERNED)
+_INTERNED_HOSTS = _InternTable(_MAX_INTERNED)
+_INTERNED_USERS = _InternTable(_MAX_INTERNED)
+
+
+def _clear_interned():
+    """Empties the intern tables of every class."""
+    for table in (_INTERNED_CONNECTIONS, _INTERNED_ENVIRONMENTS,
+                  _INTERNED_HOSTS, _INTERNED_USERS):
+        table.clear()
+
+
+class RemoteConnection(ValueObject):
     """Plugin class for RemoteConnection to be used for plugin operations
     and library functions.
 
@@ -32,6 +157,8 @@ class RemoteConnection(object):
         user: RemoteUser of this RemoteConnection.
 
     """
+    __slots__ = ('__environment', '__user', '__proto')
+
     def __init__(self, environment, user):
         if isinstance(environment, RemoteEnvironment):
             self.__environment = environment
@@ -50,6 +177,7 @@ class RemoteConnection(object):
                 'user',
                 type(user),
                 RemoteUser)
+        self.__proto = None
 
     @property
     def environment(self):
@@ -59,17 +187,31 @@ class RemoteConnection(object):
     def user(self):
         return self.__user
 
-    def to_proto(self):
+    def _values(self):
+        return self.__environment, self.__user
+
+    def to_proto(self, remote_connection=None):
         """Converts plugin class RemoteConnection to protobuf class common_pb2.RemoteConnection
+
+        If remote_connection is given, typically a field of a request, it is
+        filled in place and returned instead of building a new message.
         """
-        remote_connection = common_pb2.RemoteConnection()
-        remote_connection.environment.CopyFrom(self.environment.to_proto())
-        remote_connection.user.CopyFrom(self.user.to_proto())
+        proto = self.__proto
+        if proto is None:
+            proto = common_pb2.RemoteConnection()
+            self.environment.to_proto(proto.environment)
+            self.user.to_proto(proto.user)
+            self.__proto = proto
+        if remote_connection is None:
+            remote_connection = common_pb2.RemoteConnection()
+        remote_connection.CopyFrom(proto)
         return remote_connection
 
     @staticmethod
     def from_proto(connection):
         """Converts protobuf class common_pb2.RemoteConnection to plugin class RemoteConnection
+
+        Equal messages convert to the same shared instance.
         """
         if not isinstance(connection, common_pb2.RemoteConnection):
             raise IncorrectTypeError(
@@ -77,12 +219,17 @@ class RemoteConnection(object):
                 'connection',
                 type(connection),
                 common_pb2.RemoteConnection)
+        key = _connection_key(connection)
+        remote_connection = _INTERNED_CONNECTIONS.get(key)
+        if remote_connection is not None:
+            return remote_connection
         environment = RemoteEnvironment.from_proto(connection.environment)
         user = RemoteUser.from_proto(connection.user)
-        return RemoteConnection(environment=environment, user=user)
+        return _INTERNED_CONNECTIONS.add(
+            key, RemoteConnection(environment=environment, user=user))
 
 
-class RemoteEnvironment(object):
+class RemoteEnvironment(ValueObject):
     """Plugin class for RemoteEnvironment to be used for plugin operations
     and library functions.
 
@@ -94,7 +241,12 @@ class RemoteEnvironment(object):
         reference: Reference of the RemoteEnvironment.
         host: RemoteHost of the RemoteEnvironment.
 
+    Like every field, host is read-only: from_proto shares instances, so
+    assigning it raises AttributeError rather than changing other
+    operations' environments.
     """
+    __slots__ = ('__name', '__reference', '__host', '__proto')
+
     def __init__(self, name, reference, host):
         if not isinstance(name, basestring):
             raise IncorrectTypeError(
@@ -112,13 +264,14 @@ class RemoteEnvironment(object):
         self.__reference = reference
 
         if isinstance(host, RemoteHost):
-            self.host = host
+            self.__host = host
         else:
             raise IncorrectTypeError(
                 RemoteEnvironment,
                 'host',
                 type(host),
                 RemoteHost)
+        self.__proto = None
 
     @property
     def name(self):
@@ -128,18 +281,36 @@ class RemoteEnvironment(object):
     def reference(self):
         return self.__reference
 
-    def to_proto(self):
+    @property
+    def host(self):
+        return self.__host
+
+    def _values(self):
+        return self.__name, self.__reference, self.__host
+
+    def to_proto(self, remote_environment=None):
         """Converts plugin class RemoteEnvironment to protobuf class common_pb2.RemoteEnvironment
+
+        If remote_environment is given, typically a field of a response, it
+        is filled in place and returned instead of building a new message.
         """
-        remote_environment = common_pb2.RemoteEnvironment()
-        remote_environment.name = self.name
-        remote_environment.reference = self.reference
-        remote_environment.host.CopyFrom(self.host.to_proto())
+        proto = self.__proto
+        if proto is None:
+            proto = common_pb2.RemoteEnvironment()
+            proto.name = self.name
+            proto.reference = self.reference
+            self.host.to_proto(proto.host)
+            self.__proto = proto
+        if remote_environment is None:
+            remote_environment = common_pb2.RemoteEnvironment()
+        remote_environment.CopyFrom(proto)
         return remote_environment
 
     @staticmethod
     def from_proto(environment):
         """Converts protobuf class common_pb2.RemoteEnvironment to plugin class RemoteEnvironment
+
+        Equal messages convert to the same shared instance.
         """
         if not isinstance(environment, common_pb2.RemoteEnvironment):
             raise IncorrectTypeError(
@@ -147,12 +318,17 @@ class RemoteEnvironment(object):
                 'environment',
                 type(environment),
                 common_pb2.RemoteEnvironment)
-        return RemoteEnvironment(name=environment.name,
-                                 reference=environment.reference,
-                                 host=RemoteHost.from_proto(environment.host))
+        key = _environment_key(environment)
+        remote_environment = _INTERNED_ENVIRONMENTS.get(key)
+        if remote_environment is not None:
+            return remote_environment
+        return _INTERNED_ENVIRONMENTS.add(key, RemoteEnvironment(
+            name=environment.name,
+            reference=environment.reference,
+            host=RemoteHost.from_proto(environment.host)))
 
 
-class RemoteHost(object):
+class RemoteHost(ValueObject):
     """Plugin class for RemoteHost to be used for plugin operations
     and library functions.
 
@@ -166,6 +342,8 @@ class RemoteHost(object):
         scratch_path: scratch path of the RemoteHost.
 
     """
+    __slots__ = ('__name', '__reference', '__binary_path', '__scratch_path')
+
     def __init__(self, name, reference, binary_path, scratch_path):
         if not isinstance(name, basestring):
             raise IncorrectTypeError(
@@ -212,10 +390,17 @@ class RemoteHost(object):
     def scratch_path(self):
         return self.__scratch_path
 
-    def to_proto(self):
+    def _values(self):
+        return (self.__name, self.__reference, self.__binary_path,
+                self.__scratch_path)
+
+    def to_proto(self, remote_host=None):
         """Converts plugin class RemoteHost to protobuf class common_pb2.RemoteHost
+
+        If remote_host is given, it is filled in place and returned.
         """
-        remote_host = common_pb2.RemoteHost()
+        if remote_host is None:
+            remote_host = common_pb2.RemoteHost()
         remote_host.name = self.name
         remote_host.reference = self.reference
         remote_host.binary_path = self.binary_path
@@ -225,6 +410,8 @@ class RemoteHost(object):
     @staticmethod
     def from_proto(host):
         """Converts protobuf class common_pb2.RemoteHost to plugin class RemoteHost
+
+        Equal messages convert to the same shared instance.
         """
         if not isinstance(host, common_pb2.RemoteHost):
             raise IncorrectTypeError(
@@ -232,13 +419,14 @@ class RemoteHost(object):
                 'host',
                 type(host),
                 common_pb2.RemoteHost)
-        return RemoteHost(name=host.name,
-                          reference=host.reference,
-                          binary_path=host.binary_path,
-                          scratch_path=host.scratch_path)
+        key = _host_key(host)
+        remote_host = _INTERNED_HOSTS.get(key)
+        if remote_host is not None:
+            return remote_host
+        return _INTERNED_HOSTS.add(key, RemoteHost(*key))
 
 
-class RemoteUser(object):
+class RemoteUser(ValueObject):
     """Plugin class for RemoteUser to be used for plugin operations
     and library functions.
 
@@ -249,6 +437,8 @@ class RemoteUser(object):
         name: Name of the RemoteUser.
         reference: Reference of the RemoteUser.
     """
+    __slots__ = ('__name', '__reference')
+
     def __init__(self, name, reference):
         if not isinstance(name, basestring):
             raise IncorrectTypeError(
@@ -273,10 +463,16 @@ class RemoteUser(object):
     def reference(self):
         return self.__reference
 
-    def to_proto(self):
+    def _values(self):
+        return self.__name, self.__reference
+
+    def to_proto(self, remote_user=None):
         """Converts plugin class RemoteUser to protobuf class common_pb2.RemoteUser
+
+        If remote_user is given, it is filled in place and returned.
         """
-        remote_user = common_pb2.RemoteUser()
+        if remote_user is None:
+            remote_user = common_pb2.RemoteUser()
         remote_user.name = self.name
         remote_user.reference = self.reference
         return remote_user
@@ -284,6 +480,8 @@ class RemoteUser(object):
     @staticmethod
     def from_proto(user):
         """Converts protobuf class common_pb2.RemoteUser to plugin class RemoteUser
+
+        Equal messages convert to the same shared instance.
         """
         if not isinstance(user, common_pb2.RemoteUser):
             raise IncorrectTypeError(
@@ -291,5 +489,8 @@ class RemoteUser(object):
                 'user',
                 type(user),
                 common_pb2.RemoteUser)
-        remote_user = RemoteUser(name=user.name, reference=user.reference)
-        return remote_user
+        key = _user_key(user)
+        remote_user = _INTERNED_USERS.get(key)
+        if remote_user is not None:
+            return remote_user
+        return _INTERNED_USERS.add(key, RemoteUser(*key))
@@ -0,0 +1,70 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Deadlines of plugin operations
+
+An operation may have to finish by a deadline, so that a remote command that
+hangs doesn't hold the engine's workers forever. The platform sets the
+deadline of the operation running on a thread, and the libs calls made by
+the operation pass the time left as the timeout of their remote command.
+Once it has passed, they raise
+dlpx.virtualization.libs.exceptions.DeadlineExceededError instead.
+
+Plugin code can read the deadline to stop early or split its work:
+
+  from dlpx.virtualization.common import remaining_time
+
+  left = remaining_time()
+  if left is not None and left < 60:
+    ...
+
+Deadlines are times as returned by time.time(). They belong to the thread
+running the operation; work handed to other threads doesn't see it unless it
+runs within deadline_scope(current_deadline()).
+"""
+
+import contextlib
+import threading
+import time
+
+__all__ = [
+    "current_deadline",
+    "remaining_time"]
+
+_local = threading.local()
+
+
+def current_deadline():
+    """Returns the time by which the operation running on this thread must
+    finish, or None if it has no deadline.
+    """
+    return getattr(_local, 'deadline', None)
+
+
+def remaining_time():
+    """Returns the seconds left before the deadline of the operation running
+    on this thread, negative once it has passed, or None if it has no
+    deadline.
+    """
+    deadline = getattr(_local, 'deadline', None)
+    if deadline is None:
+        return None
+    return deadline - time.time()
+
+
+@contextlib.contextmanager
+def deadline_scope(deadline):
+    """Runs the body with the given deadline, or the current one if it is
+    earlier. The previous deadline is restored on the way out. A deadline of
+    None leaves the current one in place.
+    """
+    previous = getattr(_local, 'deadline', None)
+    if deadline is None or (previous is not None and previous <= deadline):
+        yield
+        return
+    _local.deadline = deadline
+    try:
+        yield
+    finally:
+        _local.deadline = previous
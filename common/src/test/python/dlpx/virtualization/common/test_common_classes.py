@@ -2,8 +2,11 @@
 # Copyright (c) 2019 by Delphix. All rights reserved.
 #
 
+import pickle
+
 import pytest
 from dlpx.virtualization import common_pb2
+from dlpx.virtualization.common import _common_classes
 from dlpx.virtualization.common._common_classes import (RemoteConnection, RemoteEnvironment, RemoteHost, RemoteUser)
 from dlpx.virtualization.common.exceptions import IncorrectTypeError
 
@@ -51,6 +54,28 @@ class TestRemoteConnection:
         remote_connection_proto = remote_connection.to_proto()
         assert isinstance(remote_connection_proto, common_pb2.RemoteConnection)
 
+    @staticmethod
+    def test_remote_connection_to_proto_in_place(remote_user,
+                                                 remote_environment):
+        remote_connection = RemoteConnection(remote_environment, remote_user)
+        request = common_pb2.RemoteConnection()
+        assert remote_connection.to_proto(request) is request
+        assert request == remote_connection.to_proto()
+        assert request.environment.host.scratch_path == 'scratch_path'
+        assert request.user.reference == 'user-reference'
+
+    @staticmethod
+    def test_remote_connection_to_proto_overwrites(remote_user,
+                                                   remote_environment):
+        remote_connection = RemoteConnection(remote_environment, remote_user)
+        remote_connection.to_proto()
+        request = common_pb2.RemoteConnection()
+        request.environment.host.name = 'other'
+        request.user.name = 'other'
+        remote_connection.to_proto(request)
+        assert request == remote_connection.to_proto()
+        assert request.environment.host.name == 'host'
+
     @staticmethod
     def test_remote_connection_from_proto_success():
         remote_conn_proto_buf = common_pb2.RemoteConnection()
@@ -103,6 +128,24 @@ class TestRemoteEnvironment:
         remote_env_proto = remote_env.to_proto()
         assert isinstance(remote_env_proto, common_pb2.RemoteEnvironment)
 
+    @staticmethod
+    def test_remote_environment_to_proto_copies(remote_host):
+        remote_env = RemoteEnvironment('name', 'reference', remote_host)
+        first = remote_env.to_proto()
+        first.host.name = 'changed'
+        second = remote_env.to_proto()
+        assert second is not first
+        assert second.host.name == 'host'
+
+    @staticmethod
+    def test_remote_environment_to_proto_in_place(remote_host):
+        remote_env = RemoteEnvironment('name', 'reference', remote_host)
+        mount = common_pb2.RemoteConnection()
+        assert remote_env.to_proto(mount.environment) is mount.environment
+        assert mount.HasField('environment')
+        assert mount.environment == remote_env.to_proto()
+        assert mount.environment.host.binary_path == 'binary_path'
+
     @staticmethod
     def test_remote_environment_from_proto_success():
         remote_env_proto_buf = common_pb2.RemoteEnvironment()
@@ -222,3 +265,120 @@ class TestRemoteUser:
             "RemoteUser's parameter 'user' was"
             " type 'str' but should be of class 'dlpx.virtualization"
             ".common_pb2.RemoteUser'.")
+
+
+class TestInterning:
+    @staticmethod
+    @pytest.fixture(autouse=True)
+    def clear_interned():
+        _common_classes._clear_interned()
+        yield
+        _common_classes._clear_interned()
+
+    @staticmethod
+    @pytest.fixture
+    def connection_proto(remote_user, remote_environment):
+        return RemoteConnection(remote_environment, remote_user).to_proto()
+
+    @staticmethod
+    def test_equal_protos_share_instance(connection_proto):
+        other_proto = common_pb2.RemoteConnection()
+        other_proto.CopyFrom(connection_proto)
+
+        connection = RemoteConnection.from_proto(connection_proto)
+        assert RemoteConnection.from_proto(other_proto) is connection
+        assert (RemoteEnvironment.from_proto(connection_proto.environment)
+                is connection.environment)
+        assert (RemoteHost.from_proto(connection_proto.environment.host)
+                is connection.environment.host)
+        assert RemoteUser.from_proto(connection_proto.user) is connection.user
+
+    @staticmethod
+    def test_different_protos_not_shared(connection_proto):
+        connection = RemoteConnection.from_proto(connection_proto)
+        connection_proto.environment.host.scratch_path = 'other_path'
+        other = RemoteConnection.from_proto(connection_proto)
+
+        assert other is not connection
+        assert other.environment.host.scratch_path == 'other_path'
+        assert connection.environment.host.scratch_path == 'scratch_path'
+        assert other.user is connection.user
+
+    @staticmethod
+    def test_constructed_not_interned(remote_host):
+        environment = RemoteEnvironment('name', 'reference', remote_host)
+        assert RemoteEnvironment.from_proto(
+            environment.to_proto()) is not environment
+        assert len(_common_classes._INTERNED_ENVIRONMENTS) == 1
+
+    @staticmethod
+    def test_intern_table_starts_over_when_full(monkeypatch):
+        table = _common_classes._InternTable(2)
+        monkeypatch.setattr(_common_classes, '_INTERNED_USERS', table)
+        users = [common_pb2.RemoteUser(name='user{}'.format(i))
+                 for i in range(3)]
+
+        first = RemoteUser.from_proto(users[0])
+        RemoteUser.from_proto(users[1])
+        assert RemoteUser.from_proto(users[0]) is first
+        RemoteUser.from_proto(users[2])
+        assert len(table) == 1
+        assert RemoteUser.from_proto(users[0]) is not first
+
+    @staticmethod
+    def test_host_read_only(remote_host, remote_environment):
+        with pytest.raises(AttributeError):
+            remote_environment.host = remote_host
+
+
+class TestValueSemantics:
+    @staticmethod
+    def connection(scratch_path='scratch_path'):
+        host = RemoteHost('host', 'host-reference', 'binary_path',
+                          scratch_path)
+        return RemoteConnection(
+            RemoteEnvironment('environment', 'environment-reference', host),
+            RemoteUser('user', 'user-reference'))
+
+    @staticmethod
+    def test_equal_by_value():
+        connection = TestValueSemantics.connection()
+        other = TestValueSemantics.connection()
+        assert connection is not other
+        assert connection == other
+        assert not connection != other
+        assert hash(connection) == hash(other)
+        assert connection.environment.host == other.environment.host
+
+    @staticmethod
+    def test_not_equal():
+        connection = TestValueSemantics.connection()
+        assert connection != TestValueSemantics.connection('other_path')
+        assert connection.user != RemoteUser('user', 'other-reference')
+        assert connection != connection.to_proto()
+        assert connection.user != ('user', 'user-reference')
+
+    @staticmethod
+    def test_dict_key():
+        hosts = {TestValueSemantics.connection(): 'value'}
+        assert hosts[TestValueSemantics.connection()] == 'value'
+        assert TestValueSemantics.connection('other_path') not in hosts
+
+    @staticmethod
+    def test_immutable(remote_user):
+        with pytest.raises(AttributeError):
+            remote_user.name = 'other'
+        with pytest.raises(AttributeError):
+            remote_user.other = 'other'
+        assert not hasattr(remote_user, '__dict__')
+
+    @staticmethod
+    def test_pickle():
+        connection = TestValueSemantics.connection()
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            assert pickle.loads(pickle.dumps(connection, protocol)) == (
+                connection)
+
+    @staticmethod
+    def test_repr(remote_user):
+        assert repr(remote_user) == "RemoteUser('user', 'user-reference')"
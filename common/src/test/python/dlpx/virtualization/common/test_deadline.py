@@ -0,0 +1,63 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+import threading
+import time
+
+from dlpx.virtualization.common._deadline import (current_deadline,
+                                                  deadline_scope,
+                                                  remaining_time)
+
+
+class TestDeadline:
+    @staticmethod
+    def test_no_deadline():
+        assert current_deadline() is None
+        assert remaining_time() is None
+
+    @staticmethod
+    def test_deadline_scope():
+        deadline = time.time() + 30
+        with deadline_scope(deadline):
+            assert current_deadline() == deadline
+            assert 0 < remaining_time() <= 30
+        assert current_deadline() is None
+
+    @staticmethod
+    def test_passed_deadline():
+        with deadline_scope(time.time() - 10):
+            assert remaining_time() <= -10
+
+    @staticmethod
+    def test_earliest_deadline_applies():
+        earlier = time.time() + 10
+        later = earlier + 10
+        with deadline_scope(later):
+            with deadline_scope(earlier):
+                assert current_deadline() == earlier
+            with deadline_scope(later + 10):
+                assert current_deadline() == later
+            with deadline_scope(None):
+                assert current_deadline() == later
+            assert current_deadline() == later
+
+    @staticmethod
+    def test_restored_on_error():
+        deadline = time.time() + 30
+        try:
+            with deadline_scope(deadline):
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+        assert current_deadline() is None
+
+    @staticmethod
+    def test_per_thread():
+        seen = []
+        with deadline_scope(time.time() + 30):
+            thread = threading.Thread(
+                target=lambda: seen.append(current_deadline()))
+            thread.start()
+            thread.join()
+        assert seen == [None]
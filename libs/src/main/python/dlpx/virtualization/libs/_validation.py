@@ -0,0 +1,150 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Argument validation of the libs wrappers
+
+Each wrapper declares the types of its arguments once, in the notation of
+IncorrectArgumentTypeError's expected_type:
+
+  _validate_run_sync = compile_validator('run_sync', [
+      ('remote_connection', RemoteConnection),
+      ('source_directory', basestring),
+      ('rsync_user', basestring, False),
+      ('exclude_paths', [basestring], False)])
+
+A type means an instance of it, [type] a list whose items are instances of
+type, and {key_type: value_type} a dict whose keys and values are instances
+of key_type and value_type. Arguments are required unless declared with
+False, in which case they may also be any false value, such as their
+default of None.
+
+compile_validator generates the source of one function checking every
+argument with inline isinstance checks, so validating costs no more than
+checks written by hand. The items of lists and dicts, such as large
+variables maps, are checked by their distinct types rather than one by one.
+An invalid argument raises the same IncorrectArgumentTypeError as the checks
+previously written out in each wrapper.
+
+The items of tuples in a list argument, such as the commands of
+run_bash_parallel, are declared the same way with item_of. Errors then name
+the position of the invalid value, e.g. commands[2][0].
+"""
+
+import re
+from itertools import imap
+
+from dlpx.virtualization.libs.exceptions import IncorrectArgumentTypeError
+
+_IDENTIFIER = re.compile(r'^[a-z][a-z0-9_]*$')
+
+
+def _fail(func_name, name, value, expected, required):
+    raise IncorrectArgumentTypeError(
+        name, type(value), expected, required, func_name)
+
+
+def _fail_items(func_name, name, value, expected, required):
+    if isinstance(value, dict):
+        actual = {(type(key), type(item)) for key, item in value.items()}
+    else:
+        actual = [type(item) for item in value]
+    raise IncorrectArgumentTypeError(
+        name, actual, expected, required, func_name)
+
+
+def _checks(index, name, label, expected, required):
+    """Returns the lines of source checking one argument, named in errors by
+    the source expression label. The generated function finds expected_type
+    as _e<index> and the types to check as _t<index>, or _k<index> and
+    _v<index> for a dict.
+    """
+    fail = ('_fail(_func_name, {}, {}, _e{}, {})'
+            .format(label, name, index, required))
+    fail_items = ('_fail_items(_func_name, {}, {}, _e{}, {})'
+                  .format(label, name, index, required))
+    # The items of lists and dicts are checked by the distinct types they
+    # have, which are gathered without running Python code per item.
+    if isinstance(expected, list):
+        checks = [
+            'if not isinstance({}, list):'.format(name),
+            '    ' + fail,
+            'for _type in set(_imap(type, {})):'.format(name),
+            '    if not issubclass(_type, _t{}):'.format(index),
+            '        ' + fail_items]
+    elif isinstance(expected, dict):
+        checks = [
+            'if not isinstance({}, dict):'.format(name),
+            '    ' + fail,
+            'for _type in set(_imap(type, {})):'.format(name),
+            '    if not issubclass(_type, _k{}):'.format(index),
+            '        ' + fail_items,
+            'for _type in set(_imap(type, {}.itervalues())):'.format(name),
+            '    if not issubclass(_type, _v{}):'.format(index),
+            '        ' + fail_items]
+    else:
+        checks = [
+            'if not isinstance({}, _t{}):'.format(name, index),
+            '    ' + fail]
+    if required:
+        return checks
+    return ['if {}:'.format(name)] + ['    ' + check for check in checks]
+
+
+def compile_validator(func_name, arguments, item_of=None):
+    """Returns a function checking the types of the arguments of a libs
+    function.
+
+    Args:
+        func_name (str): The name of the libs function, used in errors.
+        arguments (list of tuple): The (name, expected_type) or (name,
+            expected_type, required) of each argument to check.
+        item_of (str): If set, the arguments are the items of a tuple in
+            the list argument of this name. The function then also takes
+            the index of the tuple in the list, and errors name the values
+            by their position, e.g. commands[2][0].
+
+    Returns:
+        function: Takes the arguments, in the order they were declared, and
+        raises IncorrectArgumentTypeError for the first invalid one.
+    """
+    namespace = {
+        '_fail': _fail,
+        '_fail_items': _fail_items,
+        '_imap': imap,
+        '_func_name': func_name
+    }
+    names = []
+    lines = []
+    for index, argument in enumerate(arguments):
+        name, expected = argument[:2]
+        required = argument[2] if len(argument) > 2 else True
+        if not _IDENTIFIER.match(name):
+            raise ValueError(
+                'Invalid argument name {!r}'.format(name))
+        names.append(name)
+        if item_of is None:
+            label = repr(name)
+        else:
+            label = '{!r}.format(_index)'.format(
+                '{}[{{}}][{}]'.format(item_of, index))
+        namespace['_e{}'.format(index)] = expected
+        if isinstance(expected, list):
+            namespace['_t{}'.format(index)] = expected[0]
+        elif isinstance(expected, dict):
+            key_type, value_type = expected.items()[0]
+            namespace['_k{}'.format(index)] = key_type
+            namespace['_v{}'.format(index)] = value_type
+        else:
+            namespace['_t{}'.format(index)] = expected
+        lines.extend('    ' + line for line in
+                     _checks(index, name, label, expected, required))
+    if item_of is not None:
+        names.append('_index')
+
+    source = '\n'.join(
+        ['def validate({}):'.format(', '.join(names))] + lines +
+        ['    pass', ''])
+    exec(compile(source, '<{} validation>'.format(func_name), 'exec'),
+         namespace)
+    return namespace['validate']
@@ -50,6 +50,30 @@ class PluginScriptError(Exception):
         super(PluginScriptError, self).__init__(message)
 
 
+class DeadlineExceededError(Exception):
+    """Plugin-catchable exception
+
+    This exception will be thrown whenever a library call is made after the
+    deadline of the operation has passed, or fails once it has passed, most
+    likely because its command was stopped when it ran out of time.
+
+    Attributes:
+    message - A localized user-readable message.
+    """
+
+    @property
+    def message(self):
+        return self.args[0]
+
+    def __init__(self, func_name, overdue, ran):
+        message = ('The deadline of the operation passed {:.1f} seconds ago,'
+                   ' {} {}.'.format(
+                       overdue,
+                       ('before', 'while')[ran],
+                       func_name))
+        super(DeadlineExceededError, self).__init__(message)
+
+
 class IncorrectArgumentTypeError(PluginRuntimeError):
     """IncorrectArgumentTypeError is thrown when a library function gets
     called with an argument that has an incorrect type.
@@ -61,6 +85,8 @@ class IncorrectArgumentTypeError(PluginRuntimeError):
             for the parameter
         expected_type (Type): The type of the parameter that is expected.
         required (bool): If the parameter is required (doesn't have a default)
+        func_name (str): The name of the library function. Defaults to the
+            name of the function creating the error.
 
     Attributes:
         message (str): A user-readable message describing the exception.
@@ -71,12 +97,14 @@ class IncorrectArgumentTypeError(PluginRuntimeError):
         parameter_name,
         actual_type,
         expected_type,
-        required=True):
+        required=True,
+        func_name=None):
         actual, expected = self.get_actual_and_expected_type(
             actual_type, expected_type)
 
-        # Get the name of the function that is throwning this error.
-        func_name = sys._getframe(1).f_code.co_name
+        if func_name is None:
+            # Get the name of the function that is throwning this error.
+            func_name = sys._getframe(1).f_code.co_name
         message = ("The function {}'s argument '{}' was {} but should"
                    " be of {}{}.".format(
             func_name,
@@ -19,29 +19,61 @@ that one can invoke libs.run_bash(run_bash_request). In Jython, that
 object will in fact be a Java object that will delegate to a Java implementation
 of a lib operation.
 
+If the operation calling a wrapper has a deadline (see
+dlpx.virtualization.common.remaining_time), the time left is passed as the
+timeout of the remote command, and DeadlineExceededError is raised once it
+has passed.
+
+Read-only commands a plugin runs again and again, such as probes run by
+discovery and status, can be cached for a while with a CommandCache.
+
 .. _Google Python Style Guide:
    http://google.github.io/styleguide/pyguide.html
 
 """
 
+import collections
+import math
 import sys
+import threading
+import time
 
 from dlpx.virtualization import libs_pb2
-from dlpx.virtualization.libs.exceptions import (IncorrectArgumentTypeError,
+from dlpx.virtualization.libs._validation import compile_validator
+from dlpx.virtualization.libs.exceptions import (DeadlineExceededError,
+                                                 IncorrectArgumentTypeError,
                                                  LibraryError,
                                                  PluginScriptError)
 from dlpx.virtualization.common._common_classes import RemoteConnection
+from dlpx.virtualization.common.exceptions import PlatformError
+from dlpx.virtualization.common._deadline import (current_deadline,
+                                                  deadline_scope,
+                                                  remaining_time)
 
 import logging
 
 
 __all__ = [
+    "CommandCache",
+    "CommandStream",
+    "STDERR",
+    "STDOUT",
     "run_bash",
+    "run_bash_batch",
+    "run_bash_parallel",
+    "run_bash_stream",
     "run_sync",
     "run_powershell",
-    "run_expect"
+    "run_powershell_parallel",
+    "run_powershell_stream",
+    "run_expect",
+    "run_expect_stream"
 ]
 
+# The default maximum number of hosts run_bash_parallel and
+# run_powershell_parallel run commands on at once.
+DEFAULT_MAX_WORKERS = 8
+
 
 def _handle_response(response):
     """This function handles callback responses. It proceeds differently based
@@ -67,6 +99,36 @@ def _handle_response(response):
     return response.return_value
 
 
+# The largest timeout_millis of a request.
+_MAX_TIMEOUT_MILLIS = 2 ** 32 - 1
+
+
+def _timeout_millis(func_name):
+    """Returns the timeout of a remote command run by func_name, in
+    milliseconds, from the deadline of the current operation. It is 0 if the
+    operation has no deadline.
+
+    Raises DeadlineExceededError if the deadline has already passed.
+    """
+    remaining = remaining_time()
+    if remaining is None:
+        return 0
+    if remaining <= 0:
+        raise DeadlineExceededError(func_name, -remaining, False)
+    return min(int(math.ceil(remaining * 1000)), _MAX_TIMEOUT_MILLIS)
+
+
+def _check_deadline(func_name, response):
+    """Raises DeadlineExceededError if func_name failed once the deadline of
+    the current operation passed, as the engine then most likely stopped its
+    command.
+    """
+    if response.HasField('error'):
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceededError(func_name, -remaining, True)
+
+
 def _check_exit_code(response, check):
   """
   This functions checks the exitcode received in response and throws PluginScriptError
@@ -77,14 +139,35 @@ def _check_exit_code(response, check):
     run_powershell or run_expect
     check (bool): if True and non-zero exitcode is received in response, raise PluginScriptError
   """
-  if (check and response.HasField('return_value')
-          and response.return_value.exit_code != 0):
-    raise PluginScriptError('The script failed with exit code {}.'
+  if check and response.HasField('return_value'):
+    _check_result_exit_code(response.return_value)
+
+
+def _check_result_exit_code(result, script='The script'):
+  """
+  This functions throws PluginScriptError if the exitcode of a result is not
+  zero.
+
+  Args:
+    result (RunPowerShellResult or RunBashResult or RunExpectResult): Result
+    of a script
+    script (str): How the script is referred to in the error message
+  """
+  if result.exit_code != 0:
+    raise PluginScriptError('{} failed with exit code {}.'
                             ' stdout : {} and '
                             ' stderr : {}'.format(
-      response.return_value.exit_code,
-      response.return_value.stdout,
-      response.return_value.stderr))
+      script,
+      result.exit_code,
+      result.stdout,
+      result.stderr))
+
+
+_validate_run_bash = compile_validator('run_bash', [
+    ('remote_connection', RemoteConnection),
+    ('command', basestring),
+    ('variables', {basestring: basestring}, False),
+    ('use_login_shell', bool, False)])
 
 
 def run_bash(remote_connection, command, variables=None, use_login_shell=False,
@@ -123,46 +206,109 @@ def run_bash(remote_connection, command, variables=None, use_login_shell=False,
     if variables is None:
         variables = {}
 
-    # Validate all the arguments passed in are the right types based on docs.
-    if not isinstance(remote_connection, RemoteConnection):
-        raise IncorrectArgumentTypeError(
-            'remote_connection',
-            type(remote_connection),
-            RemoteConnection)
-    if not isinstance(command, basestring):
-        raise IncorrectArgumentTypeError('command', type(command), basestring)
-    if variables and not isinstance(variables, dict):
-        raise IncorrectArgumentTypeError(
-            'variables',
-            type(variables),
-            {basestring: basestring},
-            False)
-    if (variables and (not all(isinstance(variable, basestring)
-                               for variable in variables.keys()) or
-                       not all(isinstance(value, basestring)
-                               for value in variables.values()))):
-        raise IncorrectArgumentTypeError(
-            'variables',
-            {(type(variable), type(value))
-             for variable, value in variables.items()},
-            {basestring: basestring},
-            False)
-    if use_login_shell and not isinstance(use_login_shell, bool):
-        raise IncorrectArgumentTypeError(
-            'use_login_shell', type(use_login_shell), bool, False)
+    _validate_run_bash(remote_connection, command, variables, use_login_shell)
 
     run_bash_request = libs_pb2.RunBashRequest()
-    run_bash_request.remote_connection.CopyFrom(remote_connection.to_proto())
+    remote_connection.to_proto(run_bash_request.remote_connection)
     run_bash_request.command = command
     run_bash_request.use_login_shell = use_login_shell
     for variable, value in variables.items():
         run_bash_request.variables[variable] = value
+    run_bash_request.timeout_millis = _timeout_millis('run_bash')
 
     run_bash_response = internal_libs.run_bash(run_bash_request)
+    _check_deadline('run_bash', run_bash_response)
     _check_exit_code(run_bash_response, check)
     return _handle_response(run_bash_response)
 
 
+_validate_run_bash_batch = compile_validator('run_bash_batch', [
+    ('remote_connection', RemoteConnection),
+    ('use_login_shell', bool, False),
+    ('stop_on_failure', bool, False)])
+_validate_run_bash_batch_variables = compile_validator('run_bash_batch', [
+    ('variables', {basestring: basestring}, False)])
+
+
+def run_bash_batch(remote_connection, commands, use_login_shell=False,
+                   stop_on_failure=False, check=False):
+    """run_bash_batch operation wrapper.
+
+    The run_bash_batch function executes several shell commands or scripts,
+    one after the other, on a remote Unix environment in a single call to the
+    Delphix Engine. It behaves like calling run_bash for each command, without
+    paying for a round trip to the engine and the environment per command.
+
+    Args:
+        remote_connection (RemoteConnection): Connection to a remote
+        environment.
+        commands (list): Bash commands to run, in order. Each is either a str
+        or a (str, dict of str:str) tuple of the command and the environment
+        variables to set before running it.
+        use_login_shell (bool): Whether to use login shell.
+        stop_on_failure (bool): if True, the commands after the first one
+        with a non-zero exitcode are not run.
+        check (bool): if True and a non-zero exitcode is received for any
+        command, raise PluginScriptError
+
+    Returns:
+        list of RunBashResult: The results of the commands that were run, in
+        order.
+    """
+    #
+    # Since this import only resolves at runtime, we keep it in the function
+    # scope to allow unit testing of this module.
+    #
+    from dlpx.virtualization._engine import libs as internal_libs
+
+    _validate_run_bash_batch(
+        remote_connection, use_login_shell, stop_on_failure)
+    if not isinstance(commands, list):
+        raise IncorrectArgumentTypeError(
+            'commands', type(commands), [basestring])
+    run_bash_batch_request = libs_pb2.RunBashBatchRequest()
+    for item in commands:
+        variables = None
+        if isinstance(item, tuple) and len(item) == 2:
+            command, variables = item
+        else:
+            command = item
+        if not isinstance(command, basestring):
+            raise IncorrectArgumentTypeError(
+                'commands',
+                [type(item) for item in commands],
+                [basestring])
+        _validate_run_bash_batch_variables(variables)
+        bash_command = run_bash_batch_request.commands.add()
+        bash_command.command = command
+        if variables:
+            for variable, value in variables.items():
+                bash_command.variables[variable] = value
+
+    remote_connection.to_proto(run_bash_batch_request.remote_connection)
+    run_bash_batch_request.use_login_shell = use_login_shell
+    run_bash_batch_request.stop_on_failure = stop_on_failure
+    run_bash_batch_request.timeout_millis = _timeout_millis('run_bash_batch')
+
+    run_bash_batch_response = internal_libs.run_bash_batch(
+        run_bash_batch_request)
+    _check_deadline('run_bash_batch', run_bash_batch_response)
+    results = list(_handle_response(run_bash_batch_response).results)
+    if check:
+        for index, result in enumerate(results):
+            _check_result_exit_code(
+                result, 'Command {} of the batch'.format(index))
+    return results
+
+
+_validate_run_sync = compile_validator('run_sync', [
+    ('remote_connection', RemoteConnection),
+    ('source_directory', basestring),
+    ('rsync_user', basestring, False),
+    ('exclude_paths', [basestring], False),
+    ('sym_links_to_follow', [basestring], False)])
+
+
 def run_sync(remote_connection, source_directory, rsync_user=None,
              exclude_paths=None, sym_links_to_follow=None):
     """run_sync operation wrapper.
@@ -186,50 +332,12 @@ def run_sync(remote_connection, source_directory, rsync_user=None,
 
     from dlpx.virtualization._engine import libs as internal_libs
 
-    # Validate all the arguments passed in are the right types based on docs.
-    if not isinstance(remote_connection, RemoteConnection):
-        raise IncorrectArgumentTypeError(
-            'remote_connection',
-            type(remote_connection),
-            RemoteConnection)
-    if not isinstance(source_directory, basestring):
-        raise IncorrectArgumentTypeError(
-            'source_directory', type(source_directory), basestring)
-    if rsync_user and not isinstance(rsync_user, basestring):
-        raise IncorrectArgumentTypeError(
-            'rsync_user',
-            type(rsync_user),
-            basestring,
-            False)
-    if exclude_paths and not isinstance(exclude_paths, list):
-        raise IncorrectArgumentTypeError(
-            'exclude_paths',
-            type(exclude_paths),
-            [basestring],
-            False)
-    if (exclude_paths and not all(isinstance(
-            path, basestring) for path in exclude_paths)):
-        raise IncorrectArgumentTypeError(
-            'exclude_paths',
-            [type(path) for path in exclude_paths],
-            [basestring],
-            False)
-    if sym_links_to_follow and not isinstance(sym_links_to_follow, list):
-        raise IncorrectArgumentTypeError(
-            'sym_links_to_follow',
-            type(sym_links_to_follow),
-            [basestring],
-            False)
-    if (sym_links_to_follow and not all(isinstance(link, basestring)
-                                        for link in sym_links_to_follow)):
-        raise IncorrectArgumentTypeError(
-            'sym_links_to_follow',
-            [type(link) for link in sym_links_to_follow],
-            [basestring],
-            False)
+    _validate_run_sync(
+        remote_connection, source_directory, rsync_user, exclude_paths,
+        sym_links_to_follow)
 
     run_sync_request = libs_pb2.RunSyncRequest()
-    run_sync_request.remote_connection.CopyFrom(remote_connection.to_proto())
+    remote_connection.to_proto(run_sync_request.remote_connection)
     run_sync_request.source_directory = source_directory
     if rsync_user is not None:
         run_sync_request.rsync_user = rsync_user
@@ -237,11 +345,19 @@ def run_sync(remote_connection, source_directory, rsync_user=None,
         run_sync_request.exclude_paths.extend(exclude_paths)
     if sym_links_to_follow is not None:
         run_sync_request.sym_links_to_follow.extend(sym_links_to_follow)
+    run_sync_request.timeout_millis = _timeout_millis('run_sync')
 
     response = internal_libs.run_sync(run_sync_request)
+    _check_deadline('run_sync', response)
     _handle_response(response)
 
 
+_validate_run_powershell = compile_validator('run_powershell', [
+    ('remote_connection', RemoteConnection),
+    ('command', basestring),
+    ('variables', {basestring: basestring}, False)])
+
+
 def run_powershell(remote_connection, command, variables=None, check=False):
     """run_powershell operation wrapper.
 
@@ -276,42 +392,27 @@ def run_powershell(remote_connection, command, variables=None, check=False):
     if variables is None:
         variables = {}
 
-    # Validate all the arguments passed in are the right types based on docs.
-    if not isinstance(remote_connection, RemoteConnection):
-        raise IncorrectArgumentTypeError(
-            'remote_connection',
-            type(remote_connection),
-            RemoteConnection)
-    if not isinstance(command, basestring):
-        raise IncorrectArgumentTypeError('command', type(command), basestring)
-    if variables and not isinstance(variables, dict):
-        raise IncorrectArgumentTypeError(
-            'variables',
-            type(variables),
-            {basestring: basestring},
-            False)
-    if (variables and (not all(isinstance(variable, basestring)
-                               for variable in variables.keys()) or
-                       not all(isinstance(value, basestring)
-                               for value in variables.values()))):
-        raise IncorrectArgumentTypeError(
-            'variables',
-            {(type(variable), type(value))
-             for variable, value in variables.items()},
-            {basestring: basestring},
-            False)
+    _validate_run_powershell(remote_connection, command, variables)
 
     run_powershell_request = libs_pb2.RunPowerShellRequest()
-    run_powershell_request.remote_connection.CopyFrom(remote_connection.to_proto())
+    remote_connection.to_proto(run_powershell_request.remote_connection)
     run_powershell_request.command = command
     for variable, value in variables.items():
         run_powershell_request.variables[variable] = value
+    run_powershell_request.timeout_millis = _timeout_millis('run_powershell')
     run_powershell_response = internal_libs.run_powershell(
         run_powershell_request)
+    _check_deadline('run_powershell', run_powershell_response)
     _check_exit_code(run_powershell_response, check)
     return _handle_response(run_powershell_response)
 
 
+_validate_run_expect = compile_validator('run_expect', [
+    ('remote_connection', RemoteConnection),
+    ('command', basestring),
+    ('variables', {basestring: basestring}, False)])
+
+
 def run_expect(remote_connection, command, variables=None, check=False):
     """run_expect operation wrapper.
 
@@ -341,42 +442,639 @@ def run_expect(remote_connection, command, variables=None, check=False):
     if variables is None:
         variables = {}
 
-    # Validate all the arguments passed in are the right types based on docs.
-    if not isinstance(remote_connection, RemoteConnection):
-        raise IncorrectArgumentTypeError(
-            'remote_connection',
-            type(remote_connection),
-            RemoteConnection)
-    if not isinstance(command, basestring):
-        raise IncorrectArgumentTypeError('command', type(command), basestring)
-    if variables and not isinstance(variables, dict):
-        raise IncorrectArgumentTypeError(
-            'variables',
-            type(variables),
-            {basestring: basestring},
-            False)
-    if (variables and (not all(isinstance(variable, basestring)
-                               for variable in variables.keys()) or
-                       not all(isinstance(value, basestring)
-                               for value in variables.values()))):
-        raise IncorrectArgumentTypeError(
-            'variables',
-            {(type(variable), type(value))
-             for variable, value in variables.items()},
-            {basestring: basestring},
-            False)
+    _validate_run_expect(remote_connection, command, variables)
 
     run_expect_request = libs_pb2.RunExpectRequest()
-    run_expect_request.remote_connection.CopyFrom(remote_connection.to_proto())
+    remote_connection.to_proto(run_expect_request.remote_connection)
     run_expect_request.command = command
     for variable, value in variables.items():
         run_expect_request.variables[variable] = value
+    run_expect_request.timeout_millis = _timeout_millis('run_expect')
 
     run_expect_response = internal_libs.run_expect(run_expect_request)
+    _check_deadline('run_expect', run_expect_response)
     _check_exit_code(run_expect_response, check)
     return _handle_response(run_expect_response)
 
 
+# The items of the (remote_connection, command, variables) tuples taken by
+# run_bash_parallel and run_powershell_parallel.
+_PARALLEL_COMMAND = [
+    ('remote_connection', RemoteConnection),
+    ('command', basestring),
+    ('variables', {basestring: basestring}, False)]
+
+_parallel_command_validators = dict(
+    (func_name, compile_validator(func_name, _PARALLEL_COMMAND, 'commands'))
+    for func_name in ('run_bash_parallel', 'run_powershell_parallel'))
+
+
+def _parallel_command(func_name, index, item):
+    """Returns the (remote_connection, command, variables) of the item at
+    index of the commands of func_name, which may omit variables, or raises
+    an error naming the position of the first bad value in it.
+    """
+    if not isinstance(item, tuple):
+        raise IncorrectArgumentTypeError(
+            'commands[{}]'.format(index), type(item), tuple,
+            func_name=func_name)
+    if len(item) not in (2, 3):
+        raise ValueError(
+            "The function {}'s argument 'commands[{}]' had {} items but"
+            " should have 2 or 3.".format(func_name, index, len(item)))
+    item += (None,) * (3 - len(item))
+    _parallel_command_validators[func_name](*(item + (index,)))
+    return item
+
+
+def _run_parallel(func_name, run, commands, max_workers):
+    """Runs run(remote_connection, command, variables) for each of commands,
+    one after the other on each host and on up to max_workers hosts at once.
+
+    commands and max_workers are checked first, on behalf of func_name.
+
+    Returns the value returned by each call, or the error it raised if that
+    is a LibraryError, PluginScriptError or DeadlineExceededError, in the
+    order of commands. Any other error is raised once running calls finish,
+    and the calls on hosts that weren't started yet are skipped.
+    """
+    if not isinstance(commands, list):
+        raise IncorrectArgumentTypeError(
+            'commands', type(commands), [tuple], func_name=func_name)
+    commands = [_parallel_command(func_name, index, item)
+                for index, item in enumerate(commands)]
+    if (not isinstance(max_workers, (int, long))
+            or isinstance(max_workers, bool) or max_workers < 1):
+        raise ValueError(
+            'The maximum number of workers must be a positive integer.'
+            ' Found {}'.format(max_workers))
+    hosts = collections.OrderedDict()
+    for index, (remote_connection, _, _) in enumerate(commands):
+        host = remote_connection.environment.host.reference
+        hosts.setdefault(host, []).append(index)
+    pending = collections.deque(hosts.values())
+    results = [None] * len(commands)
+    failures = []
+    # The deadline of the operation belongs to this thread, not the workers.
+    deadline = current_deadline()
+
+    def work():
+        with deadline_scope(deadline):
+            while not failures:
+                try:
+                    indexes = pending.popleft()
+                except IndexError:
+                    return
+                for index in indexes:
+                    try:
+                        results[index] = run(*commands[index])
+                    except (LibraryError, PluginScriptError,
+                            DeadlineExceededError) as error:
+                        results[index] = error
+                    except BaseException:
+                        # Includes the SystemExit of non-actionable errors.
+                        failures.append(sys.exc_info())
+                        return
+
+    workers = min(max_workers, len(hosts))
+    if workers <= 1:
+        work()
+    else:
+        threads = [threading.Thread(target=work) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    if failures:
+        error_type, error, error_traceback = failures[0]
+        raise error_type, error, error_traceback
+    return results
+
+
+_validate_run_bash_parallel = compile_validator('run_bash_parallel', [
+    ('use_login_shell', bool, False)])
+
+
+def run_bash_parallel(commands, use_login_shell=False, check=False,
+                      max_workers=DEFAULT_MAX_WORKERS):
+    """Runs run_bash for many commands, on many remote environments at once.
+
+    Commands on the same host run one after the other, in the order given.
+    Commands on different hosts run at the same time, on up to max_workers
+    hosts at once, so running a command on every node of a cluster takes
+    about as long as the slowest node.
+
+    Args:
+        commands (list): (remote_connection, command) or (remote_connection,
+        command, variables) tuples, with the arguments of run_bash.
+        use_login_shell (bool): Whether to use login shell.
+        check (bool): if True and non-zero exitcode is received, the result
+        of the command is a PluginScriptError
+        max_workers (int): The maximum number of hosts to run commands on at
+        once.
+
+    Returns:
+        list: For each command, in order, its RunBashResult or the
+        LibraryError, PluginScriptError or DeadlineExceededError it raised.
+    """
+    _validate_run_bash_parallel(use_login_shell)
+
+    def run(remote_connection, command, variables):
+        return run_bash(remote_connection, command, variables,
+                        use_login_shell, check)
+    return _run_parallel('run_bash_parallel', run, commands, max_workers)
+
+
+def run_powershell_parallel(commands, check=False,
+                            max_workers=DEFAULT_MAX_WORKERS):
+    """Runs run_powershell for many commands, on many remote environments at
+    once.
+
+    Commands on the same host run one after the other, in the order given.
+    Commands on different hosts run at the same time, on up to max_workers
+    hosts at once, so running a command on every node of a cluster takes
+    about as long as the slowest node.
+
+    Args:
+        commands (list): (remote_connection, command) or (remote_connection,
+        command, variables) tuples, with the arguments of run_powershell.
+        check (bool): if True and non-zero exitcode is received, the result
+        of the command is a PluginScriptError
+        max_workers (int): The maximum number of hosts to run commands on at
+        once.
+
+    Returns:
+        list: For each command, in order, its RunPowerShellResult or the
+        LibraryError, PluginScriptError or DeadlineExceededError it raised.
+    """
+    def run(remote_connection, command, variables):
+        return run_powershell(remote_connection, command, variables, check)
+    return _run_parallel(
+        'run_powershell_parallel', run, commands, max_workers)
+
+
+# The stream of a chunk of output of a command run by the streaming wrappers.
+STDOUT = 'stdout'
+STDERR = 'stderr'
+
+_STREAMS = {
+    libs_pb2.CommandOutputChunk.STDOUT: STDOUT,
+    libs_pb2.CommandOutputChunk.STDERR: STDERR
+}
+
+
+class _TailBuffer(object):
+    """Keeps the last max_size characters appended to it."""
+
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._chunks = collections.deque()
+        self._size = 0
+
+    def append(self, data):
+        self._chunks.append(data)
+        self._size += len(data)
+        while self._size - len(self._chunks[0]) >= self._max_size:
+            self._size -= len(self._chunks.popleft())
+
+    def value(self):
+        return ''.join(self._chunks)[-self._max_size:]
+
+
+def _strip_carriage_return(line):
+    """Returns line without the '\\r' of a Windows line ending."""
+    if line.endswith('\r'):
+        return line[:-1]
+    return line
+
+
+class CommandStream(object):
+    """The output of a remote command, read as the command produces it.
+
+    Iterating over a CommandStream yields (stream, data) tuples, where stream
+    is STDOUT or STDERR and data is the next chunk of output of that stream,
+    so the output never has to fit in memory. Once the command has finished
+    exit_code is set. A CommandStream can only be read once, by iterating
+    over it or with one of each_line() or tail().
+
+    If check was set and the command exits with a non-zero exitcode,
+    PluginScriptError is raised once the output has been read. If the output
+    ends without the exit code of the command, PlatformError is raised.
+    """
+
+    def __init__(self, func_name, responses, result_type, check):
+        self._func_name = func_name
+        self._result_type = result_type
+        self._check = check
+        self._exit_code = None
+        self._chunks = self._read(responses)
+
+    @property
+    def exit_code(self):
+        """int: The exit code of the command, or None until all of the
+        output has been read.
+        """
+        return self._exit_code
+
+    def _read(self, responses):
+        for response in responses:
+            result = response.WhichOneof('result')
+            if result == 'output':
+                yield _STREAMS[response.output.stream], response.output.data
+            elif result == 'exit_code':
+                self._exit_code = response.exit_code
+                return
+            elif result == 'error':
+                _check_deadline(self._func_name, response)
+                _handle_response(response)
+        # The engine ends every stream with the exit code or an error.
+        # Without either, the outcome of the command is unknown.
+        raise PlatformError(
+            'The output of {} ended without the exit code of the'
+            ' command.'.format(self._func_name))
+
+    def _check_exit_code(self):
+        if self._check and self._exit_code:
+            raise PluginScriptError('The script failed with exit code {}.'
+                                    .format(self._exit_code))
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            yield chunk
+        self._check_exit_code()
+
+    def each_line(self, callback):
+        """Reads all of the output, calling callback(stream, line) for each
+        line of each stream as soon as it is complete. Lines are passed
+        without their line ending, either '\\n' or '\\r\\n'.
+
+        Returns:
+            int: The exit code of the command.
+        """
+        partial = {STDOUT: [], STDERR: []}
+        for stream, data in self._chunks:
+            lines = data.split('\n')
+            if len(lines) > 1:
+                partial[stream].append(lines[0])
+                lines[0] = ''.join(partial[stream])
+                partial[stream] = []
+                for line in lines[:-1]:
+                    callback(stream, _strip_carriage_return(line))
+            if lines[-1]:
+                partial[stream].append(lines[-1])
+        for stream in (STDOUT, STDERR):
+            if partial[stream]:
+                callback(stream,
+                         _strip_carriage_return(''.join(partial[stream])))
+        self._check_exit_code()
+        return self._exit_code
+
+    def tail(self, max_size):
+        """Reads all of the output, keeping only the last max_size
+        characters of stdout and of stderr.
+
+        Returns:
+            RunBashResult, RunPowerShellResult or RunExpectResult: The exit
+            code of the command and the end of its output.
+        """
+        if (not isinstance(max_size, (int, long))
+                or isinstance(max_size, bool) or max_size < 1):
+            raise ValueError(
+                'The size of the tail must be a positive integer.'
+                ' Found {}'.format(max_size))
+        buffers = {STDOUT: _TailBuffer(max_size),
+                   STDERR: _TailBuffer(max_size)}
+        for stream, data in self._chunks:
+            buffers[stream].append(data)
+
+        result = self._result_type()
+        result.exit_code = self._exit_code
+        result.stdout = buffers[STDOUT].value()
+        result.stderr = buffers[STDERR].value()
+        if self._check:
+            _check_result_exit_code(result)
+        return result
+
+
+_validate_run_bash_stream = compile_validator('run_bash_stream', [
+    ('remote_connection', RemoteConnection),
+    ('command', basestring),
+    ('variables', {basestring: basestring}, False),
+    ('use_login_shell', bool, False)])
+
+
+def run_bash_stream(remote_connection, command, variables=None,
+                    use_login_shell=False, check=False):
+    """Streaming variant of run_bash.
+
+    Runs a shell command or script like run_bash, but returns its output as
+    it is produced rather than once the command has exited. This keeps
+    commands that print a lot of output, such as backups, from holding all
+    of it in memory.
+
+    Args:
+        remote_connection (RemoteConnection): Connection to a remote
+        environment.
+        command (str): Bash command to run.
+        variables (dict of str:str): Environment variables to set before
+        running the command.
+        use_login_shell (bool): Whether to use login shell.
+        check (bool): if True and non-zero exitcode is received, raise
+        PluginScriptError once the output has been read
+
+    Returns:
+        CommandStream: The output of the command. Its tail() returns a
+        RunBashResult.
+    """
+    #
+    # Since this import only resolves at runtime, we keep it in the function
+    # scope to allow unit testing of this module.
+    #
+    from dlpx.virtualization._engine import libs as internal_libs
+
+    if variables is None:
+        variables = {}
+
+    _validate_run_bash_stream(
+        remote_connection, command, variables, use_login_shell)
+
+    run_bash_request = libs_pb2.RunBashRequest()
+    remote_connection.to_proto(run_bash_request.remote_connection)
+    run_bash_request.command = command
+    run_bash_request.use_login_shell = use_login_shell
+    for variable, value in variables.items():
+        run_bash_request.variables[variable] = value
+    run_bash_request.timeout_millis = _timeout_millis('run_bash_stream')
+
+    return CommandStream('run_bash_stream',
+                         internal_libs.run_bash_stream(run_bash_request),
+                         libs_pb2.RunBashResult, check)
+
+
+_validate_run_powershell_stream = compile_validator('run_powershell_stream', [
+    ('remote_connection', RemoteConnection),
+    ('command', basestring),
+    ('variables', {basestring: basestring}, False)])
+
+
+def run_powershell_stream(remote_connection, command, variables=None,
+                          check=False):
+    """Streaming variant of run_powershell.
+
+    Runs a powershell command or script like run_powershell, but returns its
+    output as it is produced rather than once the command has exited.
+
+    Args:
+        remote_connection (RemoteConnection): Connection to a remote
+        environment.
+        command (str): Powershell script to run.
+        variables (dict): Environment variables to set before running the
+        command.
+        check (bool): if True and non-zero exitcode is received, raise
+        PluginScriptError once the output has been read
+
+    Returns:
+        CommandStream: The output of the command. Its tail() returns a
+        RunPowerShellResult.
+    """
+    #
+    # Since this import only resolves at runtime, we keep it in the function
+    # scope to allow unit testing of this module.
+    #
+    from dlpx.virtualization._engine import libs as internal_libs
+
+    if variables is None:
+        variables = {}
+
+    _validate_run_powershell_stream(remote_connection, command, variables)
+
+    run_powershell_request = libs_pb2.RunPowerShellRequest()
+    remote_connection.to_proto(run_powershell_request.remote_connection)
+    run_powershell_request.command = command
+    for variable, value in variables.items():
+        run_powershell_request.variables[variable] = value
+    run_powershell_request.timeout_millis = _timeout_millis(
+        'run_powershell_stream')
+
+    return CommandStream(
+        'run_powershell_stream',
+        internal_libs.run_powershell_stream(run_powershell_request),
+        libs_pb2.RunPowerShellResult, check)
+
+
+_validate_run_expect_stream = compile_validator('run_expect_stream', [
+    ('remote_connection', RemoteConnection),
+    ('command', basestring),
+    ('variables', {basestring: basestring}, False)])
+
+
+def run_expect_stream(remote_connection, command, variables=None,
+                      check=False):
+    """Streaming variant of run_expect.
+
+    Runs a tcl command or script like run_expect, but returns its output as
+    it is produced rather than once the command has exited.
+
+    Args:
+        remote_connection (RemoteConnection): Connection to a remote
+        environment.
+        command (str): Expect(TCL) command to run.
+        variables (dict): Environment variables to set before running the
+        command.
+        check (bool): if True and non-zero exitcode is received, raise
+        PluginScriptError once the output has been read
+
+    Returns:
+        CommandStream: The output of the command. Its tail() returns a
+        RunExpectResult.
+    """
+    #
+    # Since this import only resolves at runtime, we keep it in the function
+    # scope to allow unit testing of this module.
+    #
+    from dlpx.virtualization._engine import libs as internal_libs
+
+    if variables is None:
+        variables = {}
+
+    _validate_run_expect_stream(remote_connection, command, variables)
+
+    run_expect_request = libs_pb2.RunExpectRequest()
+    remote_connection.to_proto(run_expect_request.remote_connection)
+    run_expect_request.command = command
+    for variable, value in variables.items():
+        run_expect_request.variables[variable] = value
+    run_expect_request.timeout_millis = _timeout_millis('run_expect_stream')
+
+    return CommandStream('run_expect_stream',
+                         internal_libs.run_expect_stream(run_expect_request),
+                         libs_pb2.RunExpectResult, check)
+
+
+# The default maximum number of results kept by a CommandCache.
+DEFAULT_CACHE_SIZE = 256
+
+
+class CommandCache(object):
+    """Remembers the results of read-only remote commands, such as
+    'cat /etc/oratab' or 'Get-Service', so that running one again within
+    ttl seconds doesn't go to the remote environment.
+
+    Only commands run through the cache's own run_bash and run_powershell
+    are cached; the module's functions never are. A result is keyed by the
+    environment and user of the connection, the command, its variables and,
+    for run_bash, use_login_shell. Only results with an exit code of 0 are
+    kept. When full, the least recently used result is dropped. Two identical
+    commands running at the same time both run remotely.
+
+    Args:
+        ttl (float): The number of seconds a result stays valid.
+        max_size (int): The maximum number of results to keep.
+        clock (function): Returns the current time in seconds.
+
+    Attributes:
+        hits (int): The number of commands answered from the cache.
+        misses (int): The number of commands that had to run remotely.
+        invalidations (int): The number of results dropped by invalidate.
+    """
+
+    def __init__(self, ttl, max_size=DEFAULT_CACHE_SIZE, clock=time.time):
+        if (not isinstance(ttl, (int, long, float))
+                or isinstance(ttl, bool) or ttl <= 0):
+            raise ValueError(
+                'The command cache TTL must be a positive number of seconds.'
+                ' Found {}'.format(ttl))
+        if (not isinstance(max_size, (int, long))
+                or isinstance(max_size, bool) or max_size < 1):
+            raise ValueError(
+                'The command cache size must be a positive integer.'
+                ' Found {}'.format(max_size))
+        self._ttl = ttl
+        self._max_size = max_size
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def ttl(self):
+        return self._ttl
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _key(func_name, remote_connection, command, variables, *options):
+        return ((remote_connection.environment.reference,
+                 remote_connection.user.reference, func_name, command,
+                 frozenset(variables.iteritems())) + options)
+
+    def _get(self, key):
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[0] <= now:
+                self.misses += 1
+                return None
+            # Re-insert to mark the entry as the most recently used.
+            self._entries[key] = entry
+            self.hits += 1
+        # Results are messages, so each caller gets a copy of its own.
+        result = type(entry[1])()
+        result.CopyFrom(entry[1])
+        return result
+
+    def _put(self, key, result):
+        if result.exit_code != 0:
+            return
+        kept = type(result)()
+        kept.CopyFrom(result)
+        expires = self._clock() + self._ttl
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, kept)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def run_bash(self, remote_connection, command, variables=None,
+                 use_login_shell=False, check=False):
+        """Cached variant of run_bash, taking the same arguments.
+
+        Returns:
+            RunBashResult: The result of the command, possibly from an earlier
+            run.
+        """
+        if variables is None:
+            variables = {}
+        _validate_run_bash(remote_connection, command, variables,
+                           use_login_shell)
+        key = self._key('run_bash', remote_connection, command, variables,
+                        use_login_shell)
+        result = self._get(key)
+        if result is None:
+            result = run_bash(remote_connection, command, variables,
+                              use_login_shell, check)
+            self._put(key, result)
+        return result
+
+    def run_powershell(self, remote_connection, command, variables=None,
+                       check=False):
+        """Cached variant of run_powershell, taking the same arguments.
+
+        Returns:
+            RunPowerShellResult: The result of the command, possibly from an
+            earlier run.
+        """
+        if variables is None:
+            variables = {}
+        _validate_run_powershell(remote_connection, command, variables)
+        key = self._key('run_powershell', remote_connection, command,
+                        variables)
+        result = self._get(key)
+        if result is None:
+            result = run_powershell(remote_connection, command, variables,
+                                    check)
+            self._put(key, result)
+        return result
+
+    def invalidate(self, remote_connection=None, command=None):
+        """Drops cached results, for instance once a plugin changed what a
+        command reads.
+
+        Args:
+            remote_connection (RemoteConnection): If given, only the results
+                of commands run on its environment, as any user, are
+                dropped.
+            command (str): If given, only the results of this command are
+                dropped.
+
+        Returns:
+            int: The number of results dropped.
+        """
+        reference = None
+        if remote_connection is not None:
+            reference = remote_connection.environment.reference
+        with self._lock:
+            dropped = [key for key in self._entries
+                       if (reference is None or key[0] == reference)
+                       and (command is None or key[3] == command)]
+            for key in dropped:
+                del self._entries[key]
+            self.invalidations += len(dropped)
+        return len(dropped)
+
+    def clear(self):
+        """Drops all results, without counting them as invalidations."""
+        with self._lock:
+            self._entries.clear()
+
+
 def _log_request(message, log_level):
     """This is an internal wrapper around the Virtualization library's logging
     API. It maps Python logging level to the library's logging levels:
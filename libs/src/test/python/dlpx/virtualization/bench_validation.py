@@ -0,0 +1,118 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Benchmark of validating the arguments of the libs wrappers.
+
+Times the arguments of run_bash being checked the way run_bash used to, with
+isinstance checks written out in the wrapper, and with the validator
+compile_validator builds for it, for variables maps of growing size. Both
+must raise the same error for the same invalid arguments.
+
+This is not part of the unit test suite. Run it from this directory with the
+libs, common and generated protobuf modules on the PYTHONPATH:
+
+  python bench_validation.py [--number N] [--repeat R]
+"""
+
+import argparse
+import sys
+import timeit
+
+from dlpx.virtualization.common import (RemoteConnection, RemoteEnvironment,
+                                        RemoteHost, RemoteUser)
+from dlpx.virtualization.libs import libs
+from dlpx.virtualization.libs.exceptions import IncorrectArgumentTypeError
+
+SIZES = [0, 10, 100, 1000, 10000]
+
+_CONNECTION = RemoteConnection(
+    RemoteEnvironment('environment', 'UNIX_HOST_ENVIRONMENT-1',
+                      RemoteHost('host', 'UNIX_HOST-1', '/usr/bin',
+                                 '/var/delphix/scratch')),
+    RemoteUser('delphix', 'HOST_USER-1'))
+
+
+def run_bash(remote_connection, command, variables, use_login_shell):
+    """The checks run_bash used to make, written out."""
+    if not isinstance(remote_connection, RemoteConnection):
+        raise IncorrectArgumentTypeError(
+            'remote_connection',
+            type(remote_connection),
+            RemoteConnection)
+    if not isinstance(command, basestring):
+        raise IncorrectArgumentTypeError('command', type(command), basestring)
+    if variables and not isinstance(variables, dict):
+        raise IncorrectArgumentTypeError(
+            'variables',
+            type(variables),
+            {basestring: basestring},
+            False)
+    if (variables and (not all(isinstance(variable, basestring)
+                               for variable in variables.keys()) or
+                       not all(isinstance(value, basestring)
+                               for value in variables.values()))):
+        raise IncorrectArgumentTypeError(
+            'variables',
+            {(type(variable), type(value))
+             for variable, value in variables.items()},
+            {basestring: basestring},
+            False)
+    if use_login_shell and not isinstance(use_login_shell, bool):
+        raise IncorrectArgumentTypeError(
+            'use_login_shell', type(use_login_shell), bool, False)
+
+
+def _variables(size):
+    return dict(('NAME_{}'.format(i), 'value {}'.format(i))
+                for i in range(size))
+
+
+def _error(validate, args):
+    try:
+        validate(*args)
+    except IncorrectArgumentTypeError as error:
+        return str(error)
+    return None
+
+
+def check_same_errors():
+    invalid = [
+        (None, 'command', None, False),
+        (_CONNECTION, 10, None, False),
+        (_CONNECTION, 'command', 'variables', False),
+        (_CONNECTION, 'command', {'name': 1, 'other': 'value'}, False),
+        (_CONNECTION, 'command', None, 'yes')]
+    for args in invalid:
+        assert (_error(run_bash, args) ==
+                _error(libs._validate_run_bash, args)), args
+
+
+def time_validate(validate, args, number, repeat):
+    """Returns the best time, in microseconds, of one validation."""
+    timer = timeit.Timer(lambda: validate(*args))
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    check_same_errors()
+    print('{:<10} {:>12} {:>12} {:>8}'.format(
+        'variables', 'usec old', 'usec new', 'saved'))
+    for size in SIZES:
+        call = (_CONNECTION, 'command', _variables(size), True)
+        number = max(args.number // max(size, 1) * 10, 10)
+        number = min(number, args.number * 10)
+        old_time = time_validate(run_bash, call, number, args.repeat)
+        new_time = time_validate(libs._validate_run_bash, call, number,
+                                 args.repeat)
+        print('{:<10} {:>12.2f} {:>12.2f} {:>7.0f}%'.format(
+            size, old_time, new_time, (1 - new_time / old_time) * 100))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,13 +2,23 @@
 # Copyright (c) 2019 by Delphix. All rights reserved.
 #
 
+import threading
+import time
+
 import mock
 import pytest
 
 from dlpx.virtualization import libs_pb2
 from dlpx.virtualization import libs
+from dlpx.virtualization.common._common_classes import (RemoteConnection,
+                                                        RemoteEnvironment,
+                                                        RemoteHost,
+                                                        RemoteUser)
+from dlpx.virtualization.common._deadline import deadline_scope
+from dlpx.virtualization.common.exceptions import PlatformError
 from dlpx.virtualization.libs.exceptions import (
-    IncorrectArgumentTypeError, LibraryError, PluginScriptError)
+    DeadlineExceededError, IncorrectArgumentTypeError, LibraryError,
+    PluginScriptError)
 
 
 class TestLibsRunBash:
@@ -210,6 +220,716 @@ class TestLibsRunBash:
             " type 'str' but should be of type 'bool' if defined.")
 
 
+class TestLibsRunBashBatch:
+    @staticmethod
+    def batch_response(*exit_codes):
+        response = libs_pb2.RunBashBatchResponse()
+        response.return_value.SetInParent()
+        for exit_code in exit_codes:
+            result = response.return_value.results.add()
+            result.exit_code = exit_code
+            result.stdout = 'stdout'
+            result.stderr = 'stderr'
+        return response
+
+    @staticmethod
+    def test_run_bash_batch(remote_connection):
+        response = TestLibsRunBashBatch.batch_response(0, 1)
+
+        def mock_run_bash_batch(request):
+            assert [command.command for command in request.commands] == [
+                'command0', 'command1']
+            assert dict(request.commands[0].variables) == {}
+            assert dict(request.commands[1].variables) == {'name': 'value'}
+            assert not request.use_login_shell
+            assert not request.stop_on_failure
+            assert (request.remote_connection.environment.reference ==
+                    remote_connection.environment.reference)
+            return response
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash_batch',
+                        side_effect=mock_run_bash_batch, create=True):
+            results = libs.run_bash_batch(
+                remote_connection,
+                ['command0', ('command1', {'name': 'value'})])
+
+        assert results == list(response.return_value.results)
+        assert [result.exit_code for result in results] == [0, 1]
+
+    @staticmethod
+    def test_run_bash_batch_stop_on_failure(remote_connection):
+        def mock_run_bash_batch(request):
+            assert request.stop_on_failure
+            assert request.use_login_shell
+            return TestLibsRunBashBatch.batch_response(1)
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash_batch',
+                        side_effect=mock_run_bash_batch, create=True):
+            results = libs.run_bash_batch(
+                remote_connection, ['command0', 'command1'],
+                use_login_shell=True, stop_on_failure=True)
+
+        assert len(results) == 1
+
+    @staticmethod
+    def test_run_bash_batch_with_check_true_failed_exitcode(
+            remote_connection):
+        response = TestLibsRunBashBatch.batch_response(0, 2, 3)
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash_batch',
+                        return_value=response, create=True):
+            with pytest.raises(PluginScriptError) as err_info:
+                libs.run_bash_batch(remote_connection,
+                                    ['command0', 'command1', 'command2'],
+                                    check=True)
+
+        assert str(err_info.value) == (
+            'Command 1 of the batch failed with exit code 2.'
+            ' stdout : stdout and  stderr : stderr')
+
+    @staticmethod
+    def test_run_bash_batch_with_actionable_error(remote_connection):
+        response = libs_pb2.RunBashBatchResponse()
+        response.error.actionable_error.id = 15
+        response.error.actionable_error.message = 'error message'
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash_batch',
+                        return_value=response, create=True):
+            with pytest.raises(LibraryError) as err_info:
+                libs.run_bash_batch(remote_connection, ['command'])
+
+        assert err_info.value._id == 15
+        assert str(err_info.value) == 'error message'
+
+    @staticmethod
+    def test_run_bash_batch_bad_commands(remote_connection):
+        with pytest.raises(IncorrectArgumentTypeError) as err_info:
+            libs.run_bash_batch(remote_connection, ['command', 10])
+
+        assert str(err_info.value) == (
+            "The function run_bash_batch's argument 'commands' was"
+            " a list of [type 'str', type 'int'] but should be of"
+            " type 'list of basestring'.")
+
+    @staticmethod
+    def test_run_bash_batch_commands_not_list(remote_connection):
+        with pytest.raises(IncorrectArgumentTypeError) as err_info:
+            libs.run_bash_batch(remote_connection, 'command')
+
+        assert str(err_info.value) == (
+            "The function run_bash_batch's argument 'commands' was"
+            " type 'str' but should be of type 'list of basestring'.")
+
+    @staticmethod
+    def test_run_bash_batch_bad_variables(remote_connection):
+        with pytest.raises(IncorrectArgumentTypeError) as err_info:
+            libs.run_bash_batch(remote_connection,
+                                [('command', {'test0': 10})])
+
+        assert str(err_info.value) == (
+            "The function run_bash_batch's argument 'variables' was"
+            " a dict of {type 'str':type 'int'} but should be of"
+            " type 'dict of basestring:basestring' if defined.")
+
+
+def _host_connection(host):
+    """Returns a connection to a new environment of the given host."""
+    remote_host = RemoteHost(host, host, 'binary_path', 'scratch_path')
+    remote_environment = RemoteEnvironment(
+        'environment', 'environment-' + host, remote_host)
+    return RemoteConnection(remote_environment,
+                            RemoteUser('user', 'user-reference'))
+
+
+class TestLibsRunParallel:
+    @staticmethod
+    def bash_response(exit_code=0, stdout='stdout'):
+        response = libs_pb2.RunBashResponse()
+        response.return_value.exit_code = exit_code
+        response.return_value.stdout = stdout
+        return response
+
+    @staticmethod
+    def test_run_bash_parallel():
+        hosts = ['host{}'.format(i) for i in range(4)]
+        connections = dict((host, _host_connection(host)) for host in hosts)
+        commands = [(connections[host], 'command{}'.format(i))
+                    for i in range(2) for host in hosts]
+        lock = threading.Lock()
+        running = []
+        ran = []
+
+        def mock_run_bash(request):
+            host = request.remote_connection.environment.host.reference
+            with lock:
+                running.append(host)
+                max_running.append(len(running))
+            time.sleep(0.02)
+            with lock:
+                running.remove(host)
+                ran.append((host, request.command))
+            return TestLibsRunParallel.bash_response(
+                stdout='{} {}'.format(host, request.command))
+
+        max_running = []
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash',
+                        side_effect=mock_run_bash, create=True):
+            results = libs.run_bash_parallel(commands)
+
+        assert [result.stdout for result in results] == [
+            '{} {}'.format(connection.environment.host.reference, command)
+            for connection, command in commands]
+        assert max(max_running) > 1
+        for host in hosts:
+            # The commands of a host ran one after the other, in order.
+            assert [command for ran_host, command in ran
+                    if ran_host == host] == ['command0', 'command1']
+
+    @staticmethod
+    def test_run_bash_parallel_max_workers():
+        commands = [(_host_connection('host{}'.format(i)), 'command',
+                     {'name': 'value'}) for i in range(4)]
+        threads = set()
+
+        def mock_run_bash(request):
+            assert dict(request.variables) == {'name': 'value'}
+            assert request.use_login_shell
+            threads.add(threading.current_thread())
+            return TestLibsRunParallel.bash_response()
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash',
+                        side_effect=mock_run_bash, create=True):
+            results = libs.run_bash_parallel(
+                commands, use_login_shell=True, max_workers=1)
+
+        assert threads == {threading.current_thread()}
+        assert len(results) == 4
+
+    @staticmethod
+    def test_run_bash_parallel_captures_errors():
+        commands = [(_host_connection('host{}'.format(i)), 'command')
+                    for i in range(3)]
+
+        def mock_run_bash(request):
+            host = request.remote_connection.environment.host.reference
+            if host == 'host0':
+                response = libs_pb2.RunBashResponse()
+                response.error.actionable_error.id = 1
+                response.error.actionable_error.message = 'unreachable'
+                return response
+            if host == 'host1':
+                return TestLibsRunParallel.bash_response(exit_code=1)
+            return TestLibsRunParallel.bash_response()
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash',
+                        side_effect=mock_run_bash, create=True):
+            results = libs.run_bash_parallel(commands, check=True)
+
+        assert isinstance(results[0], LibraryError)
+        assert str(results[0]) == 'unreachable'
+        assert isinstance(results[1], PluginScriptError)
+        assert results[2].exit_code == 0
+
+    @staticmethod
+    def test_run_bash_parallel_nonactionable_error():
+        commands = [(_host_connection('host{}'.format(i)), 'command')
+                    for i in range(3)]
+        response = libs_pb2.RunBashResponse()
+        response.error.non_actionable_error.SetInParent()
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash',
+                        return_value=response, create=True):
+            with pytest.raises(SystemExit):
+                libs.run_bash_parallel(commands)
+
+    @staticmethod
+    def test_run_bash_parallel_deadline():
+        commands = [(_host_connection('host{}'.format(i)), 'command')
+                    for i in range(3)]
+
+        def mock_run_bash(request):
+            assert 0 < request.timeout_millis <= 30000
+            return TestLibsRunParallel.bash_response()
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash',
+                        side_effect=mock_run_bash, create=True):
+            with deadline_scope(time.time() + 30):
+                results = libs.run_bash_parallel(commands)
+
+        assert len(results) == 3
+
+    @staticmethod
+    def test_run_powershell_parallel():
+        commands = [(_host_connection('host{}'.format(i)), 'command')
+                    for i in range(3)]
+        response = libs_pb2.RunPowerShellResponse()
+        response.return_value.exit_code = 0
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_powershell',
+                        return_value=response, create=True):
+            results = libs.run_powershell_parallel(commands)
+
+        assert results == [response.return_value] * 3
+
+    @staticmethod
+    @pytest.mark.parametrize('func_name', [
+        'run_bash_parallel', 'run_powershell_parallel'])
+    def test_run_parallel_bad_commands(remote_connection, func_name):
+        with pytest.raises(IncorrectArgumentTypeError) as err_info:
+            getattr(libs, func_name)((remote_connection, 'command'))
+
+        assert str(err_info.value) == (
+            "The function {}'s argument 'commands' was type 'tuple' but"
+            " should be of type 'list of tuple'.".format(func_name))
+
+    @staticmethod
+    @pytest.mark.parametrize('func_name', [
+        'run_bash_parallel', 'run_powershell_parallel'])
+    def test_run_parallel_bad_item(remote_connection, func_name):
+        with pytest.raises(IncorrectArgumentTypeError) as err_info:
+            getattr(libs, func_name)([(remote_connection, 'command'),
+                                      [remote_connection, 'command']])
+
+        assert str(err_info.value) == (
+            "The function {}'s argument 'commands[1]' was type 'list' but"
+            " should be of type 'tuple'.".format(func_name))
+
+    @staticmethod
+    def test_run_bash_parallel_bad_item_length(remote_connection):
+        with pytest.raises(ValueError) as err_info:
+            libs.run_bash_parallel([(remote_connection, 'command'),
+                                    ('command',)])
+
+        assert str(err_info.value) == (
+            "The function run_bash_parallel's argument 'commands[1]' had 1"
+            " items but should have 2 or 3.")
+
+    @staticmethod
+    @pytest.mark.parametrize('func_name', [
+        'run_bash_parallel', 'run_powershell_parallel'])
+    def test_run_parallel_bad_connection(remote_connection, func_name):
+        with pytest.raises(IncorrectArgumentTypeError) as err_info:
+            getattr(libs, func_name)([(remote_connection, 'command'),
+                                      (remote_connection, 'command'),
+                                      ('environment', 'command')])
+
+        assert str(err_info.value) == (
+            "The function {}'s argument 'commands[2][0]' was type 'str' but"
+            " should be of class 'dlpx.virtualization.common._common_classes."
+            "RemoteConnection'.".format(func_name))
+
+    @staticmethod
+    def test_run_bash_parallel_bad_command(remote_connection):
+        with pytest.raises(IncorrectArgumentTypeError) as err_info:
+            libs.run_bash_parallel([(remote_connection, 10)])
+
+        assert str(err_info.value) == (
+            "The function run_bash_parallel's argument 'commands[0][1]' was"
+            " type 'int' but should be of type 'basestring'.")
+
+    @staticmethod
+    @pytest.mark.parametrize('func_name', [
+        'run_bash_parallel', 'run_powershell_parallel'])
+    def test_run_parallel_bad_variables(remote_connection, func_name):
+        with pytest.raises(IncorrectArgumentTypeError) as err_info:
+            getattr(libs, func_name)(
+                [(remote_connection, 'command', {'test0': 'value'}),
+                 (remote_connection, 'command', {'test0': 10})])
+
+        assert str(err_info.value) == (
+            "The function {}'s argument 'commands[1][2]' was a dict of"
+            " {{type 'str':type 'int'}} but should be of type 'dict of"
+            " basestring:basestring' if defined.".format(func_name))
+
+    @staticmethod
+    def test_run_bash_parallel_variables_not_dict(remote_connection):
+        with pytest.raises(IncorrectArgumentTypeError) as err_info:
+            libs.run_bash_parallel(
+                [(remote_connection, 'command', ['test0'])])
+
+        assert str(err_info.value) == (
+            "The function run_bash_parallel's argument 'commands[0][2]' was"
+            " type 'list' but should be of type 'dict of"
+            " basestring:basestring' if defined.")
+
+    @staticmethod
+    @pytest.mark.parametrize('max_workers', [0, -1, 1.5, None, True])
+    def test_run_bash_parallel_bad_max_workers(
+            remote_connection, max_workers):
+        with pytest.raises(ValueError):
+            libs.run_bash_parallel([(remote_connection, 'command')],
+                                   max_workers=max_workers)
+
+
+class TestLibsRunStream:
+    STREAMS = {
+        'stdout': libs_pb2.CommandOutputChunk.STDOUT,
+        'stderr': libs_pb2.CommandOutputChunk.STDERR
+    }
+
+    @staticmethod
+    def stream_responses(chunks, exit_code=0):
+        """Returns the responses of a command printing chunks, a list of
+        (stream, data) tuples, then exiting with exit_code.
+        """
+        responses = []
+        for stream, data in chunks:
+            response = libs_pb2.RunCommandStreamResponse()
+            response.output.stream = TestLibsRunStream.STREAMS[stream]
+            response.output.data = data
+            responses.append(response)
+        response = libs_pb2.RunCommandStreamResponse()
+        response.exit_code = exit_code
+        responses.append(response)
+        return responses
+
+    @staticmethod
+    def test_run_bash_stream(remote_connection):
+        chunks = [('stdout', 'out1'), ('stderr', 'err1'), ('stdout', 'out2')]
+        read = []
+
+        def mock_run_bash_stream(request):
+            assert request.command == 'command'
+            assert dict(request.variables) == {'name': 'value'}
+            assert request.use_login_shell
+            for response in TestLibsRunStream.stream_responses(chunks, 3):
+                # The output is read as it is produced.
+                read.append(response)
+                yield response
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash_stream',
+                        side_effect=mock_run_bash_stream, create=True):
+            stream = libs.run_bash_stream(
+                remote_connection, 'command', {'name': 'value'}, True)
+            assert stream.exit_code is None
+            for index, chunk in enumerate(stream):
+                assert chunk == chunks[index]
+                assert len(read) == index + 1
+
+        assert stream.exit_code == 3
+        assert list(stream) == []
+
+    @staticmethod
+    def test_run_bash_stream_check_failed_exitcode(remote_connection):
+        responses = TestLibsRunStream.stream_responses(
+            [('stdout', 'out')], 2)
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash_stream',
+                        return_value=iter(responses), create=True):
+            stream = libs.run_bash_stream(remote_connection, 'command',
+                                          check=True)
+            read = []
+            with pytest.raises(PluginScriptError) as err_info:
+                for chunk in stream:
+                    read.append(chunk)
+
+        assert read == [('stdout', 'out')]
+        assert str(err_info.value) == 'The script failed with exit code 2.'
+
+    @staticmethod
+    def test_run_bash_stream_with_actionable_error(remote_connection):
+        responses = TestLibsRunStream.stream_responses([('stdout', 'out')])
+        responses[-1].error.actionable_error.id = 1
+        responses[-1].error.actionable_error.message = 'connection lost'
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash_stream',
+                        return_value=iter(responses), create=True):
+            stream = libs.run_bash_stream(remote_connection, 'command')
+            with pytest.raises(LibraryError) as err_info:
+                list(stream)
+
+        assert str(err_info.value) == 'connection lost'
+
+    @staticmethod
+    @pytest.mark.parametrize('read', [
+        list, lambda stream: stream.each_line(lambda stream, line: None),
+        lambda stream: stream.tail(100)])
+    def test_run_bash_stream_without_exit_code(remote_connection, read):
+        responses = TestLibsRunStream.stream_responses([('stdout', 'out')])
+        del responses[-1]
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash_stream',
+                        return_value=iter(responses), create=True):
+            stream = libs.run_bash_stream(remote_connection, 'command')
+            with pytest.raises(PlatformError) as err_info:
+                read(stream)
+
+        assert stream.exit_code is None
+        assert str(err_info.value) == (
+            'The output of run_bash_stream ended without the exit code of'
+            ' the command.')
+
+    @staticmethod
+    def test_each_line(remote_connection):
+        chunks = [('stdout', 'line 1\nli'), ('stderr', 'error\n'),
+                  ('stdout', 'ne 2'), ('stdout', '\n\nline 4\nline'),
+                  ('stdout', ' 5')]
+        responses = TestLibsRunStream.stream_responses(chunks, 0)
+        lines = []
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash_stream',
+                        return_value=iter(responses), create=True):
+            stream = libs.run_bash_stream(remote_connection, 'command')
+            exit_code = stream.each_line(
+                lambda stream, line: lines.append((stream, line)))
+
+        assert exit_code == 0
+        assert lines == [('stdout', 'line 1'), ('stderr', 'error'),
+                         ('stdout', 'line 2'), ('stdout', ''),
+                         ('stdout', 'line 4'), ('stdout', 'line 5')]
+
+    @staticmethod
+    def test_each_line_windows_line_endings(remote_connection):
+        chunks = [('stdout', 'line 1\r'), ('stdout', '\nline\r2\r\n\r\n'),
+                  ('stdout', 'line 4\r')]
+        responses = TestLibsRunStream.stream_responses(chunks, 0)
+        lines = []
+
+        with mock.patch(
+                'dlpx.virtualization._engine.libs.run_powershell_stream',
+                return_value=iter(responses), create=True):
+            stream = libs.run_powershell_stream(remote_connection, 'command')
+            stream.each_line(lambda stream, line: lines.append(line))
+
+        assert lines == ['line 1', 'line\r2', '', 'line 4']
+
+    @staticmethod
+    def test_tail(remote_connection):
+        chunks = [('stdout', '0123456789')] * 100 + [
+            ('stderr', 'error'), ('stdout', 'end')]
+        responses = TestLibsRunStream.stream_responses(chunks, 1)
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash_stream',
+                        return_value=iter(responses), create=True):
+            stream = libs.run_bash_stream(remote_connection, 'command')
+            result = stream.tail(12)
+
+        assert isinstance(result, libs_pb2.RunBashResult)
+        assert result.exit_code == 1
+        assert result.stdout == '123456789end'
+        assert result.stderr == 'error'
+
+    @staticmethod
+    def test_tail_check_failed_exitcode(remote_connection):
+        responses = TestLibsRunStream.stream_responses(
+            [('stdout', 'out'), ('stderr', 'err')], 1)
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash_stream',
+                        return_value=iter(responses), create=True):
+            stream = libs.run_bash_stream(remote_connection, 'command',
+                                          check=True)
+            with pytest.raises(PluginScriptError) as err_info:
+                stream.tail(100)
+
+        assert str(err_info.value) == (
+            'The script failed with exit code 1.'
+            ' stdout : out and  stderr : err')
+
+    @staticmethod
+    @pytest.mark.parametrize('max_size', [0, -1, 1.5, None, True])
+    def test_tail_bad_max_size(remote_connection, max_size):
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash_stream',
+                        return_value=iter([]), create=True):
+            stream = libs.run_bash_stream(remote_connection, 'command')
+            with pytest.raises(ValueError):
+                stream.tail(max_size)
+
+    @staticmethod
+    @pytest.mark.parametrize('func_name,result_type', [
+        ('run_powershell_stream', libs_pb2.RunPowerShellResult),
+        ('run_expect_stream', libs_pb2.RunExpectResult)])
+    def test_other_streams(remote_connection, func_name, result_type):
+        responses = TestLibsRunStream.stream_responses(
+            [('stdout', 'out')], 0)
+
+        def mock_stream(request):
+            assert request.command == 'command'
+            return iter(responses)
+
+        with mock.patch('dlpx.virtualization._engine.libs.' + func_name,
+                        side_effect=mock_stream, create=True):
+            stream = getattr(libs, func_name)(remote_connection, 'command')
+            result = stream.tail(100)
+
+        assert isinstance(result, result_type)
+        assert result.stdout == 'out'
+
+    @staticmethod
+    def test_run_bash_stream_bad_command(remote_connection):
+        with pytest.raises(IncorrectArgumentTypeError) as err_info:
+            libs.run_bash_stream(remote_connection, 10)
+
+        assert str(err_info.value) == (
+            "The function run_bash_stream's argument 'command' was"
+            " type 'int' but should be of type 'basestring'.")
+
+
+class TestLibsCommandCache:
+    @staticmethod
+    @pytest.fixture
+    def clock():
+        now = [1000.0]
+        clock = lambda: now[0]
+        clock.now = now
+        return clock
+
+    @staticmethod
+    @pytest.fixture
+    def engine_run_bash():
+        def mock_run_bash(request):
+            response = libs_pb2.RunBashResponse()
+            response.return_value.exit_code = (
+                1 if request.command == 'fail' else 0)
+            response.return_value.stdout = 'run {}'.format(
+                run_bash.call_count)
+            return response
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash',
+                        side_effect=mock_run_bash, create=True) as run_bash:
+            yield run_bash
+
+    @staticmethod
+    @pytest.mark.parametrize('ttl', [0, -1, None, '60', True])
+    def test_bad_ttl(ttl):
+        with pytest.raises(ValueError):
+            libs.CommandCache(ttl)
+
+    @staticmethod
+    @pytest.mark.parametrize('max_size', [0, -1, 1.5, None, True])
+    def test_bad_max_size(max_size):
+        with pytest.raises(ValueError):
+            libs.CommandCache(60, max_size)
+
+    @staticmethod
+    def test_run_bash(remote_connection, clock, engine_run_bash):
+        cache = libs.CommandCache(60, clock=clock)
+        first = cache.run_bash(remote_connection, 'cat /etc/oratab')
+        first.stdout = 'changed by the caller'
+        second = cache.run_bash(remote_connection, 'cat /etc/oratab')
+
+        assert second.stdout == 'run 1'
+        assert (cache.hits, cache.misses) == (1, 1)
+        assert engine_run_bash.call_count == 1
+
+        # The module's function is never cached.
+        libs.run_bash(remote_connection, 'cat /etc/oratab')
+        assert engine_run_bash.call_count == 2
+
+    @staticmethod
+    def test_expires(remote_connection, clock, engine_run_bash):
+        cache = libs.CommandCache(60, clock=clock)
+        cache.run_bash(remote_connection, 'command')
+        clock.now[0] += 60
+        result = cache.run_bash(remote_connection, 'command')
+
+        assert result.stdout == 'run 2'
+        assert (cache.hits, cache.misses) == (0, 2)
+
+    @staticmethod
+    def test_key(remote_connection, clock, engine_run_bash):
+        cache = libs.CommandCache(60, clock=clock)
+        other_user = RemoteConnection(remote_connection.environment,
+                                      RemoteUser('user', 'other-reference'))
+        calls = [
+            (remote_connection, 'command', None, False),
+            (remote_connection, 'other command', None, False),
+            (remote_connection, 'command', {'name': 'value'}, False),
+            (remote_connection, 'command', None, True),
+            (other_user, 'command', None, False),
+            (_host_connection('host'), 'command', None, False)
+        ]
+        for call in calls + calls:
+            cache.run_bash(*call)
+
+        assert (cache.hits, cache.misses) == (6, 6)
+        assert len(cache) == 6
+
+    @staticmethod
+    def test_failures_not_cached(remote_connection, clock, engine_run_bash):
+        cache = libs.CommandCache(60, clock=clock)
+        for _ in range(2):
+            assert cache.run_bash(remote_connection, 'fail').exit_code == 1
+            with pytest.raises(PluginScriptError):
+                cache.run_bash(remote_connection, 'fail', check=True)
+
+        assert engine_run_bash.call_count == 4
+        assert len(cache) == 0
+
+    @staticmethod
+    def test_errors_not_cached(remote_connection, clock):
+        cache = libs.CommandCache(60, clock=clock)
+        response = libs_pb2.RunBashResponse()
+        response.error.actionable_error.id = 15
+        response.error.actionable_error.message = 'error message'
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash',
+                        return_value=response, create=True):
+            with pytest.raises(LibraryError):
+                cache.run_bash(remote_connection, 'command')
+
+        assert len(cache) == 0
+
+    @staticmethod
+    def test_evicts_least_recently_used(
+            remote_connection, clock, engine_run_bash):
+        cache = libs.CommandCache(60, max_size=2, clock=clock)
+        cache.run_bash(remote_connection, 'command1')
+        cache.run_bash(remote_connection, 'command2')
+        cache.run_bash(remote_connection, 'command1')
+        cache.run_bash(remote_connection, 'command3')
+        cache.run_bash(remote_connection, 'command1')
+        cache.run_bash(remote_connection, 'command2')
+
+        assert len(cache) == 2
+        assert (cache.hits, cache.misses) == (2, 4)
+
+    @staticmethod
+    def test_invalidate(remote_connection, clock, engine_run_bash):
+        cache = libs.CommandCache(60, clock=clock)
+        other_host = _host_connection('host')
+        for connection in (remote_connection, other_host):
+            cache.run_bash(connection, 'command1')
+            cache.run_bash(connection, 'command2')
+
+        assert cache.invalidate(remote_connection, 'command1') == 1
+        assert cache.invalidate(remote_connection) == 1
+        assert cache.invalidate(command='command2') == 1
+        assert len(cache) == 1
+        assert cache.invalidations == 3
+
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.invalidations == 3
+
+    @staticmethod
+    def test_run_powershell(remote_connection, clock):
+        cache = libs.CommandCache(60, clock=clock)
+        response = libs_pb2.RunPowerShellResponse()
+        response.return_value.exit_code = 0
+        response.return_value.stdout = 'Running'
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_powershell',
+                        return_value=response, create=True) as run_powershell:
+            for _ in range(2):
+                result = cache.run_powershell(
+                    remote_connection, 'Get-Service', {'name': 'value'})
+                assert result.stdout == 'Running'
+
+        assert run_powershell.call_count == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    @staticmethod
+    def test_bad_variables(remote_connection):
+        cache = libs.CommandCache(60)
+        with pytest.raises(IncorrectArgumentTypeError) as err_info:
+            cache.run_bash(remote_connection, 'command', {'name': 10})
+
+        assert str(err_info.value) == (
+            "The function run_bash's argument 'variables' was"
+            " a dict of {type 'str':type 'int'} but should be of"
+            " type 'dict of basestring:basestring' if defined.")
+
+
 class TestLibsRunSync:
     @staticmethod
     def test_run_sync(remote_connection):
@@ -773,3 +1493,85 @@ class TestLibsRunExpect:
             " a dict of {type 'str':type 'int', type 'str':type 'str'}"
             " but should be of"
             " type 'dict of basestring:basestring' if defined.")
+
+
+class TestLibsDeadline:
+    CALLS = [
+        ('run_bash', libs_pb2.RunBashResponse, ('command',)),
+        ('run_bash_batch', libs_pb2.RunBashBatchResponse, (['command'],)),
+        ('run_sync', libs_pb2.RunSyncResponse, ('source_directory',)),
+        ('run_powershell', libs_pb2.RunPowerShellResponse, ('command',)),
+        ('run_expect', libs_pb2.RunExpectResponse, ('command',))]
+
+    @staticmethod
+    @pytest.mark.parametrize('func_name,response_type,args', CALLS)
+    def test_no_deadline(remote_connection, func_name, response_type, args):
+        def mock_call(request):
+            assert request.timeout_millis == 0
+            response = response_type()
+            response.return_value.SetInParent()
+            return response
+
+        with mock.patch('dlpx.virtualization._engine.libs.' + func_name,
+                        side_effect=mock_call, create=True) as mock_libs:
+            getattr(libs, func_name)(remote_connection, *args)
+        assert mock_libs.call_count == 1
+
+    @staticmethod
+    @pytest.mark.parametrize('func_name,response_type,args', CALLS)
+    def test_timeout_from_deadline(
+            remote_connection, func_name, response_type, args):
+        def mock_call(request):
+            assert 0 < request.timeout_millis <= 30000
+            response = response_type()
+            response.return_value.SetInParent()
+            return response
+
+        with mock.patch('dlpx.virtualization._engine.libs.' + func_name,
+                        side_effect=mock_call, create=True) as mock_libs:
+            with deadline_scope(time.time() + 30):
+                getattr(libs, func_name)(remote_connection, *args)
+        assert mock_libs.call_count == 1
+
+    @staticmethod
+    @pytest.mark.parametrize('func_name,response_type,args', CALLS)
+    def test_deadline_passed(
+            remote_connection, func_name, response_type, args):
+        with mock.patch('dlpx.virtualization._engine.libs.' + func_name,
+                        create=True) as mock_libs:
+            with deadline_scope(time.time() - 10):
+                with pytest.raises(DeadlineExceededError) as err_info:
+                    getattr(libs, func_name)(remote_connection, *args)
+        assert not mock_libs.called
+        assert str(err_info.value).startswith(
+            'The deadline of the operation passed 10.')
+        assert str(err_info.value).endswith(' before {}.'.format(func_name))
+
+    @staticmethod
+    def test_failed_after_deadline(remote_connection):
+        def mock_run_bash(request):
+            # The engine stops the command once it runs out of time.
+            time.sleep(request.timeout_millis / 1000.0)
+            response = libs_pb2.RunBashResponse()
+            response.error.actionable_error.id = 1
+            response.error.actionable_error.message = 'timed out'
+            return response
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash',
+                        side_effect=mock_run_bash, create=True):
+            with deadline_scope(time.time() + 0.01):
+                with pytest.raises(DeadlineExceededError) as err_info:
+                    libs.run_bash(remote_connection, 'command')
+        assert str(err_info.value).endswith(' while run_bash.')
+
+    @staticmethod
+    def test_failed_before_deadline(remote_connection):
+        response = libs_pb2.RunBashResponse()
+        response.error.actionable_error.id = 1
+        response.error.actionable_error.message = 'error'
+
+        with mock.patch('dlpx.virtualization._engine.libs.run_bash',
+                        return_value=response, create=True):
+            with deadline_scope(time.time() + 30):
+                with pytest.raises(LibraryError):
+                    libs.run_bash(remote_connection, 'command')
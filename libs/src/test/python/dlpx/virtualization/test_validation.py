@@ -0,0 +1,98 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+import pytest
+
+from dlpx.virtualization.libs._validation import compile_validator
+from dlpx.virtualization.libs.exceptions import IncorrectArgumentTypeError
+
+
+@pytest.fixture
+def validate():
+    return compile_validator('run_thing', [
+        ('number', int),
+        ('name', basestring, False),
+        ('paths', [basestring], False),
+        ('variables', {basestring: basestring}, False),
+        ('flags', [bool]),
+        ('labels', {basestring: int})])
+
+
+class TestCompileValidator:
+    @staticmethod
+    def test_valid(validate):
+        validate(1, None, None, None, [], {})
+        validate(1, 'name', ['path'], {'name': 'value'}, [True],
+                 {'label': 1})
+        # Optional arguments may be any false value.
+        validate(1, '', [], {}, [], {})
+
+    @staticmethod
+    @pytest.mark.parametrize('args,message', [
+        ((None, None, None, None, [], {}),
+         "The function run_thing's argument 'number' was type 'NoneType'"
+         " but should be of type 'int'."),
+        ((1, 2, None, None, [], {}),
+         "The function run_thing's argument 'name' was type 'int'"
+         " but should be of type 'basestring' if defined."),
+        ((1, None, 'path', None, [], {}),
+         "The function run_thing's argument 'paths' was type 'str'"
+         " but should be of type 'list of basestring' if defined."),
+        ((1, None, ['path', 2], None, [], {}),
+         "The function run_thing's argument 'paths' was a list of"
+         " [type 'str', type 'int'] but should be of"
+         " type 'list of basestring' if defined."),
+        ((1, None, None, ['name'], [], {}),
+         "The function run_thing's argument 'variables' was type 'list'"
+         " but should be of type 'dict of basestring:basestring'"
+         " if defined."),
+        ((1, None, None, {'name': 1}, [], {}),
+         "The function run_thing's argument 'variables' was a dict of"
+         " {type 'str':type 'int'} but should be of"
+         " type 'dict of basestring:basestring' if defined."),
+        ((1, None, None, None, None, {}),
+         "The function run_thing's argument 'flags' was type 'NoneType'"
+         " but should be of type 'list of bool'."),
+        ((1, None, None, None, [], {'label': 'one'}),
+         "The function run_thing's argument 'labels' was a dict of"
+         " {type 'str':type 'str'} but should be of"
+         " type 'dict of basestring:int'."),
+    ])
+    def test_invalid(validate, args, message):
+        with pytest.raises(IncorrectArgumentTypeError) as err_info:
+            validate(*args)
+        assert str(err_info.value) == message
+
+    @staticmethod
+    def test_first_invalid_argument(validate):
+        with pytest.raises(IncorrectArgumentTypeError) as err_info:
+            validate(1, 2, 3, 4, 5, 6)
+        assert "argument 'name'" in str(err_info.value)
+
+    @staticmethod
+    @pytest.mark.parametrize('name', ['_private', 'a b', 'x)', ''])
+    def test_bad_argument_name(name):
+        with pytest.raises(ValueError):
+            compile_validator('run_thing', [(name, int)])
+
+    @staticmethod
+    @pytest.mark.parametrize('args,message', [
+        (('host', 1, None, 4),
+         "The function run_thing's argument 'commands[4][1]' was"
+         " type 'int' but should be of type 'basestring'."),
+        (('host', 'command', {'name': 1}, 0),
+         "The function run_thing's argument 'commands[0][2]' was a dict of"
+         " {type 'str':type 'int'} but should be of"
+         " type 'dict of basestring:basestring' if defined."),
+    ])
+    def test_item_of(args, message):
+        validate = compile_validator('run_thing', [
+            ('host', basestring),
+            ('command', basestring),
+            ('variables', {basestring: basestring}, False)], 'commands')
+        validate('host', 'command', None, 0)
+
+        with pytest.raises(IncorrectArgumentTypeError) as err_info:
+            validate(*args)
+        assert str(err_info.value) == message
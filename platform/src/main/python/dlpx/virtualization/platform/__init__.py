@@ -6,3 +6,5 @@ __path__ = __import__('pkgutil').extend_path(__path__, __name__)
 
 from dlpx.virtualization.platform._plugin_classes import *
 from dlpx.virtualization.platform._plugin import *
+from dlpx.virtualization.platform._metrics import *
+from dlpx.virtualization.platform._memo import *
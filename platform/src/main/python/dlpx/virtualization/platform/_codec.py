@@ -0,0 +1,95 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""JSON codecs for plugin defined objects
+
+Plugin defined objects cross the protobuf boundary as JSON strings. Every
+payload the wrappers decode or encode goes through a JsonCodec, which is
+chosen once when this module is imported: a faster implementation if one is
+importable, otherwise the standard library's json module.
+
+A faster codec is only listed here if it produces byte-identical output to
+the standard library for every payload a plugin can produce, and decodes to
+equal values of the same types. test_codec checks this for every codec
+importable where the tests run.
+"""
+
+import json
+
+__all__ = [
+    "JsonCodec",
+    "STDLIB_CODEC",
+    "available_codecs",
+    "default_codec"]
+
+
+class JsonCodec(object):
+    """Decodes and encodes the JSON payloads of plugin defined objects.
+
+    Args:
+        name (str): The name of the module providing the implementation.
+        loads (function): Turns a JSON string into Python values.
+        dumps (function): Turns Python values into a JSON string.
+    """
+
+    def __init__(self, name, loads, dumps):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.name)
+
+
+STDLIB_CODEC = JsonCodec('json', json.loads, json.dumps)
+
+
+def _simplejson_codec():
+    """Returns a codec decoding with simplejson, or None if it isn't
+    importable with its C extension. Without the extension it is slower than
+    json.
+
+    Only simplejson's decoder is used. Its encoder is slower than the C
+    encoder of json on Python 2.7 for the payloads plugins produce.
+
+    Given a str, simplejson decodes ASCII strings to str where json decodes
+    them to unicode, so payloads are decoded from UTF-8 first, as json does,
+    for plugin code to see the same types whichever codec is used.
+    """
+    try:
+        import simplejson._speedups
+    except ImportError:
+        return None
+
+    def loads(payload):
+        if isinstance(payload, str):
+            payload = payload.decode('utf-8')
+        return simplejson.loads(payload)
+    return JsonCodec('simplejson', loads, json.dumps)
+
+
+# Faster codecs in order of preference.
+_CANDIDATES = (_simplejson_codec,)
+
+
+def available_codecs():
+    """Returns every codec importable in this environment, fastest first.
+
+    The standard library codec is always last.
+    """
+    codecs = []
+    for candidate in _CANDIDATES:
+        codec = candidate()
+        if codec is not None:
+            codecs.append(codec)
+    codecs.append(STDLIB_CODEC)
+    return codecs
+
+
+_DEFAULT_CODEC = available_codecs()[0]
+
+
+def default_codec():
+    """Returns the codec used by plugins that don't specify one."""
+    return _DEFAULT_CODEC
@@ -0,0 +1,101 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Limits on the operations running at once on an environment
+
+A Plugin may be invoked from several threads at once. Most operations run
+remote commands on the environment of the source or connection they are
+given, so many operations on sources of the same host can overload it. A
+plugin can cap how many operations run at once on each environment with the
+max_operations_per_environment argument of Plugin. Operations over the limit
+wait for one of the running operations on that environment to finish, up to
+their deadline (see dlpx.virtualization.common.remaining_time), after which
+they raise EnvironmentLimitTimeoutError without running.
+"""
+
+import contextlib
+import threading
+
+from dlpx.virtualization.common._deadline import remaining_time
+from dlpx.virtualization.platform.exceptions import (
+    EnvironmentLimitTimeoutError)
+
+__all__ = ["EnvironmentLimiter"]
+
+
+class EnvironmentLimiter(object):
+    """Caps the number of operations running at once on each environment,
+    identified by its reference.
+
+    Only the environments with operations running are tracked, so the
+    limiter doesn't grow with the number of environments it has seen.
+
+    Args:
+        max_operations (int): The maximum number of operations running at
+            once on one environment.
+
+    Attributes:
+        waits (int): The number of operations that had to wait for another
+            operation on their environment to finish.
+        timeouts (int): The number of operations whose deadline passed while
+            they waited.
+    """
+
+    def __init__(self, max_operations):
+        if (not isinstance(max_operations, (int, long))
+                or isinstance(max_operations, bool) or max_operations < 1):
+            raise ValueError(
+                'The maximum number of operations per environment must be a'
+                ' positive integer. Found {}'.format(max_operations))
+        self._max_operations = max_operations
+        # The number of operations running on each environment, without the
+        # environments that have none.
+        self._running = {}
+        self._condition = threading.Condition(threading.Lock())
+        self.waits = 0
+        self.timeouts = 0
+
+    @property
+    def max_operations(self):
+        return self._max_operations
+
+    def __len__(self):
+        """Returns the number of environments with operations running."""
+        return len(self._running)
+
+    def _acquire(self, reference):
+        with self._condition:
+            running = self._running.get(reference, 0)
+            if running >= self._max_operations:
+                self.waits += 1
+                while running >= self._max_operations:
+                    left = remaining_time()
+                    if left is not None and left <= 0:
+                        self.timeouts += 1
+                        raise EnvironmentLimitTimeoutError(
+                            reference, self._max_operations, -left)
+                    self._condition.wait(left)
+                    running = self._running.get(reference, 0)
+            self._running[reference] = running + 1
+
+    def _release(self, reference):
+        with self._condition:
+            running = self._running[reference] - 1
+            if running:
+                self._running[reference] = running
+            else:
+                del self._running[reference]
+            self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def limit(self, reference):
+        """Runs the body once fewer than max_operations other operations are
+        running on the environment, or raises EnvironmentLimitTimeoutError if
+        the deadline of the operation passes first.
+        """
+        self._acquire(reference)
+        try:
+            yield
+        finally:
+            self._release(reference)
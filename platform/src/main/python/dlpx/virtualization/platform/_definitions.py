@@ -0,0 +1,314 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Decoding of plugin defined objects
+
+Plugin defined objects (repositories, source configs, linked and virtual
+sources, snapshots and snapshot parameters) cross the protobuf boundary as
+JSON and are handed to plugin operations as instances of the classes generated
+from the plugin's schemas (generated.definitions).
+
+PluginDefinitions resolves those generated classes and decodes the JSON into
+them. A Plugin can opt into a DefinitionCache so byte-identical payloads, which
+the engine sends to operations such as status and worker over and over, are
+only decoded once. The generated classes themselves are resolved once per
+Plugin, the first time they are needed or when Plugin.warmup() is called. A
+Plugin can also opt into lazy decoding, in which case
+operations receive LazyDefinition proxies that only decode their payload the
+first time one of their attributes is used.
+"""
+
+import collections
+import copy
+import hashlib
+import importlib
+import threading
+
+from dlpx.virtualization.platform._codec import default_codec
+
+__all__ = [
+    "DefinitionCache",
+    "LazyDefinition",
+    "PluginDefinitions"]
+
+_MISSING = object()
+
+# Held while a LazyDefinition stores the object it was materialized to.
+_MATERIALIZE_LOCK = threading.Lock()
+
+# The generated classes of every plugin defined object passed to or returned
+# by plugin operations. The SDK requires a schema for each of them.
+DEFINITION_CLASS_NAMES = (
+    'RepositoryDefinition',
+    'SourceConfigDefinition',
+    'VirtualSourceDefinition',
+    'LinkedSourceDefinition',
+    'SnapshotDefinition',
+    'SnapshotParametersDefinition')
+
+# Types whose instances can be shared between copies of a decoded object.
+_IMMUTABLE_TYPES = (basestring, bool, int, long, float, complex, type(None))
+
+
+def _copy_definition(value):
+    """Returns a copy of a decoded plugin defined object.
+
+    Decoded objects are made of generated model instances, lists, dicts and
+    JSON scalars. Those are copied directly, which is much cheaper than
+    copy.deepcopy. Anything else falls back to copy.deepcopy.
+    """
+    if isinstance(value, _IMMUTABLE_TYPES):
+        return value
+    if isinstance(value, list):
+        return [_copy_definition(item) for item in value]
+    if isinstance(value, dict):
+        return dict((key, _copy_definition(item))
+                    for key, item in value.iteritems())
+    if hasattr(value, 'swagger_types') and hasattr(value, '__dict__'):
+        copied = value.__class__.__new__(value.__class__)
+        for name, item in value.__dict__.iteritems():
+            if name in ('swagger_types', 'attribute_map'):
+                # These describe the class and are never modified.
+                copied.__dict__[name] = item
+            else:
+                copied.__dict__[name] = _copy_definition(item)
+        return copied
+    return copy.deepcopy(value)
+
+
+class DefinitionCache(object):
+    """A bounded, least recently used cache of decoded plugin defined objects.
+
+    Entries are keyed by the generated class and a digest of the JSON payload
+    they were decoded from. The cached instances are never handed out to
+    plugin code. Every lookup returns a copy, so plugin code that mutates the
+    objects it receives can't affect later operations.
+
+    Args:
+        max_size (int): The maximum number of decoded objects to keep.
+
+    Attributes:
+        hits (int): The number of lookups served from the cache.
+        misses (int): The number of lookups that had to decode the payload.
+    """
+
+    def __init__(self, max_size):
+        if (not isinstance(max_size, (int, long))
+                or isinstance(max_size, bool) or max_size < 1):
+            raise ValueError(
+                'The definition cache size must be a positive integer.'
+                ' Found {}'.format(max_size))
+        self._max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _digest(json_string):
+        if isinstance(json_string, unicode):
+            json_string = json_string.encode('utf-8')
+        return hashlib.sha1(json_string).digest()
+
+    def get(self, definition_class, json_string, decode):
+        """Returns a copy of the object decoded from json_string.
+
+        Args:
+            definition_class (type): The generated class of the object.
+            json_string (str): The JSON payload of the object.
+            decode (function): Called with definition_class and json_string
+                to build the object on a cache miss.
+        """
+        key = (definition_class, self._digest(json_string))
+        with self._lock:
+            instance = self._entries.pop(key, _MISSING)
+            if instance is not _MISSING:
+                # Re-insert to mark the entry as the most recently used.
+                self._entries[key] = instance
+                self.hits += 1
+        if instance is _MISSING:
+            instance = decode(definition_class, json_string)
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = instance
+                while len(self._entries) > self._max_size:
+                    self._entries.popitem(last=False)
+        return _copy_definition(instance)
+
+    def clear(self):
+        """Drops all entries and resets the hit and miss counts."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class LazyDefinition(object):
+    """A proxy for a plugin defined object that is decoded on first use.
+
+    The JSON payload is only decoded, and the generated class only built, the
+    first time an attribute of the proxy is read or written. Any error raised
+    while decoding is therefore raised at that point rather than before the
+    operation is called, but it is the same error.
+
+    The proxy reports the generated class as its __class__, so isinstance
+    checks against the generated classes behave as they do for the decoded
+    object. Equality, hashing, repr and copies are delegated to the decoded
+    object as well.
+
+    Args:
+        definitions (PluginDefinitions): Used to decode the payload.
+        class_name (str): The name of the generated class.
+        json_string (str): The JSON payload of the object.
+    """
+    __slots__ = ('_definitions', '_class_name', '_json_string', '_target')
+
+    def __init__(self, definitions, class_name, json_string):
+        object.__setattr__(self, '_definitions', definitions)
+        object.__setattr__(self, '_class_name', class_name)
+        object.__setattr__(self, '_json_string', json_string)
+        object.__setattr__(self, '_target', _MISSING)
+
+    def _materialize(self):
+        target = object.__getattribute__(self, '_target')
+        if target is _MISSING:
+            target = self._definitions.materialize(
+                self._class_name, self._json_string)
+            with _MATERIALIZE_LOCK:
+                # Another thread may have materialized the proxy meanwhile,
+                # and changes may already have been made to its object.
+                current = object.__getattribute__(self, '_target')
+                if current is _MISSING:
+                    object.__setattr__(self, '_target', target)
+                else:
+                    target = current
+        return target
+
+    @property
+    def __class__(self):
+        return self._definitions.get_class(self._class_name)
+
+    def __getattr__(self, name):
+        return getattr(self._materialize(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._materialize(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self._materialize(), name)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyDefinition):
+            other = other._materialize()
+        return self._materialize() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._materialize())
+
+    def __repr__(self):
+        return repr(self._materialize())
+
+    def __str__(self):
+        return str(self._materialize())
+
+    def __copy__(self):
+        return copy.copy(self._materialize())
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(self._materialize(), memo)
+
+
+def type_of(value):
+    """Returns the type of value, seeing through LazyDefinition proxies.
+
+    Used when reporting the type of a returned object in error messages so
+    they read the same whether or not lazy decoding is enabled.
+    """
+    if type(value) is LazyDefinition:
+        return value.__class__
+    return type(value)
+
+
+class PluginDefinitions(object):
+    """Resolves and decodes the plugin defined objects of a Plugin.
+
+    Args:
+        cache (DefinitionCache): Optional cache of decoded objects.
+        lazy (bool): If True, decode() returns LazyDefinition proxies.
+        codec (JsonCodec): The JSON codec of the payloads. Defaults to
+            _codec.default_codec().
+    """
+
+    def __init__(self, cache=None, lazy=False, codec=None):
+        self._cache = cache
+        self._lazy = lazy
+        self._codec = codec if codec is not None else default_codec()
+        self._classes = {}
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def lazy(self):
+        return self._lazy
+
+    @property
+    def codec(self):
+        return self._codec
+
+    def get_class(self, class_name):
+        """Returns the generated class named class_name.
+
+        The generated definitions only exist at runtime. See the docstring of
+        _plugin for why they are not imported at module level. Each class is
+        only looked up the first time it is needed.
+        """
+        try:
+            return self._classes[class_name]
+        except KeyError:
+            definitions = importlib.import_module('generated.definitions')
+            definition_class = getattr(definitions, class_name)
+            self._classes[class_name] = definition_class
+            return definition_class
+
+    def resolve_all(self):
+        """Looks up every generated class ahead of the first operation."""
+        for class_name in DEFINITION_CLASS_NAMES:
+            self.get_class(class_name)
+
+    def _from_json(self, definition_class, json_string):
+        return definition_class.from_dict(self._codec.loads(json_string))
+
+    def decode(self, class_name, json_string):
+        """Returns an instance of the generated class named class_name built
+        from json_string, or a LazyDefinition proxy for it if lazy decoding is
+        enabled.
+        """
+        if self._lazy:
+            return LazyDefinition(self, class_name, json_string)
+        return self.materialize(class_name, json_string)
+
+    def materialize(self, class_name, json_string):
+        """Returns an instance of the generated class named class_name built
+        from json_string.
+        """
+        definition_class = self.get_class(class_name)
+        if self._cache is None:
+            return self._from_json(definition_class, json_string)
+        return self._cache.get(definition_class, json_string, self._from_json)
+
+    def encode(self, definition):
+        """Returns the JSON payload of a plugin defined object."""
+        return self._codec.dumps(definition.to_dict())
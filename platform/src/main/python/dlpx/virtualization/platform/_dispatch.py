@@ -0,0 +1,943 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Table-driven dispatch for the Virtualization Platform API wrappers.
+
+Every plugin operation follows the same shape: decode the protobuf request into
+plugin classes and plugin defined objects, call the implementation registered
+by the plugin author, validate what it returned and pack that into the
+protobuf response. Rather than having each wrapper in _plugin hand-roll those
+steps, each wrapper is described once by an OperationSpec and all of them run
+through dispatch().
+
+An OperationSpec lists the keyword arguments the implementation receives, each
+paired with a decoder that builds the argument from the request, and a result
+handler that validates and encodes the implementation's return value.
+
+OPERATIONS maps every Operation to the specs that implement it. Most operations
+have exactly one spec. linked.pre_snapshot() and linked.post_snapshot() have
+two, one for direct and one for staged sources, as they take different
+requests.
+
+The discovery operations may also yield their results instead of returning a
+list. Those are validated and packed into the response one at a time as the
+implementation produces them, and the plugin author can cap how many are
+collected.
+
+Source config discovery can also run for several repositories at once. See
+dispatch_source_config_batch().
+
+The status operations can cache their responses per source in the
+StatusCache of their operations object. The specs of the operations that
+change the state of a source drop its cached status.
+
+An operation given a timeout runs with a deadline, which the libs calls it
+makes turn into the timeouts of their remote commands.
+
+The operations a plugin chose to memoize return the response remembered by
+their OperationMemo for an identical request, without running again.
+"""
+
+import collections
+import sys
+import threading
+import time
+import timeit
+import traceback
+import types
+
+from dlpx.virtualization import platform_pb2
+from dlpx.virtualization.common import RemoteConnection, RemoteEnvironment
+from dlpx.virtualization.common._deadline import (current_deadline,
+                                                  deadline_scope)
+from dlpx.virtualization.common.exceptions import (PlatformError,
+                                                   PluginRuntimeError)
+from dlpx.virtualization.platform._definitions import type_of
+from dlpx.virtualization.platform._metrics import Phase
+from dlpx.virtualization.platform._plugin_classes import (DirectSource,
+                                                          Mount,
+                                                          MountSpecification,
+                                                          StagedSource,
+                                                          Status,
+                                                          VirtualSource)
+from dlpx.virtualization.platform.exceptions import (IncorrectReturnTypeError,
+                                                     UserError,
+                                                     OperationNotDefinedError)
+from dlpx.virtualization.platform.operation import Operation as Op
+
+
+#
+# Argument decoders. Each takes the request and the PluginDefinitions of the
+# plugin and returns the value passed to the plugin's implementation.
+#
+
+def _definition(field, class_name):
+    """Decodes the plugin defined object stored in request.<field>."""
+    def decode(request, definitions):
+        return definitions.decode(
+            class_name, getattr(request, field).parameters.json)
+    return decode
+
+
+def _source_connection(request, definitions):
+    return RemoteConnection.from_proto(request.source_connection)
+
+
+def _subset_mounts(subset_mounts):
+    """Decodes the repeated SingleSubsetMount field of a virtual source.
+
+    Sources such as sharded databases have many mounts on a handful of
+    environments. Each distinct environment, identified by its reference, is
+    decoded once and the RemoteEnvironment is shared by all its mounts.
+    """
+    environments = {}
+    mounts = []
+    for subset_mount in subset_mounts:
+        remote_environment = subset_mount.remote_environment
+        reference = remote_environment.reference
+        environment = environments.get(reference)
+        if environment is None:
+            environment = RemoteEnvironment.from_proto(remote_environment)
+            if reference:
+                environments[reference] = environment
+        mounts.append(Mount(remote_environment=environment,
+                            mount_path=subset_mount.mount_path,
+                            shared_path=subset_mount.shared_path))
+    return mounts
+
+
+def _virtual_source(request, definitions):
+    virtual_source = request.virtual_source
+    parameters = definitions.decode(
+        'VirtualSourceDefinition', virtual_source.parameters.json)
+    return VirtualSource(
+        guid=virtual_source.guid,
+        connection=RemoteConnection.from_proto(virtual_source.connection),
+        parameters=parameters,
+        mounts=_subset_mounts(virtual_source.mounts))
+
+
+def _direct_source(request, definitions):
+    direct_source = request.direct_source
+    parameters = definitions.decode(
+        'LinkedSourceDefinition', direct_source.linked_source.parameters.json)
+    return DirectSource(
+        guid=direct_source.linked_source.guid,
+        connection=RemoteConnection.from_proto(direct_source.connection),
+        parameters=parameters)
+
+
+def _staged_source(request, definitions):
+    staged_source = request.staged_source
+    parameters = definitions.decode(
+        'LinkedSourceDefinition', staged_source.linked_source.parameters.json)
+    staged_mount = staged_source.staged_mount
+    mount = Mount(
+        remote_environment=RemoteEnvironment.from_proto(
+            staged_mount.remote_environment),
+        mount_path=staged_mount.mount_path,
+        shared_path=staged_mount.shared_path)
+    return StagedSource(
+        guid=staged_source.linked_source.guid,
+        source_connection=RemoteConnection.from_proto(
+            staged_source.source_connection),
+        parameters=parameters,
+        mount=mount,
+        staged_connection=RemoteConnection.from_proto(
+            staged_source.staged_connection))
+
+
+_REPOSITORY = ('repository', _definition('repository', 'RepositoryDefinition'))
+_SOURCE_CONFIG = ('source_config',
+                  _definition('source_config', 'SourceConfigDefinition'))
+_SNAPSHOT = ('snapshot', _definition('snapshot', 'SnapshotDefinition'))
+_SNAPSHOT_PARAMETERS = ('snapshot_parameters',
+                        _definition('snapshot_parameters',
+                                    'SnapshotParametersDefinition'))
+_SOURCE_CONNECTION = ('source_connection', _source_connection)
+_VIRTUAL_SOURCE = ('virtual_source', _virtual_source)
+_DIRECT_SOURCE = ('direct_source', _direct_source)
+_STAGED_SOURCE = ('staged_source', _staged_source)
+
+
+def _staged_source_guid(request):
+    return request.staged_source.linked_source.guid
+
+
+def _virtual_source_guid(request):
+    return request.virtual_source.guid
+
+
+def _source_connection_environment(request):
+    return request.source_connection.environment.reference
+
+
+def _direct_source_environment(request):
+    return request.direct_source.connection.environment.reference
+
+
+def _staged_source_environment(request):
+    # Staged operations run their commands on the staging environment.
+    return request.staged_source.staged_connection.environment.reference
+
+
+def _virtual_source_environment(request):
+    return request.virtual_source.connection.environment.reference
+
+
+# The environment an operation runs on, keyed by the name of the argument its
+# connection is found in.
+_ENVIRONMENTS = {
+    'source_connection': _source_connection_environment,
+    'direct_source': _direct_source_environment,
+    'staged_source': _staged_source_environment,
+    'virtual_source': _virtual_source_environment,
+}
+
+
+#
+# Result handlers. validate() raises if the implementation returned the wrong
+# type and encode() packs the returned value into the response. Both take the
+# operation being run first and the PluginDefinitions of the plugin last.
+#
+
+class _EmptyResult(object):
+    """The operation returns nothing and responds with an empty result."""
+
+    def validate(self, operation, result, definitions):
+        pass
+
+    def encode(self, operation, response, result, definitions):
+        # Marks the empty result as set without building one to copy in.
+        response.return_value.SetInParent()
+
+
+class _StatusResult(object):
+    """The operation returns a Status."""
+
+    def validate(self, operation, result, definitions):
+        if not isinstance(result, Status):
+            raise IncorrectReturnTypeError(operation, type(result), Status)
+
+    def encode(self, operation, response, result, definitions):
+        response.return_value.status = result.value
+
+
+class _DefinitionResult(object):
+    """The operation returns a single plugin defined object which is stored
+    in response.return_value.<field>.
+    """
+
+    def __init__(self, field, class_name):
+        self._field = field
+        self._class_name = class_name
+
+    def validate(self, operation, result, definitions):
+        definition_class = definitions.get_class(self._class_name)
+        if not isinstance(result, definition_class):
+            raise IncorrectReturnTypeError(
+                operation, type_of(result), definition_class)
+
+    def encode(self, operation, response, result, definitions):
+        getattr(response.return_value, self._field).parameters.json = (
+            definitions.encode(result))
+
+
+class _DefinitionListResult(object):
+    """The operation returns a list of plugin defined objects, or yields them,
+    which are stored in the repeated field response.return_value.<field>.
+
+    A list is validated as a whole before anything is encoded. Yielded
+    objects are validated and encoded one at a time, so only the response
+    holds all of them.
+    """
+
+    def __init__(self, field, class_name):
+        self._field = field
+        self._class_name = class_name
+
+    def validate(self, operation, result, definitions):
+        definition_class = definitions.get_class(self._class_name)
+        if isinstance(result, types.GeneratorType):
+            # The yielded objects are checked as they are encoded.
+            return
+
+        if not isinstance(result, list):
+            raise IncorrectReturnTypeError(
+                operation, type(result), [definition_class])
+
+        if not all(isinstance(item, definition_class) for item in result):
+            raise IncorrectReturnTypeError(
+                operation,
+                [type_of(item) for item in result],
+                [definition_class])
+
+    def encode(self, operation, response, result, definitions):
+        repeated = getattr(response.return_value, self._field)
+        if not isinstance(result, types.GeneratorType):
+            for item in result:
+                repeated.add().parameters.json = definitions.encode(item)
+            return
+
+        # A wrongly typed item is reported like one in a returned list, with
+        # the types of the items yielded up to and including it.
+        definition_class = definitions.get_class(self._class_name)
+        for item in result:
+            if not isinstance(item, definition_class):
+                raise IncorrectReturnTypeError(
+                    operation,
+                    [definition_class] * len(repeated) + [type_of(item)],
+                    [definition_class])
+            repeated.add().parameters.json = definitions.encode(item)
+
+
+def _first(results, max_results):
+    """Returns the first max_results of a list or generator of results.
+
+    A generator is closed as soon as max_results have been taken from it, so
+    the implementation stops discovering and its finally blocks run. Anything
+    else is returned as is to be rejected by the result handler.
+    """
+    if isinstance(results, list):
+        return results[:max_results]
+    if not isinstance(results, types.GeneratorType):
+        return results
+
+    def first():
+        try:
+            if max_results < 1:
+                return
+            for count, item in enumerate(results, 1):
+                yield item
+                if count == max_results:
+                    return
+        finally:
+            results.close()
+    return first()
+
+
+def _encode_ownership_spec(ownership_spec_protobuf, ownership_spec):
+    ownership_spec_protobuf.uid = ownership_spec.uid
+    ownership_spec_protobuf.gid = ownership_spec.gid
+
+
+class _StagedMountSpecResult(object):
+    """linked.mount_specification() returns a MountSpecification with exactly
+    one mount that has no shared path.
+    """
+
+    def validate(self, operation, result, definitions):
+        if not isinstance(result, MountSpecification):
+            raise IncorrectReturnTypeError(
+                operation, type(result), MountSpecification)
+
+        # Only one mount is supported for linked sources.
+        mount_len = len(result.mounts)
+        if mount_len != 1:
+            raise PluginRuntimeError(
+                'Exactly one mount must be provided for staging sources.'
+                ' Found {}'.format(mount_len))
+
+        if result.mounts[0].shared_path:
+            raise PluginRuntimeError(
+                'Shared path is not supported for linked sources.')
+
+    def encode(self, operation, response, result, definitions):
+        mount = result.mounts[0]
+        staged_mount = response.return_value.staged_mount
+        staged_mount.mount_path = mount.mount_path
+        mount.remote_environment.to_proto(staged_mount.remote_environment)
+
+        # Ownership spec is optional for linked sources.
+        if result.ownership_specification:
+            _encode_ownership_spec(response.return_value.ownership_spec,
+                                   result.ownership_specification)
+
+
+class _VirtualMountSpecResult(object):
+    """virtual.mount_specification() returns a MountSpecification."""
+
+    def validate(self, operation, result, definitions):
+        if not isinstance(result, MountSpecification):
+            raise IncorrectReturnTypeError(
+                operation, type(result), MountSpecification)
+
+    def encode(self, operation, response, result, definitions):
+        if result.ownership_specification:
+            _encode_ownership_spec(response.return_value.ownership_spec,
+                                   result.ownership_specification)
+
+        mounts = response.return_value.mounts
+        for mount in result.mounts:
+            single_mount_protobuf = mounts.add()
+            mount.remote_environment.to_proto(
+                single_mount_protobuf.remote_environment)
+            single_mount_protobuf.mount_path = mount.mount_path
+            if mount.shared_path:
+                single_mount_protobuf.shared_path = mount.shared_path
+
+
+class OperationSpec(object):
+    """Describes how a single platform wrapper runs a plugin operation.
+
+    Args:
+        operation (Operation): The operation this spec implements.
+        wrapper (str): Name of the _internal_* wrapper method.
+        impl (str): Name of the attribute holding the plugin's implementation
+            on the DiscoveryOperations, LinkedOperations or VirtualOperations
+            object.
+        request_type (type): The protobuf request class.
+        response_type (type): The protobuf response class.
+        arguments (list of (str, function)): The keyword arguments passed to
+            the implementation and the decoder that builds each of them from
+            the request.
+        result: The handler that validates and encodes the value returned by
+            the implementation.
+        max_results (str): Name of the attribute holding the maximum number
+            of results collected from the implementation, if the operation
+            returns several. The attribute is None when there is no limit.
+        source_guid (function): Returns the guid of the source a request is
+            for. Set for the operations that use or invalidate the status
+            cache of their operations object.
+        caches_status (bool): Whether responses are cached in, and served
+            from, the status cache when it is enabled.
+
+    Attributes:
+        environment (function): Returns the reference of the environment a
+            request runs on, found from the first argument that has a
+            connection. Used to limit the operations running at once on an
+            environment.
+    """
+
+    def __init__(self, operation, wrapper, impl, request_type, response_type,
+                 arguments, result, max_results=None, source_guid=None,
+                 caches_status=False):
+        self.operation = operation
+        self.wrapper = wrapper
+        self.impl = impl
+        self.request_type = request_type
+        self.response_type = response_type
+        self.arguments = tuple(arguments)
+        self.result = result
+        self.max_results = max_results
+        self.source_guid = source_guid
+        self.caches_status = caches_status
+        self.environment = next(
+            (_ENVIRONMENTS[name] for name, _ in self.arguments
+             if name in _ENVIRONMENTS), None)
+
+
+REPOSITORY_DISCOVERY = OperationSpec(
+    Op.DISCOVERY_REPOSITORY, '_internal_repository', 'repository_impl',
+    platform_pb2.RepositoryDiscoveryRequest,
+    platform_pb2.RepositoryDiscoveryResponse,
+    [_SOURCE_CONNECTION],
+    _DefinitionListResult('repositories', 'RepositoryDefinition'),
+    max_results='repository_max_results')
+
+SOURCE_CONFIG_DISCOVERY = OperationSpec(
+    Op.DISCOVERY_SOURCE_CONFIG, '_internal_source_config',
+    'source_config_impl',
+    platform_pb2.SourceConfigDiscoveryRequest,
+    platform_pb2.SourceConfigDiscoveryResponse,
+    [_REPOSITORY, _SOURCE_CONNECTION],
+    _DefinitionListResult('source_configs', 'SourceConfigDefinition'),
+    max_results='source_config_max_results')
+
+DIRECT_PRE_SNAPSHOT = OperationSpec(
+    Op.LINKED_PRE_SNAPSHOT, '_internal_direct_pre_snapshot',
+    'pre_snapshot_impl',
+    platform_pb2.DirectPreSnapshotRequest,
+    platform_pb2.DirectPreSnapshotResponse,
+    [_DIRECT_SOURCE, _REPOSITORY, _SOURCE_CONFIG],
+    _EmptyResult())
+
+DIRECT_POST_SNAPSHOT = OperationSpec(
+    Op.LINKED_POST_SNAPSHOT, '_internal_direct_post_snapshot',
+    'post_snapshot_impl',
+    platform_pb2.DirectPostSnapshotRequest,
+    platform_pb2.DirectPostSnapshotResponse,
+    [_DIRECT_SOURCE, _REPOSITORY, _SOURCE_CONFIG],
+    _DefinitionResult('snapshot', 'SnapshotDefinition'))
+
+STAGED_PRE_SNAPSHOT = OperationSpec(
+    Op.LINKED_PRE_SNAPSHOT, '_internal_staged_pre_snapshot',
+    'pre_snapshot_impl',
+    platform_pb2.StagedPreSnapshotRequest,
+    platform_pb2.StagedPreSnapshotResponse,
+    [_STAGED_SOURCE, _REPOSITORY, _SOURCE_CONFIG, _SNAPSHOT_PARAMETERS],
+    _EmptyResult())
+
+STAGED_POST_SNAPSHOT = OperationSpec(
+    Op.LINKED_POST_SNAPSHOT, '_internal_staged_post_snapshot',
+    'post_snapshot_impl',
+    platform_pb2.StagedPostSnapshotRequest,
+    platform_pb2.StagedPostSnapshotResponse,
+    [_STAGED_SOURCE, _REPOSITORY, _SOURCE_CONFIG, _SNAPSHOT_PARAMETERS],
+    _DefinitionResult('snapshot', 'SnapshotDefinition'))
+
+START_STAGING = OperationSpec(
+    Op.LINKED_START_STAGING, '_internal_start_staging', 'start_staging_impl',
+    platform_pb2.StartStagingRequest,
+    platform_pb2.StartStagingResponse,
+    [_STAGED_SOURCE, _REPOSITORY, _SOURCE_CONFIG],
+    _EmptyResult(),
+    source_guid=_staged_source_guid)
+
+STOP_STAGING = OperationSpec(
+    Op.LINKED_STOP_STAGING, '_internal_stop_staging', 'stop_staging_impl',
+    platform_pb2.StopStagingRequest,
+    platform_pb2.StopStagingResponse,
+    [_STAGED_SOURCE, _REPOSITORY, _SOURCE_CONFIG],
+    _EmptyResult(),
+    source_guid=_staged_source_guid)
+
+STAGED_STATUS = OperationSpec(
+    Op.LINKED_STATUS, '_internal_status', 'status_impl',
+    platform_pb2.StagedStatusRequest,
+    platform_pb2.StagedStatusResponse,
+    [_STAGED_SOURCE, _REPOSITORY, _SOURCE_CONFIG],
+    _StatusResult(),
+    source_guid=_staged_source_guid, caches_status=True)
+
+STAGED_WORKER = OperationSpec(
+    Op.LINKED_WORKER, '_internal_worker', 'worker_impl',
+    platform_pb2.StagedWorkerRequest,
+    platform_pb2.StagedWorkerResponse,
+    [_STAGED_SOURCE, _REPOSITORY, _SOURCE_CONFIG],
+    _EmptyResult())
+
+STAGED_MOUNT_SPEC = OperationSpec(
+    Op.LINKED_MOUNT_SPEC, '_internal_mount_specification',
+    'mount_specification_impl',
+    platform_pb2.StagedMountSpecRequest,
+    platform_pb2.StagedMountSpecResponse,
+    [_STAGED_SOURCE, _REPOSITORY],
+    _StagedMountSpecResult())
+
+VIRTUAL_CONFIGURE = OperationSpec(
+    Op.VIRTUAL_CONFIGURE, '_internal_configure', 'configure_impl',
+    platform_pb2.ConfigureRequest,
+    platform_pb2.ConfigureResponse,
+    [_VIRTUAL_SOURCE, _REPOSITORY, _SNAPSHOT],
+    _DefinitionResult('source_config', 'SourceConfigDefinition'),
+    source_guid=_virtual_source_guid)
+
+VIRTUAL_UNCONFIGURE = OperationSpec(
+    Op.VIRTUAL_UNCONFIGURE, '_internal_unconfigure', 'unconfigure_impl',
+    platform_pb2.UnconfigureRequest,
+    platform_pb2.UnconfigureResponse,
+    [_VIRTUAL_SOURCE, _REPOSITORY, _SOURCE_CONFIG],
+    _EmptyResult(),
+    source_guid=_virtual_source_guid)
+
+VIRTUAL_RECONFIGURE = OperationSpec(
+    Op.VIRTUAL_RECONFIGURE, '_internal_reconfigure', 'reconfigure_impl',
+    platform_pb2.ReconfigureRequest,
+    platform_pb2.ReconfigureResponse,
+    [_VIRTUAL_SOURCE, _SNAPSHOT, _SOURCE_CONFIG, _REPOSITORY],
+    _DefinitionResult('source_config', 'SourceConfigDefinition'),
+    source_guid=_virtual_source_guid)
+
+VIRTUAL_START = OperationSpec(
+    Op.VIRTUAL_START, '_internal_start', 'start_impl',
+    platform_pb2.StartRequest,
+    platform_pb2.StartResponse,
+    [_VIRTUAL_SOURCE, _REPOSITORY, _SOURCE_CONFIG],
+    _EmptyResult(),
+    source_guid=_virtual_source_guid)
+
+VIRTUAL_STOP = OperationSpec(
+    Op.VIRTUAL_STOP, '_internal_stop', 'stop_impl',
+    platform_pb2.StopRequest,
+    platform_pb2.StopResponse,
+    [_VIRTUAL_SOURCE, _REPOSITORY, _SOURCE_CONFIG],
+    _EmptyResult(),
+    source_guid=_virtual_source_guid)
+
+VIRTUAL_PRE_SNAPSHOT = OperationSpec(
+    Op.VIRTUAL_PRE_SNAPSHOT, '_internal_pre_snapshot', 'pre_snapshot_impl',
+    platform_pb2.VirtualPreSnapshotRequest,
+    platform_pb2.VirtualPreSnapshotResponse,
+    [_VIRTUAL_SOURCE, _REPOSITORY, _SOURCE_CONFIG],
+    _EmptyResult())
+
+VIRTUAL_POST_SNAPSHOT = OperationSpec(
+    Op.VIRTUAL_POST_SNAPSHOT, '_internal_post_snapshot', 'post_snapshot_impl',
+    platform_pb2.VirtualPostSnapshotRequest,
+    platform_pb2.VirtualPostSnapshotResponse,
+    [_VIRTUAL_SOURCE, _REPOSITORY, _SOURCE_CONFIG],
+    _DefinitionResult('snapshot', 'SnapshotDefinition'))
+
+VIRTUAL_STATUS = OperationSpec(
+    Op.VIRTUAL_STATUS, '_internal_status', 'status_impl',
+    platform_pb2.VirtualStatusRequest,
+    platform_pb2.VirtualStatusResponse,
+    [_VIRTUAL_SOURCE, _REPOSITORY, _SOURCE_CONFIG],
+    _StatusResult(),
+    source_guid=_virtual_source_guid, caches_status=True)
+
+VIRTUAL_INITIALIZE = OperationSpec(
+    Op.VIRTUAL_INITIALIZE, '_internal_initialize', 'initialize_impl',
+    platform_pb2.InitializeRequest,
+    platform_pb2.InitializeResponse,
+    [_VIRTUAL_SOURCE, _REPOSITORY, _SOURCE_CONFIG],
+    _EmptyResult())
+
+VIRTUAL_MOUNT_SPEC = OperationSpec(
+    Op.VIRTUAL_MOUNT_SPEC, '_internal_mount_specification',
+    'mount_specification_impl',
+    platform_pb2.VirtualMountSpecRequest,
+    platform_pb2.VirtualMountSpecResponse,
+    [_VIRTUAL_SOURCE, _REPOSITORY],
+    _VirtualMountSpecResult())
+
+
+def _build_registry(*specs):
+    registry = dict((operation, ()) for operation in Op)
+    for spec in specs:
+        registry[spec.operation] += (spec,)
+    return registry
+
+
+OPERATIONS = _build_registry(
+    REPOSITORY_DISCOVERY,
+    SOURCE_CONFIG_DISCOVERY,
+    DIRECT_PRE_SNAPSHOT,
+    DIRECT_POST_SNAPSHOT,
+    STAGED_PRE_SNAPSHOT,
+    STAGED_POST_SNAPSHOT,
+    START_STAGING,
+    STOP_STAGING,
+    STAGED_STATUS,
+    STAGED_WORKER,
+    STAGED_MOUNT_SPEC,
+    VIRTUAL_CONFIGURE,
+    VIRTUAL_UNCONFIGURE,
+    VIRTUAL_RECONFIGURE,
+    VIRTUAL_START,
+    VIRTUAL_STOP,
+    VIRTUAL_PRE_SNAPSHOT,
+    VIRTUAL_POST_SNAPSHOT,
+    VIRTUAL_STATUS,
+    VIRTUAL_INITIALIZE,
+    VIRTUAL_MOUNT_SPEC)
+
+
+def load_descriptors():
+    """Builds and round trips an empty request and response of every
+    operation, so the protobuf message classes and descriptors they rely on
+    are fully loaded before the first operation is dispatched.
+    """
+    for specs in OPERATIONS.itervalues():
+        for spec in specs:
+            for message_type in (spec.request_type, spec.response_type):
+                message_type.FromString(message_type().SerializeToString())
+
+
+def dispatch(operations, spec, request):
+    """Runs the plugin's implementation of an operation for a request.
+
+    Safe to call from several threads at once, for the same or different
+    operations.
+
+    Args:
+        operations (DiscoveryOperations, LinkedOperations or
+            VirtualOperations): The object holding the implementation.
+        spec (OperationSpec): Describes the operation being run.
+        request: The protobuf request of type spec.request_type.
+
+    Returns:
+        The protobuf response of type spec.response_type.
+    """
+    timeouts = operations._timeouts
+    if timeouts is not None:
+        timeout = timeouts.get(spec.operation)
+        if timeout is not None:
+            with deadline_scope(time.time() + timeout):
+                return _dispatch_with_hooks(operations, spec, request)
+    # Checked here rather than in _dispatch_with_hooks, so that plugins
+    # without hooks don't pay for an extra call.
+    if operations._hook_chains is None:
+        return _dispatch_hooked(operations, spec, request)
+    return _dispatch_with_hooks(operations, spec, request)
+
+
+def _dispatch_with_hooks(operations, spec, request):
+    chains = operations._hook_chains
+    if chains is not None:
+        chain = chains.get(spec.operation)
+        if chain is not None:
+            return chain(
+                spec.operation, request,
+                lambda request: _dispatch_hooked(operations, spec, request))
+    return _dispatch_hooked(operations, spec, request)
+
+
+def _dispatch_hooked(operations, spec, request):
+    memo = operations._memo
+    if memo is not None and spec.operation in memo.operations:
+        return _dispatch_memoized(operations, spec, request, memo)
+    return _dispatch_cached(operations, spec, request)
+
+
+def _dispatch_memoized(operations, spec, request, memo):
+    """Returns the response remembered for an identical request, or runs the
+    operation and remembers its response if it succeeds.
+    """
+    key = memo.key(spec.operation, request)
+    response = memo.get(key, spec.response_type)
+    if response is not None:
+        return response
+    response = _dispatch_cached(operations, spec, request)
+    memo.put(key, response)
+    return response
+
+
+def _dispatch_cached(operations, spec, request):
+    if spec.source_guid is not None:
+        status_cache = operations.status_cache
+        if status_cache is not None:
+            return _dispatch_with_status_cache(
+                operations, spec, request, status_cache)
+    return _run_limited(operations, spec, request)
+
+
+def _dispatch_with_status_cache(operations, spec, request, status_cache):
+    """Serves a status operation from the status cache, or invalidates the
+    cached status of the source a state changing operation ran on.
+
+    A cached status is returned without waiting for the environment limiter,
+    as it doesn't touch the remote host.
+    """
+    guid = spec.source_guid(request)
+    if not spec.caches_status:
+        try:
+            return _run_limited(operations, spec, request)
+        finally:
+            # Even a failed operation may have changed the state.
+            status_cache.invalidate(guid)
+
+    cached = status_cache.get(guid)
+    if cached is not None:
+        response = spec.response_type()
+        response.CopyFrom(cached)
+        return response
+
+    # Taken before running, so a status read before a state change that
+    # finishes while it runs isn't cached.
+    generation = status_cache.generation()
+    response = _run_limited(operations, spec, request)
+    cached = spec.response_type()
+    cached.CopyFrom(response)
+    status_cache.put(guid, cached, generation)
+    return response
+
+
+def _run_limited(operations, spec, request):
+    limiter = operations._environment_limiter
+    if limiter is not None and spec.environment is not None:
+        with limiter.limit(spec.environment(request)):
+            return _run(operations, spec, request)
+    return _run(operations, spec, request)
+
+
+def _run(operations, spec, request):
+    metrics = operations._metrics
+    if metrics is not None:
+        return _dispatch_timed(operations, spec, request, metrics)
+
+    impl = getattr(operations, spec.impl)
+    if not impl:
+        raise OperationNotDefinedError(spec.operation)
+
+    definitions = operations._definitions
+    kwargs = {}
+    for name, decode in spec.arguments:
+        kwargs[name] = decode(request, definitions)
+
+    result = impl(**kwargs)
+    if spec.max_results is not None:
+        max_results = getattr(operations, spec.max_results)
+        if max_results is not None:
+            result = _first(result, max_results)
+
+    spec.result.validate(spec.operation, result, definitions)
+    response = spec.response_type()
+    spec.result.encode(spec.operation, response, result, definitions)
+    return response
+
+
+def _timed(results, timer, elapsed):
+    """Yields the results of a generator, adding the time spent producing
+    them to elapsed[0].
+    """
+    try:
+        while True:
+            start = timer()
+            try:
+                item = next(results)
+            except StopIteration:
+                return
+            finally:
+                elapsed[0] += timer() - start
+            yield item
+    finally:
+        results.close()
+
+
+def _dispatch_timed(operations, spec, request, metrics):
+    """Same as _run(), recording the duration of each phase in metrics.
+
+    Kept apart from _run() so plugins that don't enable metrics don't pay
+    for reading the clock.
+    """
+    impl = getattr(operations, spec.impl)
+    if not impl:
+        raise OperationNotDefinedError(spec.operation)
+
+    timer = timeit.default_timer
+    operation = spec.operation
+
+    start = timer()
+    definitions = operations._definitions
+    kwargs = {}
+    for name, decode in spec.arguments:
+        kwargs[name] = decode(request, definitions)
+    end = timer()
+    metrics.record(operation, Phase.DECODE, end - start)
+
+    start = end
+    result = impl(**kwargs)
+    if spec.max_results is not None:
+        max_results = getattr(operations, spec.max_results)
+        if max_results is not None:
+            result = _first(result, max_results)
+    end = timer()
+    impl_time = end - start
+    # A generator runs the implementation while its results are encoded.
+    generator_time = [0]
+    if isinstance(result, types.GeneratorType):
+        result = _timed(result, timer, generator_time)
+
+    start = end
+    spec.result.validate(operation, result, definitions)
+    end = timer()
+    metrics.record(operation, Phase.VALIDATE, end - start)
+
+    start = end
+    response = spec.response_type()
+    spec.result.encode(operation, response, result, definitions)
+    encode_time = timer() - start
+    metrics.record(operation, Phase.IMPL, impl_time + generator_time[0])
+    metrics.record(operation, Phase.ENCODE, encode_time - generator_time[0])
+    return response
+
+
+def _error_message(error):
+    """Returns the message of an exception as unicode, whether it was raised
+    with a unicode or a str message.
+    """
+    try:
+        return unicode(error)
+    except UnicodeDecodeError:
+        # A str message that isn't ASCII.
+        return str(error).decode('utf-8', 'replace')
+
+
+def _encode_error(error_result, error, call_stack):
+    """Packs an exception raised by a plugin operation into a
+    PluginErrorResult.
+    """
+    if isinstance(error, UserError):
+        error_result.user_error.message = error.args[0]
+        error_result.user_error.action = error.args[1]
+        error_result.user_error.output = error.args[2]
+    elif isinstance(error, PluginRuntimeError):
+        error_result.plugin_runtime_error.message = error.message
+        error_result.plugin_runtime_error.call_stack = call_stack
+    elif any(cls.__name__ == 'GeneratedClassesError'
+             for cls in type(error).__mro__):
+        # Defined in the plugin's generated code, so it can't be imported.
+        error_result.generated_classes_error.message = error.message
+        error_result.generated_classes_error.call_stack = call_stack
+    else:
+        error_result.generic_plugin_error.message = _error_message(error)
+        error_result.generic_plugin_error.type = type(error).__name__
+        error_result.generic_plugin_error.call_stack = call_stack
+
+
+def dispatch_source_config_batch(operations, request, max_workers):
+    """Runs source config discovery for every repository of a
+    SourceConfigDiscoveryBatchRequest, up to max_workers at a time.
+
+    Discovery is usually dominated by the latency of remote commands, which
+    overlaps when several repositories are discovered at once. An error
+    raised while discovering one repository is packed into its own response
+    and doesn't affect the others. Platform errors still propagate as they
+    point to a bug rather than a problem with a repository, as does the
+    SystemExit libs raises for errors the plugin can't handle. They are
+    raised once the repositories being discovered are done, and the
+    repositories not started yet are skipped.
+
+    Returns:
+        SourceConfigDiscoveryBatchResponse: One response per repository, in
+        the order of request.repositories.
+    """
+    if not operations.source_config_impl:
+        raise OperationNotDefinedError(Op.DISCOVERY_SOURCE_CONFIG)
+
+    requests = []
+    for repository in request.repositories:
+        single_request = platform_pb2.SourceConfigDiscoveryRequest()
+        single_request.source_connection.CopyFrom(request.source_connection)
+        single_request.repository.CopyFrom(repository)
+        requests.append(single_request)
+
+    # The deadline of the batch belongs to this thread, not the pool's.
+    deadline = current_deadline()
+
+    pending = collections.deque(enumerate(requests))
+    responses = [None] * len(requests)
+    failures = []
+
+    def work():
+        with deadline_scope(deadline):
+            while not failures:
+                try:
+                    index, single_request = pending.popleft()
+                except IndexError:
+                    return
+                try:
+                    responses[index] = dispatch(
+                        operations, SOURCE_CONFIG_DISCOVERY, single_request)
+                except PlatformError:
+                    failures.append(sys.exc_info())
+                    return
+                except Exception as error:
+                    response = platform_pb2.SourceConfigDiscoveryResponse()
+                    _encode_error(
+                        response.error, error, traceback.format_exc())
+                    responses[index] = response
+                except BaseException:
+                    # Includes the SystemExit of non-actionable libs errors.
+                    failures.append(sys.exc_info())
+                    return
+
+    workers = min(max_workers, len(requests))
+    if workers <= 1:
+        work()
+    else:
+        threads = [threading.Thread(target=work) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    if failures:
+        error_type, error, error_traceback = failures[0]
+        raise error_type, error, error_traceback
+
+    batch_response = platform_pb2.SourceConfigDiscoveryBatchResponse()
+    batch_response.responses.extend(responses)
+    return batch_response
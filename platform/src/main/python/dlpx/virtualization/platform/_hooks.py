@@ -0,0 +1,128 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Hooks run around plugin operations
+
+Hooks wrap the operations dispatched by the platform wrappers, for timing,
+tracing, caching or admission control, without changing the plugin's
+implementations. They are registered through the decorators of
+Plugin.hooks, for every operation or for the Operations given:
+
+  @my_db_plugin.hooks.before()
+  def trace(operation, request):
+    ...
+
+  @my_db_plugin.hooks.after(Operation.VIRTUAL_START, Operation.VIRTUAL_STOP)
+  def audit(operation, request, response):
+    ...
+
+  @my_db_plugin.hooks.around(Operation.VIRTUAL_STATUS)
+  def timed(operation, request, proceed):
+    start = time.time()
+    try:
+      return proceed(request)
+    finally:
+      record(operation, time.time() - start)
+
+For an operation, the before hooks run first, then the around hooks, each
+wrapping the next one and the operation itself, then the after hooks with
+the response. Hooks of one kind run in the order they were registered, so
+the first around hook registered is the outermost one. An around hook may
+return a response without calling proceed. The after hooks don't run if the
+operation or a hook raised.
+
+The hooks of each operation are combined into a single function when they
+are registered. Operations with no hooks are dispatched exactly as if no
+hooks existed, with a single check of whether the plugin has any.
+"""
+
+from dlpx.virtualization.platform.operation import Operation
+
+__all__ = ["OperationHooks"]
+
+
+def _chain(befores, arounds, afters):
+    """Returns a function running an operation with the given hooks."""
+    def run(operation, request, proceed):
+        for hook in befores:
+            hook(operation, request)
+        call = proceed
+        for hook in reversed(arounds):
+            call = _wrap(hook, operation, call)
+        response = call(request)
+        for hook in afters:
+            hook(operation, request, response)
+        return response
+    return run
+
+
+def _wrap(hook, operation, proceed):
+    return lambda request: hook(operation, request, proceed)
+
+
+class OperationHooks(object):
+    """The hooks registered on a plugin.
+
+    Args:
+        operations_objects (list): The DiscoveryOperations, LinkedOperations
+            and VirtualOperations objects whose operations the hooks run
+            around.
+    """
+
+    def __init__(self, operations_objects):
+        self._operations_objects = tuple(operations_objects)
+        # Lists of (operations, hook). operations is None for every
+        # operation and a frozenset of Operations otherwise.
+        self._before = []
+        self._after = []
+        self._around = []
+
+    def _decorator(self, hooks, operations):
+        for operation in operations:
+            if not isinstance(operation, Operation):
+                raise ValueError(
+                    'Hooks can only be registered for Operations. Found'
+                    ' {!r}'.format(operation))
+        selected = frozenset(operations) or None
+
+        def hook_decorator(hook):
+            hooks.append((selected, hook))
+            self._compile()
+            return hook
+        return hook_decorator
+
+    def before(self, *operations):
+        """Registers a hook called with (operation, request) before the
+        operations, or before every operation if none are given.
+        """
+        return self._decorator(self._before, operations)
+
+    def after(self, *operations):
+        """Registers a hook called with (operation, request, response) after
+        the operations, or after every operation if none are given.
+        """
+        return self._decorator(self._after, operations)
+
+    def around(self, *operations):
+        """Registers a hook called with (operation, request, proceed) instead
+        of the operations, or of every operation if none are given. It runs
+        the operation by calling proceed(request) and returns its response.
+        """
+        return self._decorator(self._around, operations)
+
+    def _compile(self):
+        def applicable(hooks, operation):
+            return [hook for selected, hook in hooks
+                    if selected is None or operation in selected]
+
+        chains = {}
+        for operation in Operation:
+            befores = applicable(self._before, operation)
+            arounds = applicable(self._around, operation)
+            afters = applicable(self._after, operation)
+            if befores or arounds or afters:
+                chains[operation] = _chain(befores, arounds, afters)
+
+        for operations_object in self._operations_objects:
+            operations_object._hook_chains = chains or None
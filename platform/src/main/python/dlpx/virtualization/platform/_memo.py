@@ -0,0 +1,316 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Memoization of operation responses for retried jobs
+
+When the engine retries a failed job, it runs the job's operations again
+from the start with the same requests, and operations that already succeeded
+redo their remote work. A plugin can opt into remembering the responses of
+chosen operations with Plugin.enable_memoization. A later call of one of
+these operations with an identical request returns the remembered response
+without running the implementation.
+
+Only operations whose result depends on nothing but their request, and that
+can be skipped once they have succeeded, should be memoized, such as
+virtual.configure or linked.post_snapshot on most plugins. Responses are
+only remembered for operations that succeed. Two identical requests running
+at the same time both run the implementation.
+
+Keys are namespaced, typically with the plugin's id and version, so that
+plugins, or versions of one plugin whose responses differ, can share a store
+without answering each other's requests.
+
+Responses are kept serialized in a store, either MemoryMemoStore, which is
+lost when the plugin is unloaded, or DiskMemoStore, which survives it. Both
+hold a bounded number of responses, dropping the least recently used first,
+and may expire them after a time.
+"""
+
+import collections
+import errno
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from google.protobuf.message import DecodeError
+
+from dlpx.virtualization.platform.operation import Operation
+
+__all__ = [
+    "DiskMemoStore",
+    "MemoryMemoStore",
+    "OperationMemo"]
+
+# The default maximum number of responses kept by a store.
+DEFAULT_MAX_SIZE = 256
+
+
+def _check_limits(max_size, ttl):
+    if (not isinstance(max_size, (int, long))
+            or isinstance(max_size, bool) or max_size < 1):
+        raise ValueError(
+            'The memo store size must be a positive integer.'
+            ' Found {}'.format(max_size))
+    if ttl is not None and (not isinstance(ttl, (int, long, float))
+                            or isinstance(ttl, bool) or ttl <= 0):
+        raise ValueError(
+            'The memo store TTL must be a positive number of seconds.'
+            ' Found {}'.format(ttl))
+
+
+class MemoryMemoStore(object):
+    """Keeps memoized responses in memory.
+
+    Args:
+        max_size (int): The maximum number of responses to keep.
+        ttl (float): If set, the number of seconds a response stays valid.
+        clock (function): Returns the current time in seconds.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=None, clock=time.time):
+        _check_limits(max_size, ttl)
+        self._max_size = max_size
+        self._ttl = ttl
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the response stored under key, or None if there is none or
+        it has expired.
+        """
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or (entry[0] is not None and entry[0] <= now):
+                return None
+            # Re-insert to mark the entry as the most recently used.
+            self._entries[key] = entry
+            return entry[1]
+
+    def put(self, key, value):
+        """Stores a serialized response under key."""
+        expires = None
+        if self._ttl is not None:
+            expires = self._clock() + self._ttl
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, value)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drops all responses."""
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskMemoStore(object):
+    """Keeps memoized responses in files of a local directory, so that they
+    survive the plugin being reloaded.
+
+    Each response is a file named after its key. The modification time of a
+    file is when it was last used, which decides both its expiry and which
+    responses are dropped first when the store is full. Files are written
+    under a temporary name and renamed, so a reader never sees a partial
+    response. A response that can't be read or written is treated as
+    missing rather than failing the operation.
+
+    Args:
+        directory (str): Where to keep the responses. Created if missing.
+        max_size (int): The maximum number of responses to keep.
+        ttl (float): If set, the number of seconds a response stays valid
+            after it was last used.
+
+    Attributes:
+        errors (int): The number of responses that couldn't be read or
+            written.
+    """
+
+    _TEMPORARY_PREFIX = '.tmp-'
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE, ttl=None):
+        _check_limits(max_size, ttl)
+        try:
+            os.makedirs(directory)
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise
+        self._directory = directory
+        self._max_size = max_size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self.errors = 0
+
+    @property
+    def directory(self):
+        return self._directory
+
+    def _names(self):
+        return [name for name in os.listdir(self._directory)
+                if not name.startswith(self._TEMPORARY_PREFIX)]
+
+    def __len__(self):
+        return len(self._names())
+
+    def get(self, key):
+        """Returns the response stored under key, or None if there is none or
+        it has expired.
+        """
+        path = os.path.join(self._directory, key)
+        try:
+            if (self._ttl is not None
+                    and os.path.getmtime(path) + self._ttl <= time.time()):
+                os.remove(path)
+                return None
+            with open(path, 'rb') as response_file:
+                value = response_file.read()
+            # Mark the response as the most recently used.
+            os.utime(path, None)
+            return value
+        except (IOError, OSError) as error:
+            if error.errno != errno.ENOENT:
+                self._error()
+            return None
+
+    def put(self, key, value):
+        """Stores a serialized response under key."""
+        try:
+            descriptor, temporary = tempfile.mkstemp(
+                prefix=self._TEMPORARY_PREFIX, dir=self._directory)
+            try:
+                with os.fdopen(descriptor, 'wb') as response_file:
+                    response_file.write(value)
+                os.rename(temporary, os.path.join(self._directory, key))
+            except BaseException:
+                os.remove(temporary)
+                raise
+            with self._lock:
+                self._evict()
+        except (IOError, OSError):
+            self._error()
+
+    def _evict(self):
+        names = self._names()
+        if len(names) <= self._max_size:
+            return
+        used = []
+        for name in names:
+            try:
+                used.append((os.path.getmtime(
+                    os.path.join(self._directory, name)), name))
+            except OSError:
+                # Already removed by another thread or process.
+                pass
+        used.sort()
+        for _, name in used[:len(used) - self._max_size]:
+            try:
+                os.remove(os.path.join(self._directory, name))
+            except OSError:
+                pass
+
+    def _error(self):
+        with self._lock:
+            self.errors += 1
+
+    def clear(self):
+        """Drops all responses."""
+        for name in self._names():
+            try:
+                os.remove(os.path.join(self._directory, name))
+            except OSError:
+                pass
+
+
+class OperationMemo(object):
+    """Remembers the responses of chosen operations in a store, keyed by a
+    namespace, the operation and a digest of its request.
+
+    Args:
+        store (MemoryMemoStore or DiskMemoStore): Where responses are kept.
+        operations (list of Operation): The operations to memoize.
+        namespace (str): Separates these responses from those of other
+            memos sharing the store, e.g. the plugin's id and version.
+
+    Attributes:
+        hits (int): The number of operations answered from the store.
+        misses (int): The number of memoized operations that had to run.
+    """
+
+    def __init__(self, store, operations, namespace):
+        if not operations:
+            raise ValueError(
+                'The operations to memoize must be given explicitly.')
+        for operation in operations:
+            if not isinstance(operation, Operation):
+                raise ValueError(
+                    'Only Operations can be memoized. Found'
+                    ' {!r}'.format(operation))
+        if not isinstance(namespace, basestring) or not namespace:
+            raise ValueError(
+                'The memo namespace must be a non-empty string. Found'
+                ' {!r}'.format(namespace))
+        if isinstance(namespace, unicode):
+            namespace = namespace.encode('utf-8')
+        self._store = store
+        self._operations = frozenset(operations)
+        self._namespace = namespace
+        # Hashing the namespace once, every key starts from a copy.
+        self._digest = hashlib.sha256(namespace)
+        self._digest.update('\0')
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def store(self):
+        return self._store
+
+    @property
+    def operations(self):
+        return self._operations
+
+    @property
+    def namespace(self):
+        return self._namespace
+
+    def key(self, operation, request):
+        """Returns the key of a request for an operation. Identical requests
+        have the same key, whatever the order their fields were set in.
+        Requests of different message types never share a key, even when
+        they serialize the same.
+        """
+        digest = self._digest.copy()
+        digest.update(operation.value)
+        digest.update('\0')
+        digest.update(request.DESCRIPTOR.full_name)
+        digest.update('\0')
+        digest.update(request.SerializeToString(deterministic=True))
+        return digest.hexdigest()
+
+    def get(self, key, response_type):
+        """Returns the remembered response for key, or None."""
+        value = self._store.get(key)
+        response = None
+        if value is not None:
+            try:
+                response = response_type.FromString(value)
+            except DecodeError:
+                # A damaged response is as good as none.
+                pass
+        with self._lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response
+
+    def put(self, key, response):
+        """Remembers the response for key."""
+        self._store.put(key, response.SerializeToString())
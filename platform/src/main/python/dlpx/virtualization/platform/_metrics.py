@@ -0,0 +1,238 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Latency metrics of plugin operations
+
+When enabled on a Plugin (see Plugin.enable_metrics), every operation
+dispatched by the platform wrappers records how long each of its phases took:
+
+  decode    building the implementation's arguments from the request.
+  impl      running the plugin author's implementation.
+  validate  checking the type of the value the implementation returned.
+  encode    packing that value into the response.
+
+Discovery implementations that yield their results run while the response is
+being encoded. The time spent producing each result is timed separately and
+recorded under impl, and only the rest of the encoding under encode.
+
+Durations go into in-process LatencyHistograms, one per operation and phase,
+held by an OperationMetrics. They can be read at any time and can also be
+written out periodically through a logging handler, such as the
+PlatformHandler of dlpx.virtualization.libs, by a MetricsFlusher.
+"""
+
+import bisect
+import logging
+import threading
+
+from enum import Enum, unique
+
+__all__ = [
+    "LatencyHistogram",
+    "MetricsFlusher",
+    "OperationMetrics",
+    "Phase"]
+
+
+@unique
+class Phase(Enum):
+    # Keeps the definition order on Python 2, where enum34 sorts by value.
+    __order__ = 'DECODE IMPL VALIDATE ENCODE'
+
+    DECODE = 'decode'
+    IMPL = 'impl'
+    VALIDATE = 'validate'
+    ENCODE = 'encode'
+
+
+# Upper bounds, in seconds, of the histogram buckets: 10 microseconds doubling
+# up to about 5.8 hours. Longer durations go into one last overflow bucket.
+_BUCKET_BOUNDS = tuple(1e-5 * 2 ** i for i in range(32))
+
+
+class LatencyHistogram(object):
+    """A histogram of durations with exponentially growing buckets.
+
+    Each bucket covers durations up to twice the upper bound of the previous
+    one, so percentiles are reported with at most a factor of two of error.
+    The count, total, minimum and maximum are exact.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * (len(_BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds):
+        self.buckets[bisect.bisect_left(_BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    @property
+    def mean(self):
+        if not self.count:
+            return None
+        return self.total / self.count
+
+    def percentile(self, percent):
+        """Returns the upper bound of the bucket holding the given percentile
+        of the recorded durations, capped at the maximum recorded duration.
+        Returns None if nothing was recorded.
+        """
+        if not 0 <= percent <= 100:
+            raise ValueError(
+                'The percentile must be between 0 and 100. Found {}'.format(
+                    percent))
+        if not self.count:
+            return None
+        rank = max(1, percent * self.count / 100.0)
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                if index == len(_BUCKET_BOUNDS):
+                    return self.max
+                return min(_BUCKET_BOUNDS[index], self.max)
+        return self.max
+
+    def summary(self):
+        """Returns the count, total, min, mean, p50, p90, p99 and max of the
+        recorded durations in seconds, as a dict.
+        """
+        return {
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+        }
+
+
+class OperationMetrics(object):
+    """The latency histograms of every operation and phase of a plugin.
+
+    Safe to record into and read from several threads at once.
+    """
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation, phase, seconds):
+        """Records that a phase of an operation took the given seconds."""
+        key = (operation, phase)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = LatencyHistogram()
+                self._histograms[key] = histogram
+            histogram.record(seconds)
+
+    def histogram(self, operation, phase):
+        """Returns a copy of the LatencyHistogram of a phase of an operation,
+        or None if that operation hasn't run yet.
+        """
+        with self._lock:
+            histogram = self._histograms.get((operation, phase))
+            if histogram is None:
+                return None
+            copied = LatencyHistogram()
+            copied.__dict__.update(histogram.__dict__)
+            copied.buckets = list(histogram.buckets)
+            return copied
+
+    def snapshot(self):
+        """Returns the summaries of every histogram recorded so far as a dict
+        of dicts, keyed by the operation's value (e.g. 'virtual.status()')
+        and then by the phase's value (e.g. 'impl').
+        """
+        with self._lock:
+            items = [(key, histogram.summary())
+                     for key, histogram in self._histograms.iteritems()]
+        snapshot = {}
+        for (operation, phase), summary in items:
+            snapshot.setdefault(operation.value, {})[phase.value] = summary
+        return snapshot
+
+    def reset(self):
+        """Drops everything recorded so far."""
+        with self._lock:
+            self._histograms.clear()
+
+    def format(self):
+        """Returns the snapshot as a human readable table, durations in
+        milliseconds.
+        """
+        lines = ['{:<36} {:<9} {:>8} {:>10} {:>10} {:>10} {:>10}'.format(
+            'operation', 'phase', 'count', 'mean ms', 'p90 ms', 'p99 ms',
+            'max ms')]
+        snapshot = self.snapshot()
+        for operation in sorted(snapshot):
+            for phase in Phase:
+                summary = snapshot[operation].get(phase.value)
+                if summary is None:
+                    continue
+                lines.append(
+                    '{:<36} {:<9} {:>8} {:>10.3f} {:>10.3f} {:>10.3f}'
+                    ' {:>10.3f}'.format(
+                        operation, phase.value, summary['count'],
+                        summary['mean'] * 1e3, summary['p90'] * 1e3,
+                        summary['p99'] * 1e3, summary['max'] * 1e3))
+        return '\n'.join(lines)
+
+
+class MetricsFlusher(object):
+    """Periodically writes the formatted OperationMetrics of a plugin to a
+    logging handler from a daemon thread.
+
+    Args:
+        metrics (OperationMetrics): The metrics to write out.
+        handler (logging.Handler): Where to write them, e.g. a PlatformHandler.
+        interval (float): The number of seconds between two flushes.
+    """
+
+    def __init__(self, metrics, handler, interval):
+        if (not isinstance(interval, (int, long, float))
+                or isinstance(interval, bool) or interval <= 0):
+            raise ValueError(
+                'The metrics flush interval must be a positive number of'
+                ' seconds. Found {}'.format(interval))
+        self._metrics = metrics
+        self._handler = handler
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name='dlpx-plugin-metrics')
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Stops the flushing thread after one last flush."""
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def flush(self):
+        """Writes the metrics to the handler now."""
+        record = logging.LogRecord(
+            name=__name__, level=logging.INFO, pathname=__file__, lineno=0,
+            msg='Plugin operation latencies:\n%s',
+            args=(self._metrics.format(),), exc_info=None)
+        self._handler.handle(record)
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            self.flush()
+        self.flush()
@@ -70,56 +70,172 @@ take <OperationName>Request protobuf message as input and return
 wrappers are called by the Dynamic Data Platform runtime and input *Request
 protobuf message, delegate to the user defined method that has logic for the
 virtualization operation itself (such as configure), and craft a response
-object.
-
-
-Note on method level imports: In method imports are needed for plugin defined
-modules (from generated.definitions). These imports will fail on a developer's
-environment if they haven't generated them yet. If these were module level
-imports, the import for dlpx.virtualization.platform.Plugin will more likely
-fail. The internal methods should only be called by the platform so it's safe
-to have the import in the methods as the objects will exist at runtime.
+object. Each wrapper is described once in the _dispatch module by an
+OperationSpec, which lists the arguments decoded from the request and how the
+value returned by the implementation is validated and packed into the
+response. All wrappers run through the same _dispatch.dispatch function.
+
+Upgrade migrations, which bring the objects created by older versions of a
+plugin to its current schemas, are registered on UpgradeOperations and run in
+batches by _upgrade.upgrade.
+
+A runtime that holds requests as serialized bytes, such as a host running the
+plugin in a separate process or a replay of captured traffic, can call
+Plugin.invoke with the name of a wrapper instead. The request is parsed once
+and the response is returned serialized.
+
+Concurrency: once its operations are registered, which the decorators do when
+the plugin's modules are imported, a Plugin may be invoked from several
+threads at once. The wrappers keep no per-call state on the Plugin or the
+operations objects, and the state they share between calls (the definition
+and status caches, metrics and interned connections) is safe to use
+concurrently. The number of operations running at once on one environment
+can be capped with the max_operations_per_environment argument of Plugin.
+Registering operations while others are being invoked isn't supported.
+
+Hooks: functions run before, after or around every operation, or selected
+ones, can be registered with the decorators of Plugin.hooks. See _hooks.
+
+Deadlines: operations given a timeout with the operation_timeouts argument
+of Plugin, or invoked with a timeout, must finish within it. The libs calls
+they make pass the time left to their remote commands and raise
+DeadlineExceededError once it has run out. See common._deadline.
+
+Memoization: the responses of chosen operations can be remembered and
+returned for identical requests, so retried jobs skip the work that already
+succeeded. See Plugin.enable_memoization and _memo.
+
+
+Note on runtime imports: The plugin defined classes (from
+generated.definitions) are imported when an operation is dispatched rather
+than at module level. These imports will fail on a developer's environment if
+they haven't generated them yet. If these were module level imports, the
+import for dlpx.virtualization.platform.Plugin will more likely fail. The
+internal methods should only be called by the platform so it's safe to import
+them at that point as the objects will exist at runtime.
 """
-import json
-from dlpx.virtualization.common import RemoteConnection, RemoteEnvironment
-from dlpx.virtualization import common_pb2
+import numbers
+import time
+
 from dlpx.virtualization import platform_pb2
-from dlpx.virtualization.common.exceptions import PluginRuntimeError
-from dlpx.virtualization.platform import VirtualSource
-from dlpx.virtualization.platform import DirectSource
-from dlpx.virtualization.platform import StagedSource
-from dlpx.virtualization.platform import Status
-from dlpx.virtualization.platform import Mount
-from dlpx.virtualization.platform import MountSpecification
+from dlpx.virtualization.common._deadline import deadline_scope
+from dlpx.virtualization.platform import _dispatch, _status_cache
+from dlpx.virtualization.platform._concurrency import EnvironmentLimiter
+from dlpx.virtualization.platform._hooks import OperationHooks
+from dlpx.virtualization.platform._memo import OperationMemo
+from dlpx.virtualization.platform._definitions import (DefinitionCache,
+                                                       PluginDefinitions)
+from dlpx.virtualization.platform._dispatch import (
+    dispatch, dispatch_source_config_batch)
+from dlpx.virtualization.platform._metrics import (MetricsFlusher,
+                                                   OperationMetrics)
+from dlpx.virtualization.platform._status_cache import StatusCache
+from dlpx.virtualization.platform._upgrade import migration_key, upgrade
 from dlpx.virtualization.platform.operation import Operation as Op
+from dlpx.virtualization.platform.operation import UpgradeOperation
 from dlpx.virtualization.platform.exceptions import (
-    IncorrectReturnTypeError, OperationNotDefinedError,
-    OperationAlreadyDefinedError)
+    MigrationIdAlreadyUsedError, OperationAlreadyDefinedError)
 
 
 __all__ = ['Plugin']
 
 
+def _check_max_results(max_results):
+    if max_results is not None and (
+            not isinstance(max_results, (int, long))
+            or isinstance(max_results, bool) or max_results < 1):
+        raise ValueError(
+            'The maximum number of discovered objects must be a positive'
+            ' integer. Found {}'.format(max_results))
+
+
+def _check_max_workers(max_workers):
+    if (not isinstance(max_workers, (int, long))
+            or isinstance(max_workers, bool) or max_workers < 1):
+        raise ValueError(
+            'The number of discovery workers must be a positive integer.'
+            ' Found {}'.format(max_workers))
+
+
+def _invocations():
+    """Returns the wrappers Plugin.invoke can run, as a dict of operation
+    name to the Plugin property holding the wrapper, the wrapper's name and
+    its request class.
+
+    An operation is named after the property and the wrapper without its
+    _internal_ prefix, e.g. 'virtual.configure' or
+    'linked.staged_pre_snapshot'.
+    """
+    wrappers = [('discovery', '_internal_source_config_batch',
+                 platform_pb2.SourceConfigDiscoveryBatchRequest),
+                ('upgrade', '_internal_upgrade', platform_pb2.UpgradeRequest)]
+    for specs in _dispatch.OPERATIONS.itervalues():
+        for spec in specs:
+            operations = spec.operation.value.split('.')[0]
+            wrappers.append((operations, spec.wrapper, spec.request_type))
+
+    invocations = {}
+    for operations, wrapper, request_type in wrappers:
+        name = '{}.{}'.format(operations, wrapper[len('_internal_'):])
+        invocations[name] = (operations, wrapper, request_type)
+    return invocations
+
+
+_INVOCATIONS = _invocations()
+
+
 class DiscoveryOperations(object):
 
-    def __init__(self):
+    def __init__(self, definitions=None):
+        if definitions is None:
+            definitions = PluginDefinitions()
+        self._definitions = definitions
+        self._metrics = None
+        self._environment_limiter = None
+        self._hook_chains = None
+        self._timeouts = None
+        self._memo = None
         self.repository_impl = None
         self.source_config_impl = None
+        self.repository_max_results = None
+        self.source_config_max_results = None
+        self.source_config_max_workers = 1
+
+    def repository(self, max_results=None):
+        """The implementation may return a list of repositories or yield
+        them. If max_results is set, discovery stops once that many
+        repositories have been collected.
+        """
+        _check_max_results(max_results)
 
-    def repository(self):
         def repository_decorator(repository_impl):
             if self.repository_impl:
                 raise OperationAlreadyDefinedError(Op.DISCOVERY_REPOSITORY)
 
             self.repository_impl = repository_impl
+            self.repository_max_results = max_results
             return repository_impl
         return repository_decorator
 
-    def source_config(self):
+    def source_config(self, max_results=None, max_workers=1):
+        """The implementation may return a list of source configs or yield
+        them. If max_results is set, discovery stops once that many source
+        configs have been collected.
+
+        When the source configs of several repositories are discovered in one
+        batch, the implementation runs for up to max_workers repositories at
+        a time, each in its own thread. Only raise it if the implementation is
+        safe to run concurrently.
+        """
+        _check_max_results(max_results)
+        _check_max_workers(max_workers)
+
         def source_config_decorator(source_config_impl):
             if self.source_config_impl:
                 raise OperationAlreadyDefinedError(Op.DISCOVERY_SOURCE_CONFIG)
             self.source_config_impl = source_config_impl
+            self.source_config_max_results = max_results
+            self.source_config_max_workers = max_workers
             return source_config_impl
         return source_config_decorator
 
@@ -140,41 +256,7 @@ class DiscoveryOperations(object):
             RepositoryDiscoveryResponse: The return value of repository
             discovery operation.
         """
-        from generated.definitions import RepositoryDefinition
-
-        def to_protobuf(repository):
-            parameters = common_pb2.PluginDefinedObject()
-            parameters.json = json.dumps(repository.to_dict())
-            repository_protobuf = common_pb2.Repository()
-            repository_protobuf.parameters.CopyFrom(parameters)
-            return repository_protobuf
-
-        if not self.repository_impl:
-            raise OperationNotDefinedError(Op.DISCOVERY_REPOSITORY)
-
-        repositories = self.repository_impl(
-            source_connection=RemoteConnection.from_proto(request.source_connection))
-
-        # Validate that this is a list of Repository objects
-        if not isinstance(repositories, list):
-            raise IncorrectReturnTypeError(
-                Op.DISCOVERY_REPOSITORY,
-                type(repositories),
-                [RepositoryDefinition])
-
-        if not all(isinstance(repo, RepositoryDefinition)
-                   for repo in repositories):
-            raise IncorrectReturnTypeError(
-                Op.DISCOVERY_REPOSITORY,
-                [type(repo) for repo in repositories],
-                [RepositoryDefinition])
-
-        repository_discovery_response = (
-            platform_pb2.RepositoryDiscoveryResponse())
-        repository_protobuf_list = [to_protobuf(repo) for repo in repositories]
-        repository_discovery_response.return_value.repositories.extend(
-            repository_protobuf_list)
-        return repository_discovery_response
+        return dispatch(self, _dispatch.REPOSITORY_DISCOVERY, request)
 
     def _internal_source_config(self, request):
         """Source config discovery wrapper.
@@ -196,58 +278,46 @@ class DiscoveryOperations(object):
             SourceConfigDiscoveryResponse: The return value of source config
             discovery operation.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import SourceConfigDefinition
-
-        def to_protobuf(source_config):
-            parameters = common_pb2.PluginDefinedObject()
-            parameters.json = json.dumps(source_config.to_dict())
-            source_config_protobuf = common_pb2.SourceConfig()
-            source_config_protobuf.parameters.CopyFrom(parameters)
-            return source_config_protobuf
-
-        if not self.source_config_impl:
-            raise OperationNotDefinedError(Op.DISCOVERY_SOURCE_CONFIG)
-
-        repository_definition = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
-
-        source_configs = self.source_config_impl(
-            source_connection=RemoteConnection.from_proto(request.source_connection),
-            repository=repository_definition)
-
-        # Validate that this is a list of SourceConfigDefinition objects
-        if not isinstance(source_configs, list):
-            raise IncorrectReturnTypeError(
-                Op.DISCOVERY_SOURCE_CONFIG,
-                type(source_configs),
-                [SourceConfigDefinition])
-
-        if not all(isinstance(config, SourceConfigDefinition)
-                   for config in source_configs):
-            raise IncorrectReturnTypeError(
-                Op.DISCOVERY_SOURCE_CONFIG,
-                [type(config) for config in source_configs],
-                [SourceConfigDefinition])
-
-        source_config_discovery_response = (
-            platform_pb2.SourceConfigDiscoveryResponse())
-        source_config_protobuf_list = [to_protobuf(config)
-                                       for config in source_configs]
-        source_config_discovery_response.return_value.source_configs.extend(
-            source_config_protobuf_list)
-        return source_config_discovery_response
+        return dispatch(self, _dispatch.SOURCE_CONFIG_DISCOVERY, request)
+
+    def _internal_source_config_batch(self, request):
+        """Batched source config discovery wrapper.
+
+        Runs source config discovery for each repository of the request,
+        concurrently up to the max_workers given to the source_config
+        decorator. A failure to discover the source configs of one repository
+        is reported in that repository's response only.
+
+        Args:
+            request (SourceConfigDiscoveryBatchRequest): The source connection
+            and the discovered repositories.
+
+        Returns:
+            SourceConfigDiscoveryBatchResponse: One
+            SourceConfigDiscoveryResponse per repository, in the order of the
+            request's repositories.
+        """
+        return dispatch_source_config_batch(
+            self, request, self.source_config_max_workers)
 
 
 class LinkedOperations(object):
 
-    def __init__(self):
+    def __init__(self, definitions=None):
+        if definitions is None:
+            definitions = PluginDefinitions()
+        self._definitions = definitions
+        self._metrics = None
+        self._environment_limiter = None
+        self._hook_chains = None
+        self._timeouts = None
+        self._memo = None
         self.pre_snapshot_impl = None
         self.post_snapshot_impl = None
         self.start_staging_impl = None
         self.stop_staging_impl = None
         self.status_impl = None
+        self.status_cache = None
         self.worker_impl = None
         self.mount_specification_impl = None
 
@@ -283,11 +353,22 @@ class LinkedOperations(object):
             return stop_staging_impl
         return stop_staging_decorator
 
-    def status(self):
+    def status(self, cache_ttl=None,
+               cache_size=_status_cache.DEFAULT_MAX_SIZE):
+        """If cache_ttl is set, the status of each staged source is cached for
+        that many seconds, for up to cache_size sources. Running
+        start_staging() or stop_staging() on a source drops its cached
+        status.
+        """
+        status_cache = None
+        if cache_ttl is not None:
+            status_cache = StatusCache(cache_ttl, cache_size)
+
         def status_decorator(status_impl):
             if self.status_impl:
                 raise OperationAlreadyDefinedError(Op.LINKED_STATUS)
             self.status_impl = status_impl
+            self.status_cache = status_cache
             return status_impl
         return status_decorator
 
@@ -324,40 +405,7 @@ class LinkedOperations(object):
            DirectPreSnapshotResult if successful or PluginErrorResult in case
            of an error.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import LinkedSourceDefinition
-        from generated.definitions import SourceConfigDefinition
-
-        #
-        # While linked.pre_snapshot() is not a required operation, this should
-        # not be called if it wasn't implemented.
-        #
-        if not self.pre_snapshot_impl:
-            raise OperationNotDefinedError(Op.LINKED_PRE_SNAPSHOT)
-
-        direct_source_definition = LinkedSourceDefinition.from_dict(
-            json.loads(request.direct_source.linked_source.parameters.json))
-        direct_source = DirectSource(
-            guid=request.direct_source.linked_source.guid,
-            connection=RemoteConnection.from_proto(request.direct_source.connection),
-            parameters=direct_source_definition)
-
-        repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
-        source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-
-        self.pre_snapshot_impl(
-            direct_source=direct_source,
-            repository=repository,
-            source_config=source_config)
-
-        direct_pre_snapshot_response = platform_pb2.DirectPreSnapshotResponse()
-        direct_pre_snapshot_response.return_value.CopyFrom(
-            platform_pb2.DirectPreSnapshotResult())
-
-        return direct_pre_snapshot_response
+        return dispatch(self, _dispatch.DIRECT_PRE_SNAPSHOT, request)
 
     def _internal_direct_post_snapshot(self, request):
         """Post Snapshot Wrapper for direct plugins.
@@ -375,50 +423,7 @@ class LinkedOperations(object):
            DirectPostSnapshotResult which has the snapshot metadata on success.
            In case of errors, response object will contain PluginErrorResult.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import LinkedSourceDefinition
-        from generated.definitions import SourceConfigDefinition
-        from generated.definitions import SnapshotDefinition
-
-        def to_protobuf(snapshot):
-            parameters = common_pb2.PluginDefinedObject()
-            parameters.json = json.dumps(snapshot.to_dict())
-            snapshot_protobuf = common_pb2.Snapshot()
-            snapshot_protobuf.parameters.CopyFrom(parameters)
-            return snapshot_protobuf
-
-        if not self.post_snapshot_impl:
-            raise OperationNotDefinedError(Op.LINKED_POST_SNAPSHOT)
-
-        direct_source_definition = LinkedSourceDefinition.from_dict(
-            json.loads(request.direct_source.linked_source.parameters.json))
-        direct_source = DirectSource(
-            guid=request.direct_source.linked_source.guid,
-            connection=RemoteConnection.from_proto(request.direct_source.connection),
-            parameters=direct_source_definition)
-
-        repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
-        source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-
-        snapshot = self.post_snapshot_impl(
-            direct_source=direct_source,
-            repository=repository,
-            source_config=source_config)
-
-        # Validate that this is a SnapshotDefinition object
-        if not isinstance(snapshot, SnapshotDefinition):
-            raise IncorrectReturnTypeError(
-                Op.LINKED_POST_SNAPSHOT, type(snapshot), SnapshotDefinition)
-
-        direct_post_snapshot_response = (
-            platform_pb2.DirectPostSnapshotResponse())
-        direct_post_snapshot_response.return_value.snapshot.CopyFrom(
-            to_protobuf(snapshot))
-
-        return direct_post_snapshot_response
+        return dispatch(self, _dispatch.DIRECT_POST_SNAPSHOT, request)
 
     def _internal_staged_pre_snapshot(self, request):
         """Pre Snapshot Wrapper for staged plugins.
@@ -436,51 +441,7 @@ class LinkedOperations(object):
                 StagedPreSnapshotResult if successful or PluginErrorResult
                 in case of an error.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import LinkedSourceDefinition
-        from generated.definitions import SourceConfigDefinition
-        from generated.definitions import SnapshotParametersDefinition
-
-        #
-        # While linked.pre_snapshot() is not a required operation, this should
-        # not be called if it wasn't implemented.
-        #
-        if not self.pre_snapshot_impl:
-            raise OperationNotDefinedError(Op.LINKED_PRE_SNAPSHOT)
-
-        linked_source = request.staged_source.linked_source
-        staged_source_definition = (LinkedSourceDefinition.from_dict(
-                json.loads(linked_source.parameters.json)))
-        staged_mount = request.staged_source.staged_mount
-        mount = Mount(
-            remote_environment=RemoteEnvironment.from_proto(staged_mount.remote_environment),
-            mount_path=staged_mount.mount_path,
-            shared_path=staged_mount.shared_path)
-        staged_source = StagedSource(
-            guid=linked_source.guid,
-            source_connection=RemoteConnection.from_proto(request.staged_source.source_connection),
-            parameters=staged_source_definition,
-            mount=mount,
-            staged_connection=RemoteConnection.from_proto(request.staged_source.staged_connection))
-
-        repository = RepositoryDefinition.from_dict(
-                json.loads(request.repository.parameters.json))
-        source_config = SourceConfigDefinition.from_dict(
-                json.loads(request.source_config.parameters.json))
-        snapshot_parameters = SnapshotParametersDefinition.from_dict(
-                json.loads(request.snapshot_parameters.parameters.json))
-
-        self.pre_snapshot_impl(
-            staged_source=staged_source,
-            repository=repository,
-            source_config=source_config,
-            snapshot_parameters=snapshot_parameters)
-
-        response = platform_pb2.StagedPreSnapshotResponse()
-        response.return_value.CopyFrom(platform_pb2.StagedPreSnapshotResult())
-
-        return response
+        return dispatch(self, _dispatch.STAGED_PRE_SNAPSHOT, request)
 
     def _internal_staged_post_snapshot(self, request):
         """Post Snapshot Wrapper for staged plugins.
@@ -499,60 +460,7 @@ class LinkedOperations(object):
                 success. In case of errors, response object will contain
                 PluginErrorResult.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import LinkedSourceDefinition
-        from generated.definitions import SourceConfigDefinition
-        from generated.definitions import SnapshotDefinition
-        from generated.definitions import SnapshotParametersDefinition
-
-        def to_protobuf(snapshot):
-            parameters = common_pb2.PluginDefinedObject()
-            parameters.json = json.dumps(snapshot.to_dict())
-            snapshot_protobuf = common_pb2.Snapshot()
-            snapshot_protobuf.parameters.CopyFrom(parameters)
-            return snapshot_protobuf
-
-        if not self.post_snapshot_impl:
-            raise OperationNotDefinedError(Op.LINKED_POST_SNAPSHOT)
-
-        staged_source_definition = LinkedSourceDefinition.from_dict(
-                json.loads(
-                        request.staged_source.linked_source.parameters.json))
-        mount = Mount(
-                remote_environment=
-                RemoteEnvironment.from_proto(request.staged_source.staged_mount.remote_environment),
-                mount_path=request.staged_source.staged_mount.mount_path,
-                shared_path=request.staged_source.staged_mount.shared_path)
-        staged_source = StagedSource(
-                guid=request.staged_source.linked_source.guid,
-                source_connection=RemoteConnection.from_proto(request.staged_source.source_connection),
-                parameters=staged_source_definition,
-                mount=mount,
-                staged_connection=RemoteConnection.from_proto(request.staged_source.staged_connection))
-
-        repository = RepositoryDefinition.from_dict(
-                json.loads(request.repository.parameters.json))
-        source_config = SourceConfigDefinition.from_dict(
-                json.loads(request.source_config.parameters.json))
-        snapshot_parameters = SnapshotParametersDefinition.from_dict(
-                json.loads(request.snapshot_parameters.parameters.json))
-
-        snapshot = self.post_snapshot_impl(
-            staged_source=staged_source,
-            repository=repository,
-            source_config=source_config,
-            snapshot_parameters=snapshot_parameters)
-
-        # Validate that this is a SnapshotDefinition object
-        if not isinstance(snapshot, SnapshotDefinition):
-            raise IncorrectReturnTypeError(
-                Op.LINKED_POST_SNAPSHOT, type(snapshot), SnapshotDefinition)
-
-        response = platform_pb2.StagedPostSnapshotResponse()
-        response.return_value.snapshot.CopyFrom(to_protobuf(snapshot))
-
-        return response
+        return dispatch(self, _dispatch.STAGED_POST_SNAPSHOT, request)
 
     def _internal_start_staging(self, request):
         """Start staging Wrapper for staged plugins.
@@ -570,48 +478,7 @@ class LinkedOperations(object):
            StartStagingResponse: A response containing StartStagingResult
            if successful or PluginErrorResult in case of an error.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import LinkedSourceDefinition
-        from generated.definitions import SourceConfigDefinition
-
-        #
-        # While linked.start_staging() is not a required operation, this should
-        # not be called if it wasn't implemented.
-        #
-        if not self.start_staging_impl:
-            raise OperationNotDefinedError(Op.LINKED_START_STAGING)
-
-        staged_source_definition = LinkedSourceDefinition.from_dict(
-            json.loads(
-                request.staged_source.linked_source.parameters.json))
-        mount = Mount(
-            remote_environment=(
-                RemoteEnvironment.from_proto(request.staged_source.staged_mount.remote_environment)),
-            mount_path=request.staged_source.staged_mount.mount_path,
-            shared_path=request.staged_source.staged_mount.shared_path)
-        staged_source = StagedSource(
-            guid=request.staged_source.linked_source.guid,
-            source_connection=RemoteConnection.from_proto(request.staged_source.source_connection),
-            parameters=staged_source_definition,
-            mount=mount,
-            staged_connection=RemoteConnection.from_proto(request.staged_source.staged_connection))
-
-        repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
-        source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-
-        self.start_staging_impl(
-            staged_source=staged_source,
-            repository=repository,
-            source_config=source_config)
-
-        start_staging_response = platform_pb2.StartStagingResponse()
-        start_staging_response.return_value.CopyFrom(
-            platform_pb2.StartStagingResult())
-
-        return start_staging_response
+        return dispatch(self, _dispatch.START_STAGING, request)
 
     def _internal_stop_staging(self, request):
         """Stop staging Wrapper for staged plugins.
@@ -629,48 +496,7 @@ class LinkedOperations(object):
            StopStagingResponse: A response containing StopStagingResult
            if successful or PluginErrorResult in case of an error.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import LinkedSourceDefinition
-        from generated.definitions import SourceConfigDefinition
-
-        #
-        # While linked.stop_staging() is not a required operation, this should
-        # not be called if it wasn't implemented.
-        #
-        if not self.stop_staging_impl:
-            raise OperationNotDefinedError(Op.LINKED_STOP_STAGING)
-
-        staged_source_definition = LinkedSourceDefinition.from_dict(
-            json.loads(
-                request.staged_source.linked_source.parameters.json))
-        mount = Mount(
-            remote_environment=(
-                RemoteEnvironment.from_proto(request.staged_source.staged_mount.remote_environment)),
-            mount_path=request.staged_source.staged_mount.mount_path,
-            shared_path=request.staged_source.staged_mount.shared_path)
-        staged_source = StagedSource(
-            guid=request.staged_source.linked_source.guid,
-            source_connection=RemoteConnection.from_proto(request.staged_source.source_connection),
-            parameters=staged_source_definition,
-            mount=mount,
-            staged_connection=RemoteConnection.from_proto(request.staged_source.staged_connection))
-
-        repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
-        source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-
-        self.stop_staging_impl(
-            staged_source=staged_source,
-            repository=repository,
-            source_config=source_config)
-
-        stop_staging_response = platform_pb2.StopStagingResponse()
-        stop_staging_response.return_value.CopyFrom(
-            platform_pb2.StopStagingResult())
-
-        return stop_staging_response
+        return dispatch(self, _dispatch.STOP_STAGING, request)
 
     def _internal_status(self, request):
         """Staged Status Wrapper for staged plugins.
@@ -688,51 +514,7 @@ class LinkedOperations(object):
            StagedStatusResult which has active or inactive status. In
            case of errors, response object will contain PluginErrorResult.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import LinkedSourceDefinition
-        from generated.definitions import SourceConfigDefinition
-
-        #
-        # While linked.status() is not a required operation, this should
-        # not be called if it wasn't implemented.
-        #
-        if not self.status_impl:
-            raise OperationNotDefinedError(Op.LINKED_STATUS)
-
-        staged_source_definition = LinkedSourceDefinition.from_dict(
-            json.loads(request.staged_source.linked_source.parameters.json))
-        mount = Mount(
-            remote_environment=(
-                RemoteEnvironment.from_proto(request.staged_source.staged_mount.remote_environment)),
-            mount_path=request.staged_source.staged_mount.mount_path,
-            shared_path=request.staged_source.staged_mount.shared_path)
-        staged_source = StagedSource(
-            guid=request.staged_source.linked_source.guid,
-            source_connection=RemoteConnection.from_proto(request.staged_source.source_connection),
-            parameters=staged_source_definition,
-            mount=mount,
-            staged_connection=RemoteConnection.from_proto(request.staged_source.staged_connection))
-
-        repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
-        source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-
-        status = self.status_impl(
-            staged_source=staged_source,
-            repository=repository,
-            source_config=source_config)
-
-        # Validate that this is a Status object.
-        if not isinstance(status, Status):
-            raise IncorrectReturnTypeError(
-                Op.LINKED_STATUS, type(status), Status)
-
-        staged_status_response = platform_pb2.StagedStatusResponse()
-        staged_status_response.return_value.status = status.value
-
-        return staged_status_response
+        return dispatch(self, _dispatch.STAGED_STATUS, request)
 
     def _internal_worker(self, request):
         """Staged Worker Wrapper for staged plugins.
@@ -750,48 +532,7 @@ class LinkedOperations(object):
            StagedWorkerResponse: A response containing StagedWorkerResult
            if successful or PluginErrorResult in case of an error.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import LinkedSourceDefinition
-        from generated.definitions import SourceConfigDefinition
-
-        #
-        # While linked.worker() is not a required operation, this should
-        # not be called if it wasn't implemented.
-        #
-        if not self.worker_impl:
-            raise OperationNotDefinedError(Op.LINKED_WORKER)
-
-        staged_source_definition = LinkedSourceDefinition.from_dict(
-            json.loads(
-                request.staged_source.linked_source.parameters.json))
-        mount = Mount(
-            remote_environment=(
-                RemoteEnvironment.from_proto(request.staged_source.staged_mount.remote_environment)),
-            mount_path=request.staged_source.staged_mount.mount_path,
-            shared_path=request.staged_source.staged_mount.shared_path)
-        staged_source = StagedSource(
-            guid=request.staged_source.linked_source.guid,
-            source_connection=RemoteConnection.from_proto(request.staged_source.source_connection),
-            parameters=staged_source_definition,
-            mount=mount,
-            staged_connection=RemoteConnection.from_proto(request.staged_source.staged_connection))
-
-        repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
-        source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-
-        self.worker_impl(
-            staged_source=staged_source,
-            repository=repository,
-            source_config=source_config)
-
-        staged_worker_response = platform_pb2.StagedWorkerResponse()
-        staged_worker_response.return_value.CopyFrom(
-            platform_pb2.StagedWorkerResult())
-
-        return staged_worker_response
+        return dispatch(self, _dispatch.STAGED_WORKER, request)
 
     def _internal_mount_specification(self, request):
         """Staged Mount/Ownership Spec Wrapper for staged plugins.
@@ -811,84 +552,20 @@ class LinkedOperations(object):
            success. In case of errors, response object will contain
            PluginErrorResult.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import LinkedSourceDefinition
-
-        def to_protobuf_single_mount(single_mount):
-            if single_mount.shared_path:
-                raise PluginRuntimeError(
-                    'Shared path is not supported for linked sources.')
-
-            single_mount_protobuf = common_pb2.SingleEntireMount()
-            single_mount_protobuf.mount_path = single_mount.mount_path
-            single_mount_protobuf.remote_environment.CopyFrom(
-                single_mount.remote_environment.to_proto())
-            return single_mount_protobuf
-
-        def to_protobuf_ownership_spec(ownership_spec):
-            ownership_spec_protobuf = common_pb2.OwnershipSpec()
-            ownership_spec_protobuf.uid = ownership_spec.uid
-            ownership_spec_protobuf.gid = ownership_spec.gid
-            return ownership_spec_protobuf
-
-        if not self.mount_specification_impl:
-            raise OperationNotDefinedError(Op.LINKED_MOUNT_SPEC)
-
-        staged_source_definition = LinkedSourceDefinition.from_dict(
-            json.loads(request.staged_source.linked_source.parameters.json))
-        mount = Mount(
-            remote_environment=(
-                RemoteEnvironment.from_proto(request.staged_source.staged_mount.remote_environment)),
-            mount_path=request.staged_source.staged_mount.mount_path,
-            shared_path=request.staged_source.staged_mount.shared_path)
-        staged_source = StagedSource(
-            guid=request.staged_source.linked_source.guid,
-            source_connection=RemoteConnection.from_proto(request.staged_source.source_connection),
-            parameters=staged_source_definition,
-            mount=mount,
-            staged_connection=RemoteConnection.from_proto(request.staged_source.staged_connection))
-
-        repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
-
-        mount_spec = self.mount_specification_impl(
-            staged_source=staged_source,
-            repository=repository)
-
-        # Validate that this is a MountSpecification object.
-        if not isinstance(mount_spec, MountSpecification):
-            raise IncorrectReturnTypeError(
-                Op.LINKED_MOUNT_SPEC,
-                type(mount_spec),
-                MountSpecification)
-
-        # Only one mount is supported for linked sources.
-        mount_len = len(mount_spec.mounts)
-        if mount_len != 1:
-            raise PluginRuntimeError(
-                'Exactly one mount must be provided for staging sources.'
-                ' Found {}'.format(mount_len))
-
-        staged_mount = to_protobuf_single_mount(mount_spec.mounts[0])
-
-        staged_mount_spec_response = platform_pb2.StagedMountSpecResponse()
-        staged_mount_spec_response.return_value.staged_mount.CopyFrom(
-            staged_mount)
-
-        # Ownership spec is optional for linked sources.
-        if mount_spec.ownership_specification:
-            ownership_spec = to_protobuf_ownership_spec(
-                mount_spec.ownership_specification)
-            staged_mount_spec_response.return_value.ownership_spec.CopyFrom(
-                ownership_spec)
-
-        return staged_mount_spec_response
+        return dispatch(self, _dispatch.STAGED_MOUNT_SPEC, request)
 
 
 class VirtualOperations(object):
 
-    def __init__(self):
+    def __init__(self, definitions=None):
+        if definitions is None:
+            definitions = PluginDefinitions()
+        self._definitions = definitions
+        self._metrics = None
+        self._environment_limiter = None
+        self._hook_chains = None
+        self._timeouts = None
+        self._memo = None
         self.configure_impl = None
         self.unconfigure_impl = None
         self.reconfigure_impl = None
@@ -897,6 +574,7 @@ class VirtualOperations(object):
         self.pre_snapshot_impl = None
         self.post_snapshot_impl = None
         self.status_impl = None
+        self.status_cache = None
         self.initialize_impl = None
         self.mount_specification_impl = None
 
@@ -956,11 +634,22 @@ class VirtualOperations(object):
             return post_snapshot_impl
         return post_snapshot_decorator
 
-    def status(self):
+    def status(self, cache_ttl=None,
+               cache_size=_status_cache.DEFAULT_MAX_SIZE):
+        """If cache_ttl is set, the status of each virtual source is cached for
+        that many seconds, for up to cache_size sources. Running
+        configure(), unconfigure(), reconfigure(), start() or stop() on a
+        source drops its cached status.
+        """
+        status_cache = None
+        if cache_ttl is not None:
+            status_cache = StatusCache(cache_ttl, cache_size)
+
         def status_decorator(status_impl):
             if self.status_impl:
                 raise OperationAlreadyDefinedError(Op.VIRTUAL_STATUS)
             self.status_impl = status_impl
+            self.status_cache = status_cache
             return status_impl
         return status_decorator
 
@@ -981,13 +670,6 @@ class VirtualOperations(object):
             return mount_specification_impl
         return mount_specification_decorator
 
-    @staticmethod
-    def _from_protobuf_single_subset_mount(single_subset_mount):
-            return Mount(
-                remote_environment=RemoteEnvironment.from_proto(single_subset_mount.remote_environment),
-                mount_path=single_subset_mount.mount_path,
-                shared_path=single_subset_mount.shared_path)
-
     def _internal_configure(self, request):
         """Configure operation wrapper.
 
@@ -1010,45 +692,7 @@ class VirtualOperations(object):
           ConfigureResponse: A response containing the return value of the
           configure operation, as a ConfigureResult.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import VirtualSourceDefinition
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import SnapshotDefinition
-        from generated.definitions import SourceConfigDefinition
-
-        if not self.configure_impl:
-            raise OperationNotDefinedError(Op.VIRTUAL_CONFIGURE)
-
-        virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [VirtualOperations._from_protobuf_single_subset_mount(m)
-                  for m in request.virtual_source.mounts]
-
-        virtual_source = VirtualSource(
-            guid=request.virtual_source.guid,
-            connection=RemoteConnection.from_proto(request.virtual_source.connection),
-            parameters=virtual_source_definition,
-            mounts=mounts)
-
-        repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
-        snapshot = SnapshotDefinition.from_dict(
-            json.loads(request.snapshot.parameters.json))
-
-        config = self.configure_impl(
-            virtual_source=virtual_source,
-            repository=repository,
-            snapshot=snapshot)
-
-        # Validate that this is a SourceConfigDefinition object.
-        if not isinstance(config, SourceConfigDefinition):
-            raise IncorrectReturnTypeError(
-                Op.VIRTUAL_CONFIGURE, type(config), SourceConfigDefinition)
-
-        configure_response = platform_pb2.ConfigureResponse()
-        configure_response.return_value.source_config.parameters.json = (
-            json.dumps(config.to_dict()))
-        return configure_response
+        return dispatch(self, _dispatch.VIRTUAL_CONFIGURE, request)
 
     def _internal_unconfigure(self, request):
         """Unconfigure operation wrapper.
@@ -1065,43 +709,7 @@ class VirtualOperations(object):
           UnconfigureResponse: A response containing UnconfigureResult
            if successful or PluginErrorResult in case of an error.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import VirtualSourceDefinition
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import SourceConfigDefinition
-
-        #
-        # While virtual.unconfigure() is not a required operation, this should
-        # not be called if it wasn't implemented.
-        #
-        if not self.unconfigure_impl:
-            raise OperationNotDefinedError(Op.VIRTUAL_UNCONFIGURE)
-
-        virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [VirtualOperations._from_protobuf_single_subset_mount(m)
-                  for m in request.virtual_source.mounts]
-
-        virtual_source = VirtualSource(
-            guid=request.virtual_source.guid,
-            connection=RemoteConnection.from_proto(request.virtual_source.connection),
-            parameters=virtual_source_definition,
-            mounts=mounts)
-
-        repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
-        source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-
-        self.unconfigure_impl(
-            repository=repository,
-            source_config=source_config,
-            virtual_source=virtual_source)
-
-        unconfigure_response = platform_pb2.UnconfigureResponse()
-        unconfigure_response.return_value.CopyFrom(
-            platform_pb2.UnconfigureResult())
-        return unconfigure_response
+        return dispatch(self, _dispatch.VIRTUAL_UNCONFIGURE, request)
 
     def _internal_reconfigure(self, request):
         """Reconfigure operation wrapper.
@@ -1116,47 +724,7 @@ class VirtualOperations(object):
           ReconfigureResponse: A response containing the return value of the
           reconfigure operation, as a ReconfigureResult.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import VirtualSourceDefinition
-        from generated.definitions import SnapshotDefinition
-        from generated.definitions import SourceConfigDefinition
-        from generated.definitions import RepositoryDefinition
-
-        if not self.reconfigure_impl:
-            raise OperationNotDefinedError(Op.VIRTUAL_RECONFIGURE)
-
-        virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [VirtualOperations._from_protobuf_single_subset_mount(m)
-                  for m in request.virtual_source.mounts]
-        virtual_source = VirtualSource(
-            guid=request.virtual_source.guid,
-            connection=RemoteConnection.from_proto(request.virtual_source.connection),
-            parameters=virtual_source_definition,
-            mounts=mounts)
-
-        snapshot = SnapshotDefinition.from_dict(
-            json.loads(request.snapshot.parameters.json))
-        source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-        repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
-
-        config = self.reconfigure_impl(
-            snapshot=snapshot,
-            repository=repository,
-            source_config=source_config,
-            virtual_source=virtual_source)
-
-        # Validate that this is a SourceConfigDefinition object.
-        if not isinstance(config, SourceConfigDefinition):
-            raise IncorrectReturnTypeError(
-                Op.VIRTUAL_RECONFIGURE, type(config), SourceConfigDefinition)
-
-        reconfigure_response = platform_pb2.ReconfigureResponse()
-        reconfigure_response.return_value.source_config.parameters.json = (
-            json.dumps(config.to_dict()))
-        return reconfigure_response
+        return dispatch(self, _dispatch.VIRTUAL_RECONFIGURE, request)
 
     def _internal_start(self, request):
         """Start operation wrapper.
@@ -1171,41 +739,7 @@ class VirtualOperations(object):
           StartResponse: A response containing StartResult if successful or
           PluginErrorResult in case of an error.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import VirtualSourceDefinition
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import SourceConfigDefinition
-
-        #
-        # While virtual.start() is not a required operation, this should
-        # not be called if it wasn't implemented.
-        #
-        if not self.start_impl:
-            raise OperationNotDefinedError(Op.VIRTUAL_START)
-
-        virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [VirtualOperations._from_protobuf_single_subset_mount(m)
-                  for m in request.virtual_source.mounts]
-        virtual_source = VirtualSource(
-            guid=request.virtual_source.guid,
-            connection=RemoteConnection.from_proto(request.virtual_source.connection),
-            parameters=virtual_source_definition,
-            mounts=mounts)
-
-        repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
-        source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-
-        self.start_impl(
-            repository=repository,
-            source_config=source_config,
-            virtual_source=virtual_source)
-
-        start_response = platform_pb2.StartResponse()
-        start_response.return_value.CopyFrom(platform_pb2.StartResult())
-        return start_response
+        return dispatch(self, _dispatch.VIRTUAL_START, request)
 
     def _internal_stop(self, request):
         """Stop operation wrapper.
@@ -1219,41 +753,7 @@ class VirtualOperations(object):
           StopResponse: A response containing StopResult if successful or
           PluginErrorResult in case of an error.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import VirtualSourceDefinition
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import SourceConfigDefinition
-
-        #
-        # While virtual.stop() is not a required operation, this should
-        # not be called if it wasn't implemented.
-        #
-        if not self.stop_impl:
-            raise OperationNotDefinedError(Op.VIRTUAL_STOP)
-
-        virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [VirtualOperations._from_protobuf_single_subset_mount(m)
-                  for m in request.virtual_source.mounts]
-        virtual_source = VirtualSource(
-            guid=request.virtual_source.guid,
-            connection=RemoteConnection.from_proto(request.virtual_source.connection),
-            parameters=virtual_source_definition,
-            mounts=mounts)
-
-        repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
-        source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-
-        self.stop_impl(
-            repository=repository,
-            source_config=source_config,
-            virtual_source=virtual_source)
-
-        stop_response = platform_pb2.StopResponse()
-        stop_response.return_value.CopyFrom(platform_pb2.StopResult())
-        return stop_response
+        return dispatch(self, _dispatch.VIRTUAL_STOP, request)
 
     def _internal_pre_snapshot(self, request):
         """Virtual pre snapshot operation wrapper.
@@ -1272,43 +772,7 @@ class VirtualOperations(object):
           VirtualPreSnapshotResult if successful or PluginErrorResult in case
           of an error.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import VirtualSourceDefinition
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import SourceConfigDefinition
-
-        #
-        # While virtual.pre_snapshot() is not a required operation, this should
-        # not be called if it wasn't implemented.
-        #
-        if not self.pre_snapshot_impl:
-            raise OperationNotDefinedError(Op.VIRTUAL_PRE_SNAPSHOT)
-
-        virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [VirtualOperations._from_protobuf_single_subset_mount(m)
-                  for m in request.virtual_source.mounts]
-        virtual_source = VirtualSource(
-            guid=request.virtual_source.guid,
-            connection=RemoteConnection.from_proto(request.virtual_source.connection),
-            parameters=virtual_source_definition,
-            mounts=mounts)
-
-        repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
-        source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-
-        self.pre_snapshot_impl(
-            repository=repository,
-            source_config=source_config,
-            virtual_source=virtual_source)
-
-        virtual_pre_snapshot_response = (
-            platform_pb2.VirtualPreSnapshotResponse())
-        virtual_pre_snapshot_response.return_value.CopyFrom(
-            platform_pb2.VirtualPreSnapshotResult())
-        return virtual_pre_snapshot_response
+        return dispatch(self, _dispatch.VIRTUAL_PRE_SNAPSHOT, request)
 
     def _internal_post_snapshot(self, request):
         """Virtual post snapshot operation wrapper.
@@ -1327,52 +791,7 @@ class VirtualOperations(object):
           of the virtual post snapshot operation, as a
           VirtualPostSnapshotResult.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import VirtualSourceDefinition
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import SnapshotDefinition
-        from generated.definitions import SourceConfigDefinition
-
-        def to_protobuf(snapshot):
-            parameters = common_pb2.PluginDefinedObject()
-            parameters.json = json.dumps(snapshot.to_dict())
-            snapshot_protobuf = common_pb2.Snapshot()
-            snapshot_protobuf.parameters.CopyFrom(parameters)
-            return snapshot_protobuf
-
-        if not self.post_snapshot_impl:
-            raise OperationNotDefinedError(Op.VIRTUAL_POST_SNAPSHOT)
-
-        virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [VirtualOperations._from_protobuf_single_subset_mount(m)
-                  for m in request.virtual_source.mounts]
-        virtual_source = VirtualSource(
-            guid=request.virtual_source.guid,
-            connection=RemoteConnection.from_proto(request.virtual_source.connection),
-            parameters=virtual_source_definition,
-            mounts=mounts)
-
-        repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
-        source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-
-        snapshot = self.post_snapshot_impl(
-            repository=repository,
-            source_config=source_config,
-            virtual_source=virtual_source)
-
-        # Validate that this is a SnapshotDefinition object
-        if not isinstance(snapshot, SnapshotDefinition):
-            raise IncorrectReturnTypeError(
-                Op.VIRTUAL_POST_SNAPSHOT, type(snapshot), SnapshotDefinition)
-
-        virtual_post_snapshot_response = (
-            platform_pb2.VirtualPostSnapshotResponse())
-        virtual_post_snapshot_response.return_value.snapshot.CopyFrom(
-            to_protobuf(snapshot))
-        return virtual_post_snapshot_response
+        return dispatch(self, _dispatch.VIRTUAL_POST_SNAPSHOT, request)
 
     def _internal_status(self, request):
         """Virtual status operation wrapper.
@@ -1389,46 +808,7 @@ class VirtualOperations(object):
           VirtualStatusResponse: A response containing VirtualStatusResult
           if successful or PluginErrorResult in case of an error.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import VirtualSourceDefinition
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import SourceConfigDefinition
-
-        #
-        # While virtual.status() is not a required operation, this should
-        # not be called if it wasn't implemented.
-        #
-        if not self.status_impl:
-            raise OperationNotDefinedError(Op.VIRTUAL_STATUS)
-
-        virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [VirtualOperations._from_protobuf_single_subset_mount(m)
-                  for m in request.virtual_source.mounts]
-        virtual_source = VirtualSource(
-            guid=request.virtual_source.guid,
-            connection=RemoteConnection.from_proto(request.virtual_source.connection),
-            parameters=virtual_source_definition,
-            mounts=mounts)
-
-        repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
-        source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-
-        virtual_status = self.status_impl(
-            repository=repository,
-            source_config=source_config,
-            virtual_source=virtual_source)
-
-        # Validate that this is a Status object.
-        if not isinstance(virtual_status, Status):
-            raise IncorrectReturnTypeError(
-                Op.VIRTUAL_STATUS, type(virtual_status), Status)
-
-        virtual_status_response = platform_pb2.VirtualStatusResponse()
-        virtual_status_response.return_value.status = virtual_status.value
-        return virtual_status_response
+        return dispatch(self, _dispatch.VIRTUAL_STATUS, request)
 
     def _internal_initialize(self, request):
         """Initialize operation wrapper.
@@ -1445,37 +825,7 @@ class VirtualOperations(object):
           InitializeResponse: A response containing InitializeResult
           if successful or PluginErrorResult in case of an error.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import VirtualSourceDefinition
-        from generated.definitions import RepositoryDefinition
-        from generated.definitions import SourceConfigDefinition
-
-        if not self.initialize_impl:
-            raise OperationNotDefinedError(Op.VIRTUAL_INITIALIZE)
-
-        virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [VirtualOperations._from_protobuf_single_subset_mount(m)
-                  for m in request.virtual_source.mounts]
-        virtual_source = VirtualSource(
-            guid=request.virtual_source.guid,
-            connection=RemoteConnection.from_proto(request.virtual_source.connection),
-            parameters=virtual_source_definition,
-            mounts=mounts)
-
-        repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
-        source_config = SourceConfigDefinition.from_dict(
-            json.loads(request.source_config.parameters.json))
-
-        self.initialize_impl(
-            repository=repository,
-            source_config=source_config,
-            virtual_source=virtual_source)
-        initialize_response = platform_pb2.InitializeResponse()
-        initialize_response.return_value.CopyFrom(
-            platform_pb2.InitializeResult())
-        return initialize_response
+        return dispatch(self, _dispatch.VIRTUAL_INITIALIZE, request)
 
     def _internal_mount_specification(self, request):
         """Virtual mount spec operation wrapper.
@@ -1493,76 +843,134 @@ class VirtualOperations(object):
           VirtualMountSpecResponse: A response containing the return value of
           the virtual mount spec operation, as a VirtualMountSpecResult.
         """
-        # Reasoning for method imports are in this file's docstring.
-        from generated.definitions import VirtualSourceDefinition
-        from generated.definitions import RepositoryDefinition
+        return dispatch(self, _dispatch.VIRTUAL_MOUNT_SPEC, request)
+
 
-        def to_protobuf_single_mount(single_mount):
-            single_mount_protobuf = common_pb2.SingleSubsetMount()
+class UpgradeOperations(object):
+    """The migrations that upgrade the plugin defined objects created by
+    older versions of the plugin.
 
-            environment_protobuf = single_mount.remote_environment.to_proto()
+    Each decorator registers a migration for one type of object under a
+    migration id, a string of dot separated numbers such as '1.2.0'.
+    Migrations take the parameters of one object as a dict and return the
+    upgraded dict. When several migrations apply, they run in migration id
+    order, each one over the output of the previous one.
+    """
 
-            single_mount_protobuf.remote_environment.CopyFrom(
-                environment_protobuf)
-            single_mount_protobuf.mount_path = single_mount.mount_path
+    def __init__(self, definitions=None):
+        if definitions is None:
+            definitions = PluginDefinitions()
+        self._definitions = definitions
+        self.linked_source_migrations = {}
+        self.virtual_source_migrations = {}
+        self.source_config_migrations = {}
+        self.snapshot_migrations = {}
 
-            if single_mount.shared_path:
-                single_mount_protobuf.shared_path = single_mount.shared_path
+    @staticmethod
+    def _migration(operation, migrations, migration_id):
+        migration_key(migration_id)
+
+        def migration_decorator(migration_impl):
+            if migration_id in migrations:
+                raise MigrationIdAlreadyUsedError(operation, migration_id)
+            migrations[migration_id] = migration_impl
+            return migration_impl
+        return migration_decorator
 
-            return single_mount_protobuf
+    def linked_source(self, migration_id):
+        return self._migration(UpgradeOperation.LINKED_SOURCE,
+                               self.linked_source_migrations, migration_id)
 
-        def to_protobuf_ownership_spec(ownership_spec):
-            ownership_spec_protobuf = common_pb2.OwnershipSpec()
-            ownership_spec_protobuf.uid = ownership_spec.uid
-            ownership_spec_protobuf.gid = ownership_spec.gid
-            return ownership_spec_protobuf
+    def virtual_source(self, migration_id):
+        return self._migration(UpgradeOperation.VIRTUAL_SOURCE,
+                               self.virtual_source_migrations, migration_id)
 
-        if not self.mount_specification_impl:
-            raise OperationNotDefinedError(Op.VIRTUAL_MOUNT_SPEC)
+    def source_config(self, migration_id):
+        return self._migration(UpgradeOperation.SOURCE_CONFIG,
+                               self.source_config_migrations, migration_id)
 
-        virtual_source_definition = VirtualSourceDefinition.from_dict(
-            json.loads(request.virtual_source.parameters.json))
-        mounts = [VirtualOperations._from_protobuf_single_subset_mount(m)
-                  for m in request.virtual_source.mounts]
-        virtual_source = VirtualSource(
-            guid=request.virtual_source.guid,
-            connection=RemoteConnection.from_proto(request.virtual_source.connection),
-            parameters=virtual_source_definition,
-            mounts=mounts)
+    def snapshot(self, migration_id):
+        return self._migration(UpgradeOperation.SNAPSHOT,
+                               self.snapshot_migrations, migration_id)
 
-        repository = RepositoryDefinition.from_dict(
-            json.loads(request.repository.parameters.json))
+    def _internal_upgrade(self, request):
+        """Upgrade wrapper.
 
-        virtual_mount_spec = self.mount_specification_impl(
-            repository=repository,
-            virtual_source=virtual_source)
+        Executed when a new version of the plugin is installed, with batches
+        of the objects created by older versions. Each object is decoded and
+        encoded once however many migrations run over it.
 
-        # Validate that this is a MountSpecification object
-        if not isinstance(virtual_mount_spec, MountSpecification):
-            raise IncorrectReturnTypeError(
-                Op.VIRTUAL_MOUNT_SPEC,
-                type(virtual_mount_spec),
-                MountSpecification)
+        Args:
+            request (UpgradeRequest): The objects to upgrade and the
+            migration ids to apply to them.
 
-        virtual_mount_spec_response = platform_pb2.VirtualMountSpecResponse()
+        Returns:
+            UpgradeResponse: The upgraded objects.
+        """
+        return upgrade(self, request)
 
-        if virtual_mount_spec.ownership_specification:
-            ownership_spec = to_protobuf_ownership_spec(
-                virtual_mount_spec.ownership_specification)
-            virtual_mount_spec_response.return_value.ownership_spec.CopyFrom(
-                ownership_spec)
 
-        mounts_list = [to_protobuf_single_mount(m)
-                       for m in virtual_mount_spec.mounts]
-        virtual_mount_spec_response.return_value.mounts.extend(mounts_list)
-        return virtual_mount_spec_response
+def _check_timeout(timeout):
+    if (not isinstance(timeout, numbers.Real) or isinstance(timeout, bool)
+            or timeout <= 0):
+        raise ValueError(
+            'A timeout must be a positive number of seconds. Found'
+            ' {!r}'.format(timeout))
 
 
 class Plugin(object):
-    def __init__(self):
-        self.__discovery = DiscoveryOperations()
-        self.__linked = LinkedOperations()
-        self.__virtual = VirtualOperations()
+    """The entry point of a plugin, used to register its operations.
+
+    Args:
+        definition_cache_size (int): If set, up to this many decoded plugin
+            defined objects (repositories, source configs, snapshots, etc.)
+            are cached across operations so identical payloads from the
+            engine are only decoded once. Disabled by default.
+        lazy_definitions (bool): If True, plugin defined objects are passed
+            to operations as proxies that are only decoded when first used.
+            Operations that never look at an argument don't pay for decoding
+            it. Disabled by default.
+        max_operations_per_environment (int): If set, at most this many
+            operations run at once on any one environment when the plugin is
+            invoked from several threads. Others wait for their turn, up to
+            their deadline. Statuses served from the status cache don't
+            wait. There is no limit by default.
+        operation_timeouts (dict of Operation:float): If set, the seconds
+            each of the given operations may run for. Operations have no
+            timeout by default.
+    """
+    def __init__(self, definition_cache_size=0, lazy_definitions=False,
+                 max_operations_per_environment=None,
+                 operation_timeouts=None):
+        timeouts = None
+        if operation_timeouts:
+            for operation, timeout in operation_timeouts.items():
+                if not isinstance(operation, Op):
+                    raise ValueError(
+                        'Timeouts can only be set for Operations. Found'
+                        ' {!r}'.format(operation))
+                _check_timeout(timeout)
+            timeouts = dict(operation_timeouts)
+        cache = None
+        if definition_cache_size:
+            cache = DefinitionCache(definition_cache_size)
+        limiter = None
+        if max_operations_per_environment is not None:
+            limiter = EnvironmentLimiter(max_operations_per_environment)
+        self.__definitions = PluginDefinitions(cache, lazy_definitions)
+        self.__discovery = DiscoveryOperations(self.__definitions)
+        self.__linked = LinkedOperations(self.__definitions)
+        self.__virtual = VirtualOperations(self.__definitions)
+        self.__upgrade = UpgradeOperations(self.__definitions)
+        self.__environment_limiter = limiter
+        for operations in (self.__discovery, self.__linked, self.__virtual):
+            operations._environment_limiter = limiter
+            operations._timeouts = timeouts
+        self.__hooks = OperationHooks(
+            (self.__discovery, self.__linked, self.__virtual))
+        self.__metrics = None
+        self.__metrics_flusher = None
+        self.__memo = None
 
     @property
     def discovery(self):
@@ -1575,3 +983,174 @@ class Plugin(object):
     @property
     def virtual(self):
         return self.__virtual
+
+    @property
+    def upgrade(self):
+        return self.__upgrade
+
+    @property
+    def hooks(self):
+        """OperationHooks: Registers hooks run before, after or around
+        operations, e.g. @plugin.hooks.around(Operation.VIRTUAL_STATUS).
+        """
+        return self.__hooks
+
+    def warmup(self):
+        """Does the one-time work of dispatching operations ahead of time.
+
+        The generated definition classes are resolved and the protobuf
+        messages of every operation are loaded. Otherwise this happens during
+        the first operations run after the plugin is loaded. Calling it more
+        than once is harmless.
+        """
+        self.__definitions.resolve_all()
+        _dispatch.load_descriptors()
+
+    @property
+    def metrics(self):
+        """OperationMetrics: The latency metrics of the plugin's operations,
+        or None if they aren't enabled.
+        """
+        return self.__metrics
+
+    def enable_metrics(self, flush_interval=None, handler=None):
+        """Starts recording how long each phase of every operation takes.
+
+        Metrics are disabled by default. Once enabled, they can be read
+        through the metrics property at any time.
+
+        Args:
+            flush_interval (float): If set, the metrics are also written to
+                handler every flush_interval seconds from a background thread.
+            handler (logging.Handler): Where to write the metrics, usually a
+                dlpx.virtualization.libs.PlatformHandler. Required if
+                flush_interval is set.
+
+        Returns:
+            OperationMetrics: The metrics being recorded.
+        """
+        if flush_interval is not None and handler is None:
+            raise ValueError(
+                'A logging handler is required to flush metrics.')
+        metrics = OperationMetrics()
+        flusher = None
+        if flush_interval is not None:
+            # Validates flush_interval before the current metrics are dropped.
+            flusher = MetricsFlusher(metrics, handler, flush_interval)
+        self.disable_metrics()
+
+        if flusher is not None:
+            self.__metrics_flusher = flusher
+            flusher.start()
+        self.__metrics = metrics
+        for operations in (self.__discovery, self.__linked, self.__virtual):
+            operations._metrics = metrics
+        return metrics
+
+    def disable_metrics(self):
+        """Stops recording metrics and flushes them one last time if they
+        were being flushed periodically.
+        """
+        for operations in (self.__discovery, self.__linked, self.__virtual):
+            operations._metrics = None
+        self.__metrics = None
+        if self.__metrics_flusher is not None:
+            self.__metrics_flusher.stop()
+            self.__metrics_flusher = None
+
+    @property
+    def memo(self):
+        """OperationMemo: The memoized responses of the plugin's operations,
+        or None if memoization isn't enabled.
+        """
+        return self.__memo
+
+    def enable_memoization(self, store, namespace, *operations):
+        """Remembers the responses of the given operations, so that calling
+        one again with an identical request, as when the engine retries a
+        job, returns the same response without running the implementation.
+
+        Memoization is disabled by default. Only operations that can be
+        skipped once they have succeeded with a request should be memoized.
+
+        Args:
+            store (MemoryMemoStore or DiskMemoStore): Where the responses
+                are kept.
+            namespace (str): Separates the responses of this plugin from
+                others sharing the store, typically the plugin's id and
+                version, e.g. 'my-plugin:1.2.0'.
+            *operations (Operation): The operations to memoize.
+
+        Returns:
+            OperationMemo: The memo of the operations.
+        """
+        memo = OperationMemo(store, operations, namespace)
+        self.__memo = memo
+        for operations_object in (self.__discovery, self.__linked,
+                                  self.__virtual):
+            operations_object._memo = memo
+        return memo
+
+    def disable_memoization(self):
+        """Stops remembering and returning responses. The store keeps the
+        responses already remembered.
+        """
+        for operations in (self.__discovery, self.__linked, self.__virtual):
+            operations._memo = None
+        self.__memo = None
+
+    @property
+    def definition_cache(self):
+        """DefinitionCache: The cache of decoded plugin defined objects, or
+        None if it wasn't enabled.
+        """
+        return self.__definitions.cache
+
+    @property
+    def environment_limiter(self):
+        """EnvironmentLimiter: The limit on the operations running at once on
+        an environment, or None if there is none.
+        """
+        return self.__environment_limiter
+
+    @staticmethod
+    def operation_names():
+        """Returns the sorted names of the operations invoke() accepts."""
+        return sorted(_INVOCATIONS)
+
+    def invoke(self, operation_name, request_bytes, timeout=None):
+        """Runs a wrapper on a serialized request.
+
+        The request is parsed once into the wrapper's request class and the
+        response is serialized once on the way out, so a runtime that holds
+        requests as bytes doesn't need to build any other messages.
+
+        Args:
+            operation_name (str): The wrapper to run, e.g.
+                'virtual.configure' or 'linked.direct_pre_snapshot'. See
+                operation_names().
+            request_bytes (str): The serialized request of the wrapper, e.g.
+                a ConfigureRequest.
+            timeout (float): If set, the seconds the operation may run for.
+                The operation's timeout from operation_timeouts still applies
+                if it is shorter.
+
+        Returns:
+            str: The serialized response of the wrapper.
+        """
+        invocation = _INVOCATIONS.get(operation_name)
+        if invocation is None:
+            raise ValueError(
+                "Unknown operation '{}'. Expected one of {}.".format(
+                    operation_name, ', '.join(self.operation_names())))
+        operations, wrapper, request_type = invocation
+        deadline = None
+        if timeout is not None:
+            _check_timeout(timeout)
+            deadline = time.time() + timeout
+
+        request = request_type()
+        request.ParseFromString(request_bytes)
+        with deadline_scope(deadline):
+            response = getattr(getattr(self, operations), wrapper)(request)
+        return response.SerializeToString()
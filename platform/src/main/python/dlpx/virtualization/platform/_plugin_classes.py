@@ -3,7 +3,8 @@
 #
 
 import enum
-from dlpx.virtualization.common import RemoteConnection, RemoteEnvironment
+from dlpx.virtualization.common import (RemoteConnection, RemoteEnvironment,
+                                        ValueObject)
 from dlpx.virtualization.common.exceptions import IncorrectTypeError
 
 """Classes used for Plugin Operations
@@ -14,6 +15,12 @@ hide the implemenatation details for protobufs and also to provide the
 correct types. For example, protobufs store the plugin defined properties
 as json. However the plugin operations get these properties as an instance
 of the autogenerated classes from the schemas (e.g. VirtualSourceDefinition)
+
+Like the classes of dlpx.virtualization.common, instances are compared by
+value and their fields are read-only. Sources are hashed by their guid and
+connections only, as their parameters may not be hashable. The mounts of
+VirtualSource and MountSpecification are the list they were built with, so a
+MountSpecification used as a dict key must not have its mounts changed.
 """
 __all__ = [
     "VirtualSource",
@@ -25,7 +32,8 @@ __all__ = [
     "MountSpecification"]
 
 
-class VirtualSource(object):
+class VirtualSource(ValueObject):
+    __slots__ = ('_guid', '_connection', '_parameters', '_mounts')
 
     def __init__(self, guid, connection, parameters, mounts):
         self._guid = guid
@@ -60,8 +68,16 @@ class VirtualSource(object):
         """list(Mount): The mounts of this VirtualSource."""
         return self._mounts
 
+    def _values(self):
+        return self._guid, self._connection, self._parameters, self._mounts
+
+    def _hash_values(self):
+        return self._guid, self._connection
 
-class StagedSource(object):
+
+class StagedSource(ValueObject):
+    __slots__ = ('_guid', '_source_connection', '_parameters', '_mount',
+                 '_staged_connection')
 
     def __init__(self, guid, source_connection, parameters, mount,
                  staged_connection):
@@ -113,8 +129,16 @@ class StagedSource(object):
         staging environment for this StagedSource."""
         return self._staged_connection
 
+    def _values(self):
+        return (self._guid, self._source_connection, self._parameters,
+                self._mount, self._staged_connection)
+
+    def _hash_values(self):
+        return self._guid, self._source_connection, self._staged_connection
 
-class DirectSource(object):
+
+class DirectSource(ValueObject):
+    __slots__ = ('_guid', '_connection', '_parameters')
 
     def __init__(self, guid, connection, parameters):
         self._guid = guid
@@ -145,6 +169,12 @@ class DirectSource(object):
         """
         return self._parameters
 
+    def _values(self):
+        return self._guid, self._connection, self._parameters
+
+    def _hash_values(self):
+        return self._guid, self._connection
+
 
 class Status(enum.Enum):
     ACTIVE = 0
@@ -156,7 +186,9 @@ class Status(enum.Enum):
 #
 
 
-class Mount(object):
+class Mount(ValueObject):
+    __slots__ = ('_remote_environment', '_mount_path', '_shared_path')
+
     def __init__(self, remote_environment, mount_path, shared_path=None):
         if not isinstance(remote_environment, RemoteEnvironment):
             raise IncorrectTypeError(
@@ -191,8 +223,13 @@ class Mount(object):
         """str: The subset of the ZFS filesystem to mount on the mount_path."""
         return self._shared_path
 
+    def _values(self):
+        return self._remote_environment, self._mount_path, self._shared_path
+
+
+class OwnershipSpecification(ValueObject):
+    __slots__ = ('_uid', '_gid')
 
-class OwnershipSpecification(object):
     def __init__(self, uid, gid):
         if not isinstance(uid, int):
             raise IncorrectTypeError(
@@ -213,8 +250,13 @@ class OwnershipSpecification(object):
         """int: The group id for this OwnershipSpecification."""
         return self._gid
 
+    def _values(self):
+        return self._uid, self._gid
+
+
+class MountSpecification(ValueObject):
+    __slots__ = ('_mounts', '_ownership_specification')
 
-class MountSpecification(object):
     def __init__(self, mounts, ownership_specification=None):
         if not isinstance(mounts, list):
             raise IncorrectTypeError(
@@ -249,3 +291,9 @@ class MountSpecification(object):
         MountSpecification.
         """
         return self._ownership_specification
+
+    def _values(self):
+        return self._mounts, self._ownership_specification
+
+    def _hash_values(self):
+        return tuple(self._mounts), self._ownership_specification
@@ -0,0 +1,142 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Caching of status results
+
+The engine polls linked.status() and virtual.status() frequently, and status
+implementations usually probe the source with remote commands. A plugin can
+opt into caching their results per source with the cache_ttl argument of the
+status decorators. The operations that change the state of a source (start,
+stop, configure, ...) drop the cached status of that source.
+
+A status operation may read the state of a source while a state changing
+operation runs on it in another thread. Its result is only cached if the
+source wasn't invalidated since the status operation started, so a status
+read before the change is never served after it.
+"""
+
+import collections
+import threading
+import time
+
+__all__ = ["StatusCache"]
+
+# The default maximum number of sources whose status is cached.
+DEFAULT_MAX_SIZE = 1024
+
+
+class StatusCache(object):
+    """A bounded cache of the status responses of sources, keyed by the guid
+    of the source, whose entries expire after a fixed time.
+
+    When full, the least recently used entry is dropped. The generation
+    of the cache is bumped by every invalidation, and the generation at
+    which each of the last max_size invalidated sources was invalidated is
+    kept, to reject responses read before an invalidation.
+
+    Args:
+        ttl (float): The number of seconds an entry stays valid.
+        max_size (int): The maximum number of sources to keep.
+        clock (function): Returns the current time in seconds.
+
+    Attributes:
+        hits (int): The number of lookups served from the cache.
+        misses (int): The number of lookups that found no valid entry.
+        invalidations (int): The number of entries dropped by state changes.
+    """
+
+    def __init__(self, ttl, max_size, clock=time.time):
+        if (not isinstance(ttl, (int, long, float))
+                or isinstance(ttl, bool) or ttl <= 0):
+            raise ValueError(
+                'The status cache TTL must be a positive number of seconds.'
+                ' Found {}'.format(ttl))
+        if (not isinstance(max_size, (int, long))
+                or isinstance(max_size, bool) or max_size < 1):
+            raise ValueError(
+                'The status cache size must be a positive integer.'
+                ' Found {}'.format(max_size))
+        self._ttl = ttl
+        self._max_size = max_size
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        self._generation = 0
+        self._invalidated = collections.OrderedDict()
+        # The latest generation at which a source no longer in _invalidated
+        # may have been invalidated.
+        self._forgotten = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def ttl(self):
+        return self._ttl
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, guid):
+        """Returns the cached response for a source, or None if there is none
+        or it has expired.
+        """
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.pop(guid, None)
+            if entry is None or entry[0] <= now:
+                self.misses += 1
+                return None
+            # Re-insert to mark the entry as the most recently used.
+            self._entries[guid] = entry
+            self.hits += 1
+            return entry[1]
+
+    def generation(self):
+        """Returns the current generation, to pass to put along with a
+        response read from now on.
+        """
+        return self._generation
+
+    def put(self, guid, response, generation=None):
+        """Caches the response for a source for the next ttl seconds.
+
+        If generation is given, the response isn't cached if the source was
+        invalidated since that generation.
+        """
+        expires = self._clock() + self._ttl
+        with self._lock:
+            if generation is not None and generation < self._invalidated.get(
+                    guid, self._forgotten):
+                return
+            self._entries.pop(guid, None)
+            self._entries[guid] = (expires, response)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, guid):
+        """Drops the cached response for a source, if any, and any response
+        for it read before now.
+        """
+        with self._lock:
+            self._generation += 1
+            self._invalidated.pop(guid, None)
+            self._invalidated[guid] = self._generation
+            while len(self._invalidated) > self._max_size:
+                _, forgotten = self._invalidated.popitem(last=False)
+                self._forgotten = max(self._forgotten, forgotten)
+            if self._entries.pop(guid, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """Drops all entries and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
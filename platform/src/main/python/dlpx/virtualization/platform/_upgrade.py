@@ -0,0 +1,126 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Batched upgrade of plugin defined objects
+
+When a new version of a plugin is installed, the linked sources, virtual
+sources, source configs and snapshots created by older versions have to be
+migrated to the new version's schemas. A plugin defines migrations with the
+decorators of UpgradeOperations, each under a migration id such as '1.1' or
+'2019.10.20'. Migrations take the parameters of an object as a dict and return
+the upgraded dict. They work on dicts rather than generated classes as the
+objects don't match the plugin's current schemas until they are upgraded.
+
+The engine sends many objects per UpgradeRequest, along with the migration ids
+to apply. For each type of object, upgrade() decodes every object once, runs
+each applicable migration over the whole batch in migration id order, and
+encodes every object once.
+"""
+
+import re
+
+from dlpx.virtualization import platform_pb2
+from dlpx.virtualization.platform.exceptions import IncorrectReturnTypeError
+from dlpx.virtualization.platform.operation import UpgradeOperation
+
+__all__ = [
+    "migration_key",
+    "upgrade"]
+
+_MIGRATION_ID_PATTERN = re.compile(r'^\d+(\.\d+)*$')
+
+
+def migration_key(migration_id):
+    """Returns the key migration ids are sorted by, so that '1.10' comes after
+    '1.9'. Raises ValueError for ids that aren't dot separated numbers.
+    """
+    if (not isinstance(migration_id, basestring)
+            or not _MIGRATION_ID_PATTERN.match(migration_id)):
+        raise ValueError(
+            "A migration id must be a string of dot separated numbers such as"
+            " '1.2.0'. Found {!r}".format(migration_id))
+    return tuple(int(part) for part in migration_id.split('.'))
+
+
+class _ObjectType(object):
+    """Where the objects migrated by one UpgradeOperation are found in an
+    UpgradeRequest and stored in an UpgradeResult.
+
+    Args:
+        operation (UpgradeOperation): The type of migrations.
+        migrations (str): Name of the UpgradeOperations attribute holding the
+            migrations, a dict of migration id to migration function.
+        field (str): Name of the repeated field of UpgradeRequest and
+            UpgradeResult holding the objects.
+        request_field (str): Name of the object's field in its
+            Upgrade*Request.
+    """
+
+    def __init__(self, operation, migrations, field, request_field):
+        self.operation = operation
+        self.migrations = migrations
+        self.field = field
+        self.request_field = request_field
+
+
+_OBJECT_TYPES = (
+    _ObjectType(UpgradeOperation.LINKED_SOURCE, 'linked_source_migrations',
+                'linked_sources', 'linked_source'),
+    _ObjectType(UpgradeOperation.VIRTUAL_SOURCE, 'virtual_source_migrations',
+                'virtual_sources', 'virtual_source'),
+    _ObjectType(UpgradeOperation.SOURCE_CONFIG, 'source_config_migrations',
+                'source_configs', 'source_config'),
+    _ObjectType(UpgradeOperation.SNAPSHOT, 'snapshot_migrations',
+                'snapshots', 'snapshot'))
+
+
+def _migrate(operation, migrate, values):
+    migrated = []
+    for value in values:
+        value = migrate(value)
+        if not isinstance(value, dict):
+            raise IncorrectReturnTypeError(operation, type(value), dict)
+        migrated.append(value)
+    return migrated
+
+
+def upgrade(operations, request):
+    """Runs the migrations of the plugin over the objects of an
+    UpgradeRequest.
+
+    Args:
+        operations (UpgradeOperations): The object holding the migrations.
+        request (UpgradeRequest): The objects and the migration ids to apply.
+
+    Returns:
+        UpgradeResponse: The upgraded objects, in the order of the request.
+    """
+    migration_ids = sorted(set(request.migration_ids), key=migration_key)
+    codec = operations._definitions.codec
+
+    response = platform_pb2.UpgradeResponse()
+    result = response.return_value
+    for object_type in _OBJECT_TYPES:
+        objects = [getattr(item, object_type.request_field)
+                   for item in getattr(request, object_type.field)]
+        upgraded = getattr(result, object_type.field)
+
+        registered = getattr(operations, object_type.migrations)
+        migrations = [registered[migration_id]
+                      for migration_id in migration_ids
+                      if migration_id in registered]
+        if not migrations:
+            for obj in objects:
+                upgraded.add().CopyFrom(obj)
+            continue
+
+        values = [codec.loads(obj.parameters.json) for obj in objects]
+        for migrate in migrations:
+            values = _migrate(object_type.operation, migrate, values)
+
+        for obj, value in zip(objects, values):
+            upgraded_object = upgraded.add()
+            upgraded_object.CopyFrom(obj)
+            upgraded_object.parameters.json = codec.dumps(value)
+    return response
@@ -33,6 +33,33 @@ class UserError(Exception):
         super(UserError, self).__init__(message, action, output)
 
 
+class EnvironmentLimitTimeoutError(Exception):
+    """EnvironmentLimitTimeoutError gets thrown when the deadline of an
+    operation passes while it waits for other operations on its environment
+    to finish, because of the plugin's max_operations_per_environment.
+
+    Args:
+        reference (str): The reference of the environment.
+        max_operations (int): The maximum number of operations running at
+            once on one environment.
+        overdue (float): The seconds since the deadline passed.
+
+    Attributes:
+        message (str): A localized user-readable message.
+    """
+
+    @property
+    def message(self):
+        return self.args[0]
+
+    def __init__(self, reference, max_operations, overdue):
+        message = ('The deadline of the operation passed {:.1f} seconds ago,'
+                   ' while it waited for one of the {} operations running on'
+                   ' environment {} to finish.'.format(
+                       overdue, max_operations, reference))
+        super(EnvironmentLimitTimeoutError, self).__init__(message)
+
+
 class IncorrectReturnTypeError(PluginRuntimeError):
     """IncorrectReturnTypeError gets thrown when an operation that was
     implemented by the plugin author returns an object type that is incorrect.
@@ -74,6 +101,25 @@ class OperationAlreadyDefinedError(PlatformError):
         super(OperationAlreadyDefinedError, self).__init__(message)
 
 
+class MigrationIdAlreadyUsedError(PlatformError):
+    """MigrationIdAlreadyUsedError gets thrown when the plugin writer defines
+    two migrations of the same type with the same migration id.
+
+    Args:
+        operation (UpgradeOperation): The type of the migrations.
+        migration_id (str): The migration id used twice.
+
+    Attributes:
+        message (str): A localized user-readable message about which
+        migration id was used twice.
+    """
+    def __init__(self, operation, migration_id):
+        message = ("A migration for {} with the migration id '{}' has"
+                   ' already been defined.'.format(
+                       operation.value, migration_id))
+        super(MigrationIdAlreadyUsedError, self).__init__(message)
+
+
 class OperationNotDefinedError(PlatformError):
     """OperationNotDefinedError gets thrown when the plugin wrapper tries to
     call the operation but it was not defined.
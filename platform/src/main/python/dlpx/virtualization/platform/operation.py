@@ -27,3 +27,14 @@ class Operation(Enum):
     VIRTUAL_STATUS = 'virtual.status()'
     VIRTUAL_INITIALIZE = 'virtual.initialize()'
     VIRTUAL_MOUNT_SPEC = 'virtual.mount_specification()'
+
+
+@unique
+class UpgradeOperation(Enum):
+    """The migrations a plugin can define to upgrade its plugin defined
+    objects. They all run as part of one upgrade request.
+    """
+    LINKED_SOURCE = 'upgrade.linked_source()'
+    VIRTUAL_SOURCE = 'upgrade.virtual_source()'
+    SOURCE_CONFIG = 'upgrade.source_config()'
+    SNAPSHOT = 'upgrade.snapshot()'
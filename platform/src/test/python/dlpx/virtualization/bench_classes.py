@@ -0,0 +1,84 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Memory and construction benchmark of the common and platform classes.
+
+For every class passed to or returned from plugin operations, reports the
+bytes one instance takes, not counting the objects its fields refer to, and
+the time to construct one with the usual validation. The memory of an
+instance is the size of the object plus the size of its __dict__, if it has
+one.
+
+This is not part of the unit test suite. Run it from this directory with the
+platform, common and generated protobuf modules on the PYTHONPATH:
+
+  python bench_classes.py [--number N] [--repeat R]
+"""
+
+import argparse
+import sys
+import timeit
+
+from dlpx.virtualization.common import (RemoteConnection, RemoteEnvironment,
+                                        RemoteHost, RemoteUser)
+from dlpx.virtualization.platform import (DirectSource, Mount,
+                                          MountSpecification,
+                                          OwnershipSpecification,
+                                          StagedSource, VirtualSource)
+
+GUID = '8e1442c2-64ce-48cf-848c-ce4deacca579'
+
+_HOST = RemoteHost('host', 'UNIX_HOST-1', '/usr/bin', '/var/delphix/scratch')
+_ENVIRONMENT = RemoteEnvironment('environment', 'UNIX_HOST_ENVIRONMENT-1',
+                                 _HOST)
+_USER = RemoteUser('delphix', 'HOST_USER-1')
+_CONNECTION = RemoteConnection(_ENVIRONMENT, _USER)
+_MOUNT = Mount(_ENVIRONMENT, '/mnt/vdb', '/shared')
+_OWNERSHIP = OwnershipSpecification(1000, 1000)
+_PARAMETERS = object()
+
+# (class, constructor arguments)
+CASES = [
+    (RemoteHost, ('host', 'UNIX_HOST-1', '/usr/bin', '/var/delphix/scratch')),
+    (RemoteUser, ('delphix', 'HOST_USER-1')),
+    (RemoteEnvironment, ('environment', 'UNIX_HOST_ENVIRONMENT-1', _HOST)),
+    (RemoteConnection, (_ENVIRONMENT, _USER)),
+    (Mount, (_ENVIRONMENT, '/mnt/vdb', '/shared')),
+    (OwnershipSpecification, (1000, 1000)),
+    (MountSpecification, ([_MOUNT], _OWNERSHIP)),
+    (DirectSource, (GUID, _CONNECTION, _PARAMETERS)),
+    (StagedSource, (GUID, _CONNECTION, _PARAMETERS, _MOUNT, _CONNECTION)),
+    (VirtualSource, (GUID, _CONNECTION, _PARAMETERS, [_MOUNT])),
+]
+
+
+def instance_bytes(instance):
+    """Returns the bytes taken by an instance and its __dict__, if any."""
+    size = sys.getsizeof(instance)
+    if hasattr(instance, '__dict__'):
+        size += sys.getsizeof(instance.__dict__)
+    return size
+
+
+def time_construct(cls, args, number, repeat):
+    """Returns the best time, in microseconds, to construct one instance."""
+    timer = timeit.Timer(lambda: cls(*args))
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print('{:<24} {:>8} {:>12}'.format('class', 'bytes', 'usec/new'))
+    for cls, cls_args in CASES:
+        print('{:<24} {:>8} {:>12.2f}'.format(
+            cls.__name__, instance_bytes(cls(*cls_args)),
+            time_construct(cls, cls_args, args.number, args.repeat)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Microbenchmark of the JSON codecs for plugin defined objects.
+
+Every codec importable in this environment (see _codec.available_codecs) is
+timed decoding and encoding payloads shaped like the plugin defined objects
+the engine exchanges with plugins: small repositories and source configs, and
+snapshots carrying file lists and per-file metadata of growing size.
+
+This is not part of the unit test suite. Run it from this directory with the
+platform, common and generated protobuf modules on the PYTHONPATH:
+
+  python bench_codec.py [--number N] [--repeat R]
+"""
+
+import argparse
+import sys
+import timeit
+
+from dlpx.virtualization.platform import _codec
+
+
+def _repository():
+    return {
+        'name': 'PostgreSQL 9.6 (/usr/pgsql-9.6)',
+        'version': '9.6.11',
+        'installPath': '/usr/pgsql-9.6',
+        'bits': 64,
+    }
+
+
+def _source_config():
+    return {
+        'name': 'orders',
+        'dataDirectory': '/var/lib/pgsql/9.6/data',
+        'port': 5432,
+        'user': 'postgres',
+        'ssl': False,
+        'settings': {
+            'max_connections': 100,
+            'shared_buffers': '128MB',
+            'archive_command': 'cp %p /archive/%f',
+        },
+    }
+
+
+def _snapshot(file_count):
+    return {
+        'timestamp': '2019-05-02T17:45:11.402Z',
+        'lsn': 98765432101,
+        'timeline': 3,
+        'ratio': 0.8125,
+        'consistent': True,
+        'archiveDirectory': None,
+        'files': [{
+            'path': u'/var/lib/pgsql/9.6/data/base/16384/{}'.format(i),
+            'size': 8192 * (i + 1),
+            'checksum': '{:040x}'.format(i * 2654435761),
+            'tablespace': u'pg_default',
+            'compressed': i % 2 == 0,
+            'tags': ['relation', 'main'],
+        } for i in range(file_count)],
+    }
+
+
+# (label, payload)
+SHAPES = [
+    ('repository', _repository()),
+    ('source config', _source_config()),
+    ('snapshot, 10 files', _snapshot(10)),
+    ('snapshot, 1000 files', _snapshot(1000)),
+    ('snapshot, 20000 files', _snapshot(20000)),
+]
+
+
+def time_call(func, argument, number, repeat):
+    """Returns the best observed time per call in microseconds."""
+    timer = timeit.Timer(lambda: func(argument))
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    codecs = _codec.available_codecs()
+    print('default codec: {}'.format(_codec.default_codec().name))
+    header = '{:<24} {:>8} {:>10}'.format('payload', 'bytes', 'op')
+    for codec in codecs:
+        header += ' {:>12}'.format(codec.name)
+    print(header + '  (usec/call)')
+
+    for label, payload in SHAPES:
+        encoded = _codec.STDLIB_CODEC.dumps(payload)
+        # Keep the number of calls per run roughly constant in bytes.
+        number = max(1, args.number * 1000 // max(len(encoded), 1000))
+        for op in ('loads', 'dumps'):
+            argument = encoded if op == 'loads' else payload
+            row = '{:<24} {:>8} {:>10}'.format(label, len(encoded), op)
+            for codec in codecs:
+                usec = time_call(
+                    getattr(codec, op), argument, number, args.repeat)
+                row += ' {:>12.2f}'.format(usec)
+            print(row)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,300 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Microbenchmark for the fixed per-call cost of the plugin operation wrappers.
+
+Every wrapper in dlpx.virtualization.platform._plugin is invoked with a fully
+populated request and a trivial implementation, so the reported time is the
+overhead the platform adds around the plugin author's code: decoding the
+request, building the plugin classes, validating the return value and building
+the response.
+
+With --serialized, every request is serialized up front and run through
+Plugin.invoke instead, as a runtime holding requests as bytes would, so the
+time also includes parsing the request and serializing the response.
+
+With --mounts, virtual sources have that many mounts spread over four
+environments, as a sharded database would, and virtual.mount_specification()
+returns one mount for each of them.
+
+This is not part of the unit test suite. Run it from this directory with the
+platform, common and generated protobuf modules on the PYTHONPATH:
+
+  python bench_dispatch.py [--number N] [--repeat R]
+                           [--definition-cache-size SIZE]
+                           [--lazy-definitions] [--serialized]
+                           [--mounts MOUNTS]
+"""
+
+import argparse
+import sys
+import timeit
+
+from mock import MagicMock, patch
+
+import fake_generated_definitions
+from fake_generated_definitions import (RepositoryDefinition,
+                                        SnapshotDefinition,
+                                        SourceConfigDefinition)
+
+from dlpx.virtualization import common_pb2
+from dlpx.virtualization import platform_pb2
+
+GUID = '8e1442c2-64ce-48cf-848c-ce4deacca579'
+SIMPLE_JSON = '{{"name": "{0}"}}'
+# The number of environments the mounts of a virtual source are spread over.
+MOUNT_ENVIRONMENTS = 4
+
+
+def _connection():
+    connection = common_pb2.RemoteConnection()
+    connection.environment.name = 'TestEnvironment'
+    connection.environment.reference = 'UNIX_HOST_ENVIRONMENT-1'
+    connection.environment.host.name = 'TestHost'
+    connection.environment.host.reference = 'UNIX_HOST-1'
+    connection.environment.host.binary_path = '/binary/path'
+    connection.environment.host.scratch_path = '/scratch/path'
+    connection.user.name = 'TestUser'
+    connection.user.reference = 'HOST_USER-1'
+    return connection
+
+
+def _fill_virtual_source(virtual_source, mount_count=1):
+    virtual_source.guid = GUID
+    virtual_source.connection.CopyFrom(_connection())
+    virtual_source.parameters.json = SIMPLE_JSON.format('VirtualSource')
+    for i in range(mount_count):
+        mount = virtual_source.mounts.add()
+        mount.remote_environment.CopyFrom(_connection().environment)
+        mount.remote_environment.reference += '-{}'.format(
+            i % MOUNT_ENVIRONMENTS)
+        mount.mount_path = '/mnt/path/{}'.format(i)
+        mount.shared_path = '/shared/path'
+
+
+def _fill_staged_source(staged_source):
+    staged_source.linked_source.guid = GUID
+    staged_source.linked_source.parameters.json = SIMPLE_JSON.format(
+        'StagedSource')
+    staged_source.source_connection.CopyFrom(_connection())
+    staged_source.staged_connection.CopyFrom(_connection())
+    staged_source.staged_mount.remote_environment.CopyFrom(
+        _connection().environment)
+    staged_source.staged_mount.mount_path = '/mnt/path'
+
+
+def _fill_direct_source(direct_source):
+    direct_source.linked_source.guid = GUID
+    direct_source.linked_source.parameters.json = SIMPLE_JSON.format(
+        'DirectSource')
+    direct_source.connection.CopyFrom(_connection())
+
+
+def _fill_common(request, mount_count=1):
+    fields = request.DESCRIPTOR.fields_by_name
+    if 'repository' in fields:
+        request.repository.parameters.json = SIMPLE_JSON.format('Repository')
+    if 'source_config' in fields:
+        request.source_config.parameters.json = SIMPLE_JSON.format(
+            'SourceConfig')
+    if 'snapshot' in fields:
+        request.snapshot.parameters.json = SIMPLE_JSON.format('Snapshot')
+    if 'snapshot_parameters' in fields:
+        request.snapshot_parameters.parameters.json = '{"resync": false}'
+    if 'virtual_source' in fields:
+        _fill_virtual_source(request.virtual_source, mount_count)
+    if 'staged_source' in fields:
+        _fill_staged_source(request.staged_source)
+    if 'direct_source' in fields:
+        _fill_direct_source(request.direct_source)
+    if 'source_connection' in fields:
+        request.source_connection.CopyFrom(_connection())
+    return request
+
+
+def build_plugin(**plugin_kwargs):
+    """Returns a Plugin with a trivial implementation for every operation."""
+    from dlpx.virtualization.platform import (Mount, MountSpecification,
+                                              OwnershipSpecification, Plugin,
+                                              Status)
+    plugin = Plugin(**plugin_kwargs)
+
+    def none_impl(**kwargs):
+        return None
+
+    def status_impl(**kwargs):
+        return Status.ACTIVE
+
+    def snapshot_impl(**kwargs):
+        return SnapshotDefinition('Snapshot')
+
+    def source_config_impl(**kwargs):
+        return SourceConfigDefinition('SourceConfig')
+
+    def staged_mount_spec_impl(staged_source, repository):
+        return MountSpecification(
+            [Mount(staged_source.staged_connection.environment, '/mnt')],
+            OwnershipSpecification(1, 2))
+
+    def virtual_mount_spec_impl(virtual_source, repository):
+        return MountSpecification(
+            [Mount(mount.remote_environment, mount.mount_path)
+             for mount in virtual_source.mounts],
+            OwnershipSpecification(1, 2))
+
+    plugin.discovery.repository()(
+        lambda source_connection: [RepositoryDefinition('Repository')])
+    plugin.discovery.source_config()(
+        lambda source_connection, repository: [
+            SourceConfigDefinition('SourceConfig')])
+
+    plugin.linked.pre_snapshot()(none_impl)
+    plugin.linked.post_snapshot()(snapshot_impl)
+    plugin.linked.start_staging()(none_impl)
+    plugin.linked.stop_staging()(none_impl)
+    plugin.linked.status()(status_impl)
+    plugin.linked.worker()(none_impl)
+    plugin.linked.mount_specification()(staged_mount_spec_impl)
+
+    plugin.virtual.configure()(source_config_impl)
+    plugin.virtual.unconfigure()(none_impl)
+    plugin.virtual.reconfigure()(source_config_impl)
+    plugin.virtual.start()(none_impl)
+    plugin.virtual.stop()(none_impl)
+    plugin.virtual.pre_snapshot()(none_impl)
+    plugin.virtual.post_snapshot()(snapshot_impl)
+    plugin.virtual.status()(status_impl)
+    plugin.virtual.initialize()(none_impl)
+    plugin.virtual.mount_specification()(virtual_mount_spec_impl)
+    return plugin
+
+
+# (label, operations attribute, wrapper name, request class)
+CASES = [
+    ('discovery.repository()', 'discovery', '_internal_repository',
+     platform_pb2.RepositoryDiscoveryRequest),
+    ('discovery.source_config()', 'discovery', '_internal_source_config',
+     platform_pb2.SourceConfigDiscoveryRequest),
+    ('linked.pre_snapshot() [direct]', 'linked',
+     '_internal_direct_pre_snapshot', platform_pb2.DirectPreSnapshotRequest),
+    ('linked.post_snapshot() [direct]', 'linked',
+     '_internal_direct_post_snapshot', platform_pb2.DirectPostSnapshotRequest),
+    ('linked.pre_snapshot() [staged]', 'linked',
+     '_internal_staged_pre_snapshot', platform_pb2.StagedPreSnapshotRequest),
+    ('linked.post_snapshot() [staged]', 'linked',
+     '_internal_staged_post_snapshot', platform_pb2.StagedPostSnapshotRequest),
+    ('linked.start_staging()', 'linked', '_internal_start_staging',
+     platform_pb2.StartStagingRequest),
+    ('linked.stop_staging()', 'linked', '_internal_stop_staging',
+     platform_pb2.StopStagingRequest),
+    ('linked.status()', 'linked', '_internal_status',
+     platform_pb2.StagedStatusRequest),
+    ('linked.worker()', 'linked', '_internal_worker',
+     platform_pb2.StagedWorkerRequest),
+    ('linked.mount_specification()', 'linked',
+     '_internal_mount_specification', platform_pb2.StagedMountSpecRequest),
+    ('virtual.configure()', 'virtual', '_internal_configure',
+     platform_pb2.ConfigureRequest),
+    ('virtual.unconfigure()', 'virtual', '_internal_unconfigure',
+     platform_pb2.UnconfigureRequest),
+    ('virtual.reconfigure()', 'virtual', '_internal_reconfigure',
+     platform_pb2.ReconfigureRequest),
+    ('virtual.start()', 'virtual', '_internal_start',
+     platform_pb2.StartRequest),
+    ('virtual.stop()', 'virtual', '_internal_stop', platform_pb2.StopRequest),
+    ('virtual.pre_snapshot()', 'virtual', '_internal_pre_snapshot',
+     platform_pb2.VirtualPreSnapshotRequest),
+    ('virtual.post_snapshot()', 'virtual', '_internal_post_snapshot',
+     platform_pb2.VirtualPostSnapshotRequest),
+    ('virtual.status()', 'virtual', '_internal_status',
+     platform_pb2.VirtualStatusRequest),
+    ('virtual.initialize()', 'virtual', '_internal_initialize',
+     platform_pb2.InitializeRequest),
+    ('virtual.mount_specification()', 'virtual',
+     '_internal_mount_specification', platform_pb2.VirtualMountSpecRequest),
+]
+
+
+def _invoker(plugin, operations, wrapper):
+    operation_name = '{}.{}'.format(operations, wrapper[len('_internal_'):])
+    return lambda request_bytes: plugin.invoke(operation_name, request_bytes)
+
+
+def build_calls(plugin, serialized=False, mount_count=1):
+    """Returns a list of (label, wrapper, request) for every CASES entry.
+
+    If serialized is set, the requests are serialized and the wrappers are
+    called through plugin.invoke.
+    """
+    calls = []
+    for label, operations, wrapper, request_class in CASES:
+        request = _fill_common(request_class(), mount_count)
+        if serialized:
+            calls.append((label, _invoker(plugin, operations, wrapper),
+                          request.SerializeToString()))
+        else:
+            calls.append((label,
+                          getattr(getattr(plugin, operations), wrapper),
+                          request))
+    return calls
+
+
+def time_call(func, request, number, repeat):
+    """Returns the best observed time per call in microseconds."""
+    timer = timeit.Timer(lambda: func(request))
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def time_overhead(func, baseline, number, repeat):
+    """Returns the best observed time in microseconds of a call to func, less
+    that of a call to baseline.
+    """
+    func_timer = timeit.Timer(func)
+    baseline_timer = timeit.Timer(baseline)
+    func_time = baseline_time = float('inf')
+    # Alternated, so that both see the same changes in machine load.
+    for _ in range(repeat):
+        func_time = min(func_time, func_timer.timeit(number))
+        baseline_time = min(baseline_time, baseline_timer.timeit(number))
+    return max(func_time - baseline_time, 0.0) / number * 1e6
+
+
+def patched_definitions():
+    mock_module = MagicMock()
+    mock_module.definitions = fake_generated_definitions
+    return patch.dict('sys.modules', {
+        'generated': mock_module,
+        'generated.definitions': fake_generated_definitions})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--definition-cache-size', type=int, default=0)
+    parser.add_argument('--lazy-definitions', action='store_true')
+    parser.add_argument('--serialized', action='store_true')
+    parser.add_argument('--mounts', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    plugin_kwargs = {}
+    if args.definition_cache_size:
+        plugin_kwargs['definition_cache_size'] = args.definition_cache_size
+    if args.lazy_definitions:
+        plugin_kwargs['lazy_definitions'] = True
+
+    with patched_definitions():
+        plugin = build_plugin(**plugin_kwargs)
+        total = 0.0
+        print('{:<36} {:>12}'.format('operation', 'usec/call'))
+        for label, wrapper, request in build_calls(plugin, args.serialized,
+                                                 args.mounts):
+            usec = time_call(wrapper, request, args.number, args.repeat)
+            total += usec
+            print('{:<36} {:>12.2f}'.format(label, usec))
+        print('{:<36} {:>12.2f}'.format('mean', total / len(CASES)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
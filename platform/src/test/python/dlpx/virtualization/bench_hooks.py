@@ -0,0 +1,103 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Microbenchmark of the overhead of operation hooks.
+
+Every platform wrapper (see bench_dispatch) is timed with no hooks, which is
+the default, with a before hook doing nothing, and with an around hook that
+only calls proceed, both registered for every operation.
+
+The cost of hooks when none are registered is measured on the real dispatch:
+for every wrapper, _dispatch.dispatch() is timed against
+_dispatch._dispatch_hooked(), the layer below the hooks, with the same
+request. The difference also includes the check for operation timeouts, so
+it is an upper bound of what hooks add to a plugin that doesn't use them.
+
+This is not part of the unit test suite. Run it from this directory with the
+platform, common and generated protobuf modules on the PYTHONPATH:
+
+  python bench_hooks.py [--number N] [--repeat R]
+"""
+
+import argparse
+import sys
+
+from dlpx.virtualization.platform import _dispatch
+
+from bench_dispatch import (CASES, build_calls, build_plugin,
+                            patched_definitions, time_call, time_overhead)
+
+
+def _spec(operations, wrapper):
+    """Returns the OperationSpec of a wrapper of an operations object."""
+    for specs in _dispatch.OPERATIONS.values():
+        for spec in specs:
+            if (spec.wrapper == wrapper
+                    and spec.operation.value.startswith(operations + '.')):
+                return spec
+    raise ValueError('No spec for {}.{}'.format(operations, wrapper))
+
+
+def time_no_hooks(plugin, request_calls, number, repeat):
+    """Returns the extra time in microseconds dispatch() takes over the layer
+    below the hooks, for each wrapper, with no hooks registered.
+    """
+    usecs = []
+    for (_, operations, wrapper, _), (_, _, request) in zip(
+            CASES, request_calls):
+        operations_object = getattr(plugin, operations)
+        spec = _spec(operations, wrapper)
+        usecs.append(time_overhead(
+            lambda: _dispatch.dispatch(operations_object, spec, request),
+            lambda: _dispatch._dispatch_hooked(
+                operations_object, spec, request),
+            number, repeat))
+    return usecs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with patched_definitions():
+        plugin = build_plugin()
+        plain_calls = build_calls(plugin)
+
+        before_plugin = build_plugin()
+        before_plugin.hooks.before()(lambda operation, request: None)
+        before_calls = build_calls(before_plugin)
+
+        around_plugin = build_plugin()
+        around_plugin.hooks.around()(
+            lambda operation, request, proceed: proceed(request))
+        around_calls = build_calls(around_plugin)
+
+        no_hooks_usecs = time_no_hooks(
+            plugin, plain_calls, args.number, args.repeat)
+
+        totals = [0.0, 0.0, 0.0, 0.0]
+        print('{:<36} {:>12} {:>12} {:>12} {:>12}'.format(
+            'operation', 'no hooks', 'before', 'around', 'no hooks +'))
+        for calls, no_hooks_usec in zip(
+                zip(plain_calls, before_calls, around_calls), no_hooks_usecs):
+            label, _, request = calls[0]
+            usecs = [time_call(func, request, args.number, args.repeat)
+                     for _, func, _ in calls] + [no_hooks_usec]
+            totals = [total + usec for total, usec in zip(totals, usecs)]
+            print('{:<36} {:>12.2f} {:>12.2f} {:>12.2f} {:>12.3f}'.format(
+                label, *usecs))
+
+        means = [total / len(CASES) for total in totals]
+        print('{:<36} {:>12.2f} {:>12.2f} {:>12.2f} {:>12.3f}'
+              '  (usec/call)'.format('mean', *means))
+        print('')
+        print('dispatch() over the layer below hooks, without hooks: {:.3f}'
+              ' usec/call, {:.2f}% of the mean call'.format(
+                  means[3], means[3] / means[0] * 100))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Microbenchmark of the overhead of operation latency metrics.
+
+Every platform wrapper (see bench_dispatch) is timed with metrics disabled,
+which is the default, and enabled. With metrics disabled, the only code run
+on top of the uninstrumented dispatch is a single check of whether metrics are
+enabled; its cost is timed on its own and reported as a share of the mean
+per-call time.
+
+This is not part of the unit test suite. Run it from this directory with the
+platform, common and generated protobuf modules on the PYTHONPATH:
+
+  python bench_metrics.py [--number N] [--repeat R]
+"""
+
+import argparse
+import sys
+
+from bench_dispatch import (CASES, build_calls, build_plugin,
+                            patched_definitions, time_call, time_overhead)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with patched_definitions():
+        plugin = build_plugin()
+        disabled_calls = build_calls(plugin)
+        enabled_plugin = build_plugin()
+        metrics = enabled_plugin.enable_metrics()
+        enabled_calls = build_calls(enabled_plugin)
+
+        disabled_total = enabled_total = 0.0
+        print('{:<36} {:>12} {:>12}'.format(
+            'operation', 'disabled', 'enabled'))
+        for (label, disabled, request), (_, enabled, _) in zip(
+                disabled_calls, enabled_calls):
+            disabled_usec = time_call(
+                disabled, request, args.number, args.repeat)
+            enabled_usec = time_call(
+                enabled, request, args.number, args.repeat)
+            disabled_total += disabled_usec
+            enabled_total += enabled_usec
+            print('{:<36} {:>12.2f} {:>12.2f}'.format(
+                label, disabled_usec, enabled_usec))
+
+        disabled_mean = disabled_total / len(CASES)
+        enabled_mean = enabled_total / len(CASES)
+        print('{:<36} {:>12.2f} {:>12.2f}  (usec/call)'.format(
+            'mean', disabled_mean, enabled_mean))
+
+        operations = plugin.virtual
+        check_usec = time_overhead(
+            lambda: operations._metrics is not None, lambda: None,
+            args.number * 100, args.repeat)
+        print('')
+        print('cost of the disabled check: {:.4f} usec/call, {:.3f}% of the'
+              ' mean disabled call'.format(
+                  check_usec, check_usec / disabled_mean * 100))
+        print('')
+        print(metrics.format())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
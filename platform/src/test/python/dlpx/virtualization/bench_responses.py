@@ -0,0 +1,214 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Benchmark of building the protobuf fields of responses and requests.
+
+Each case packs the same value into the same message two ways: the way the
+wrappers used to, by building temporary messages and copying them in with
+CopyFrom, and the way they do now, by filling the fields of the message in
+place. Connections and environments are copied in from the message they
+cache on their first conversion. For each case it reports the protobuf
+messages constructed and the time per operation.
+
+Messages are counted by replacing the message classes of common_pb2 and
+platform_pb2 with counting wrappers while the case runs, so only messages
+built by name are counted, not the fields of an existing message.
+
+This is not part of the unit test suite. Run it from this directory with the
+platform, common and generated protobuf modules on the PYTHONPATH:
+
+  python bench_responses.py [--number N] [--repeat R]
+"""
+
+import argparse
+import contextlib
+import sys
+import timeit
+
+from dlpx.virtualization import common_pb2, platform_pb2
+from dlpx.virtualization.common import (RemoteConnection, RemoteEnvironment,
+                                        RemoteHost, RemoteUser)
+from dlpx.virtualization.platform import (Mount, MountSpecification,
+                                          OwnershipSpecification)
+from dlpx.virtualization.platform import _dispatch
+from dlpx.virtualization.platform.operation import Operation as Op
+
+_HOST = RemoteHost('host', 'UNIX_HOST-1', '/usr/bin', '/var/delphix/scratch')
+_ENVIRONMENT = RemoteEnvironment('environment', 'UNIX_HOST_ENVIRONMENT-1',
+                                 _HOST)
+_CONNECTION = RemoteConnection(_ENVIRONMENT,
+                               RemoteUser('delphix', 'HOST_USER-1'))
+
+
+#
+# The previous implementations, building temporary messages.
+#
+
+def _copied_host(host):
+    remote_host = common_pb2.RemoteHost()
+    remote_host.name = host.name
+    remote_host.reference = host.reference
+    remote_host.binary_path = host.binary_path
+    remote_host.scratch_path = host.scratch_path
+    return remote_host
+
+
+def _copied_environment(environment):
+    remote_environment = common_pb2.RemoteEnvironment()
+    remote_environment.name = environment.name
+    remote_environment.reference = environment.reference
+    remote_environment.host.CopyFrom(_copied_host(environment.host))
+    return remote_environment
+
+
+def _copied_connection(connection):
+    remote_connection = common_pb2.RemoteConnection()
+    remote_connection.environment.CopyFrom(
+        _copied_environment(connection.environment))
+    remote_user = common_pb2.RemoteUser()
+    remote_user.name = connection.user.name
+    remote_user.reference = connection.user.reference
+    remote_connection.user.CopyFrom(remote_user)
+    return remote_connection
+
+
+def _copied_staged_mount_spec(response, result):
+    mount = result.mounts[0]
+    staged_mount = response.return_value.staged_mount
+    staged_mount.mount_path = mount.mount_path
+    staged_mount.remote_environment.CopyFrom(
+        _copied_environment(mount.remote_environment))
+    response.return_value.ownership_spec.uid = (
+        result.ownership_specification.uid)
+    response.return_value.ownership_spec.gid = (
+        result.ownership_specification.gid)
+
+
+def _copied_virtual_mount_spec(response, result):
+    response.return_value.ownership_spec.uid = (
+        result.ownership_specification.uid)
+    response.return_value.ownership_spec.gid = (
+        result.ownership_specification.gid)
+    for mount in result.mounts:
+        single_mount_protobuf = response.return_value.mounts.add()
+        single_mount_protobuf.remote_environment.CopyFrom(
+            _copied_environment(mount.remote_environment))
+        single_mount_protobuf.mount_path = mount.mount_path
+
+
+def _staged_mount_spec():
+    return MountSpecification([Mount(_ENVIRONMENT, '/mnt/staging')],
+                              OwnershipSpecification(1000, 1000))
+
+
+def _virtual_mount_spec():
+    return MountSpecification(
+        [Mount(_ENVIRONMENT, '/mnt/vdb/{}'.format(i)) for i in range(3)],
+        OwnershipSpecification(1000, 1000))
+
+
+def build_cases():
+    """Returns (name, response type, copying encode, in place encode)."""
+    staged = _staged_mount_spec()
+    virtual = _virtual_mount_spec()
+    staged_handler = _dispatch._StagedMountSpecResult()
+    virtual_handler = _dispatch._VirtualMountSpecResult()
+    empty_handler = _dispatch._EmptyResult()
+
+    return [
+        ('virtual.start()', platform_pb2.StartResponse,
+         lambda response: response.return_value.CopyFrom(
+             platform_pb2.StartResult()),
+         lambda response: empty_handler.encode(
+             Op.VIRTUAL_START, response, None, None)),
+        ('linked.mount_specification()',
+         platform_pb2.StagedMountSpecResponse,
+         lambda response: _copied_staged_mount_spec(response, staged),
+         lambda response: staged_handler.encode(
+             Op.LINKED_MOUNT_SPEC, response, staged, None)),
+        ('virtual.mount_specification()',
+         platform_pb2.VirtualMountSpecResponse,
+         lambda response: _copied_virtual_mount_spec(response, virtual),
+         lambda response: virtual_handler.encode(
+             Op.VIRTUAL_MOUNT_SPEC, response, virtual, None)),
+        ('RemoteConnection.to_proto()',
+         platform_pb2.RepositoryDiscoveryRequest,
+         lambda request: request.source_connection.CopyFrom(
+             _copied_connection(_CONNECTION)),
+         lambda request: _CONNECTION.to_proto(request.source_connection)),
+    ]
+
+
+def _counting(message_class, counter):
+    def construct(*args, **kwargs):
+        counter[0] += 1
+        return message_class(*args, **kwargs)
+    return construct
+
+
+@contextlib.contextmanager
+def _counting_messages(counter):
+    """Counts the messages of common_pb2 and platform_pb2 constructed by
+    name while active.
+    """
+    replaced = []
+    for module in (common_pb2, platform_pb2):
+        for name in module.DESCRIPTOR.message_types_by_name:
+            message_class = getattr(module, name)
+            setattr(module, name, _counting(message_class, counter))
+            replaced.append((module, name, message_class))
+    try:
+        yield
+    finally:
+        for module, name, message_class in replaced:
+            setattr(module, name, message_class)
+
+
+def count_messages(response_type, encode):
+    """Returns the messages built by one encode, besides the response."""
+    response = response_type()
+    counter = [0]
+    with _counting_messages(counter):
+        encode(response)
+    return counter[0]
+
+
+def time_encode(response_type, encode, number, repeat):
+    """Returns the best time, in microseconds, of one encode into a new
+    response.
+    """
+    def run():
+        encode(response_type())
+    return min(timeit.Timer(run).repeat(
+        repeat=repeat, number=number)) / number * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print('{:<32} {:>9} {:>9} {:>11} {:>11} {:>8}'.format(
+        'case', 'msgs old', 'msgs new', 'usec old', 'usec new', 'saved'))
+    for name, response_type, copying, in_place in build_cases():
+        # Both ways must produce the same message.
+        expected = response_type()
+        copying(expected)
+        actual = response_type()
+        in_place(actual)
+        assert expected == actual, name
+
+        old_time = time_encode(response_type, copying, args.number,
+                               args.repeat)
+        new_time = time_encode(response_type, in_place, args.number,
+                               args.repeat)
+        print('{:<32} {:>9} {:>9} {:>11.2f} {:>11.2f} {:>7.0f}%'.format(
+            name, count_messages(response_type, copying),
+            count_messages(response_type, in_place), old_time, new_time,
+            (1 - new_time / old_time) * 100))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+"""Throughput benchmark of upgrading plugin defined objects.
+
+A plugin with three chained snapshot migrations upgrades a fixed number of
+snapshots, sent in UpgradeRequests of growing batch sizes. A batch size of one
+is what an upgrade costs when every object is sent on its own. The reported
+throughput is in snapshots per second.
+
+This is not part of the unit test suite. Run it from this directory with the
+platform, common and generated protobuf modules on the PYTHONPATH:
+
+  python bench_upgrade.py [--snapshots N] [--repeat R]
+"""
+
+import argparse
+import json
+import sys
+import timeit
+
+from dlpx.virtualization import platform_pb2
+from dlpx.virtualization.platform import Plugin
+
+BATCH_SIZES = [1, 10, 100, 1000, 10000]
+
+
+def _snapshot(index):
+    return {
+        'timestamp': '2019-05-02T17:45:11.402Z',
+        'lsn': 98765432101 + index,
+        'timeline': 3,
+        'files': ['/var/lib/pgsql/9.6/data/base/16384/{}'.format(i)
+                  for i in range(5)],
+    }
+
+
+def build_plugin():
+    """Returns a Plugin with three snapshot migrations."""
+    plugin = Plugin()
+
+    @plugin.upgrade.snapshot('1.1')
+    def rename_lsn(snapshot):
+        snapshot['logSequenceNumber'] = snapshot.pop('lsn')
+        return snapshot
+
+    @plugin.upgrade.snapshot('1.2')
+    def add_file_count(snapshot):
+        snapshot['fileCount'] = len(snapshot['files'])
+        return snapshot
+
+    @plugin.upgrade.snapshot('2.0')
+    def nest_timeline(snapshot):
+        snapshot['position'] = {
+            'timeline': snapshot.pop('timeline'),
+            'logSequenceNumber': snapshot.pop('logSequenceNumber')}
+        return snapshot
+
+    return plugin
+
+
+def build_requests(snapshot_count, batch_size):
+    payloads = [json.dumps(_snapshot(i)) for i in range(snapshot_count)]
+    requests = []
+    for start in range(0, snapshot_count, batch_size):
+        request = platform_pb2.UpgradeRequest()
+        request.migration_ids.extend(['1.1', '1.2', '2.0'])
+        for payload in payloads[start:start + batch_size]:
+            request.snapshots.add().snapshot.parameters.json = payload
+        requests.append(request)
+    return requests
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--snapshots', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    plugin = build_plugin()
+    print('{:>10} {:>10} {:>16}'.format('batch', 'seconds', 'snapshots/sec'))
+    for batch_size in BATCH_SIZES:
+        if batch_size > args.snapshots:
+            break
+        requests = build_requests(args.snapshots, batch_size)
+
+        def upgrade_all():
+            for request in requests:
+                plugin.upgrade._internal_upgrade(request)
+
+        seconds = min(timeit.Timer(upgrade_all).repeat(
+            repeat=args.repeat, number=1))
+        print('{:>10} {:>10.3f} {:>16.0f}'.format(
+            batch_size, seconds, args.snapshots / seconds))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+import json
+import sys
+
+import pytest
+from dlpx.virtualization.platform import _codec
+from dlpx.virtualization.platform._codec import STDLIB_CODEC
+from dlpx.virtualization.platform._definitions import PluginDefinitions
+
+from mock import patch
+from fake_generated_definitions import SnapshotDefinition
+
+# Values shaped like the output of to_dict() on generated models, covering
+# every JSON type and the string and number edge cases of the encoders.
+PAYLOADS = [
+    {},
+    [],
+    {'name': 'TestRepository'},
+    {'resync': False},
+    {'empty': None, 'enabled': True, 'disabled': False},
+    {'port': 5432, 'negative': -1, 'zero': 0, 'big': 2 ** 64 + 1,
+     'long': long(7)},
+    {'ratio': 0.1, 'tiny': 1e-20, 'huge': 1e16, 'whole': 3.0,
+     'negative': -2.5, 'precise': 1.0000000000000002},
+    {'unicode': u'caf\xe9 \u65e5\u672c \U0001f600',
+     'utf8 bytes': 'caf\xc3\xa9',
+     'escapes': '"quoted" back\\slash /slash\n\r\t\b\f',
+     'control': '\x00\x01\x1f\x7f',
+     'separators': u'\u2028\u2029',
+     'html': '</script><!-- & -->'},
+    {u'unicod\xe9 key': 1, '': 'empty key', '1': 'numeric key'},
+    {'nested': {'list': [1, 'two', 3.0, None, [], {}],
+                'deeper': {'a': [{'b': [{'c': 'd'}]}]}}},
+    {'mounts': [{'path': '/mnt/{}'.format(i), 'size': i * 1024,
+                 'options': ['ro', 'noatime']} for i in range(200)]},
+    {'text': 'x' * 100000},
+]
+
+ENCODED_PAYLOADS = [json.dumps(payload) for payload in PAYLOADS] + [
+    '{"name" : "spaced" ,\n "list":[ 1 ,2 ] }',
+    '{"unicode": "caf\\u00e9 \\ud83d\\ude00", "raw": "caf\xc3\xa9"}',
+    '{"duplicate": 1, "duplicate": 2}',
+    '[1E400, -1e-400, 12345678901234567890123, 0.30000000000000004]',
+]
+
+
+def _type_mismatch(value, expected, path='payload'):
+    """Returns the path of the first value, key or item whose type differs
+    from the one in expected, or None if they all match.
+    """
+    if type(value) is not type(expected):
+        return '{}: {} instead of {}'.format(
+            path, type(value).__name__, type(expected).__name__)
+    if isinstance(value, dict):
+        keys = dict((key, key) for key in value)
+        for key in expected:
+            mismatch = (_type_mismatch(keys[key], key, path + ' key')
+                        or _type_mismatch(value[key], expected[key],
+                                          '{}[{!r}]'.format(path, key)))
+            if mismatch:
+                return mismatch
+    elif isinstance(value, list):
+        for index, (item, expected_item) in enumerate(zip(value, expected)):
+            mismatch = _type_mismatch(item, expected_item,
+                                      '{}[{}]'.format(path, index))
+            if mismatch:
+                return mismatch
+    return None
+
+
+def codec_id(codec):
+    return codec.name
+
+
+@pytest.fixture(params=_codec.available_codecs(), ids=codec_id)
+def codec(request):
+    return request.param
+
+
+class TestCodecConformance:
+    @staticmethod
+    @pytest.mark.parametrize('payload', PAYLOADS)
+    def test_dumps(codec, payload):
+        assert codec.dumps(payload) == STDLIB_CODEC.dumps(payload)
+
+    @staticmethod
+    @pytest.mark.parametrize('encoded', ENCODED_PAYLOADS)
+    def test_loads(codec, encoded):
+        assert codec.loads(encoded) == STDLIB_CODEC.loads(encoded)
+
+    @staticmethod
+    @pytest.mark.parametrize('encoded', ENCODED_PAYLOADS)
+    def test_loads_types(codec, encoded):
+        # Equal values may still differ in type, such as str and unicode.
+        assert _type_mismatch(codec.loads(encoded),
+                              STDLIB_CODEC.loads(encoded)) is None
+
+    @staticmethod
+    def test_loads_ascii_as_unicode(codec):
+        decoded = codec.loads('{"name": "ascii", "list": ["a"]}')
+        assert [type(key) for key in decoded] == [unicode, unicode]
+        assert type(decoded['name']) is unicode
+        assert type(decoded['list'][0]) is unicode
+
+    @staticmethod
+    @pytest.mark.parametrize('encoded', ENCODED_PAYLOADS)
+    def test_round_trip(codec, encoded):
+        assert (codec.dumps(codec.loads(encoded))
+                == STDLIB_CODEC.dumps(STDLIB_CODEC.loads(encoded)))
+
+    @staticmethod
+    @pytest.mark.parametrize('encoded', ['', '{', '{"a": }', "{'a': 1}",
+                                         '[1, 2,]', 'nope'])
+    def test_loads_invalid(codec, encoded):
+        with pytest.raises(ValueError):
+            codec.loads(encoded)
+
+    @staticmethod
+    def test_plugin_definitions_codec(codec):
+        definitions = PluginDefinitions(codec=codec)
+        snapshot = SnapshotDefinition(PAYLOADS[7]['unicode'])
+
+        assert definitions.codec is codec
+        assert (definitions.encode(snapshot)
+                == STDLIB_CODEC.dumps(snapshot.to_dict()))
+
+
+class TestCodecSelection:
+    @staticmethod
+    def test_stdlib_is_last():
+        assert _codec.available_codecs()[-1] is STDLIB_CODEC
+
+    @staticmethod
+    def test_default_is_fastest_available():
+        assert (_codec.default_codec().name
+                == _codec.available_codecs()[0].name)
+        assert PluginDefinitions().codec is _codec.default_codec()
+
+    @staticmethod
+    def test_falls_back_to_stdlib():
+        # A None entry in sys.modules makes the import raise ImportError.
+        with patch.dict(sys.modules, {'simplejson': None,
+                                      'simplejson._speedups': None}):
+            assert _codec.available_codecs() == [STDLIB_CODEC]
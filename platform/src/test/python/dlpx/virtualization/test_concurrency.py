@@ -0,0 +1,351 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+import threading
+import time
+
+import pytest
+from dlpx.virtualization.common._deadline import deadline_scope
+from dlpx.virtualization.platform import _dispatch
+from dlpx.virtualization.platform._concurrency import EnvironmentLimiter
+from dlpx.virtualization.platform.exceptions import (
+    EnvironmentLimitTimeoutError)
+
+from mock import MagicMock, patch
+import fake_generated_definitions
+from fake_generated_definitions import (RepositoryDefinition,
+                                        SnapshotDefinition,
+                                        SourceConfigDefinition)
+
+SIMPLE_JSON = '{"name": "name", "resync": false}'
+THREADS = 8
+
+
+def _fill(message, environment):
+    """Sets every plugin defined object in a request to SIMPLE_JSON and the
+    reference of every environment to environment, adding one element to
+    repeated fields.
+    """
+    for field in message.DESCRIPTOR.fields:
+        if field.message_type is None:
+            continue
+        if field.label == field.LABEL_REPEATED:
+            value = getattr(message, field.name).add()
+        else:
+            value = getattr(message, field.name)
+        if field.message_type.name == 'PluginDefinedObject':
+            value.json = SIMPLE_JSON
+        elif field.message_type.name == 'RemoteEnvironment':
+            value.reference = environment
+            _fill(value, environment)
+        else:
+            _fill(value, environment)
+
+
+def _requests(environment):
+    """Returns a filled request for every spec, keyed by the spec."""
+    requests = {}
+    for specs in _dispatch.OPERATIONS.values():
+        for spec in specs:
+            request = spec.request_type()
+            _fill(request, environment)
+            requests[spec] = request
+    return requests
+
+
+def _wrapper(plugin, spec):
+    operations = getattr(plugin, spec.operation.value.split('.')[0])
+    return getattr(operations, spec.wrapper)
+
+
+def _run_threads(target, count=THREADS):
+    errors = []
+
+    def run(index):
+        try:
+            target(index)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+class _ConcurrencyTracker(object):
+    """Records the most calls running at once for each environment."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = {}
+        self.max_running = {}
+
+    def __call__(self, environment, seconds=0.01):
+        with self._lock:
+            running = self._running.get(environment, 0) + 1
+            self._running[environment] = running
+            self.max_running[environment] = max(
+                running, self.max_running.get(environment, 0))
+        time.sleep(seconds)
+        with self._lock:
+            self._running[environment] -= 1
+
+
+class TestEnvironmentLimiter:
+    @staticmethod
+    @pytest.mark.parametrize('max_operations', [0, -1, 1.5, None, True])
+    def test_bad_max_operations(max_operations):
+        with pytest.raises(ValueError):
+            EnvironmentLimiter(max_operations)
+
+    @staticmethod
+    def test_limits_each_environment():
+        limiter = EnvironmentLimiter(2)
+        tracker = _ConcurrencyTracker()
+
+        def run(index):
+            environment = 'ENVIRONMENT-{}'.format(index % 2)
+            with limiter.limit(environment):
+                tracker(environment)
+
+        _run_threads(run)
+        assert tracker.max_running == {'ENVIRONMENT-0': 2, 'ENVIRONMENT-1': 2}
+        assert limiter.waits > 0
+
+    @staticmethod
+    def test_forgets_idle_environments():
+        limiter = EnvironmentLimiter(2)
+
+        def run(index):
+            with limiter.limit('ENVIRONMENT-{}'.format(index)):
+                assert len(limiter) >= 1
+
+        _run_threads(run)
+        assert len(limiter) == 0
+
+    @staticmethod
+    def test_wait_bounded_by_deadline():
+        limiter = EnvironmentLimiter(1)
+        holding = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with limiter.limit('ENVIRONMENT'):
+                holding.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        try:
+            holding.wait(5)
+            start = time.time()
+            with deadline_scope(start + 0.05):
+                with pytest.raises(EnvironmentLimitTimeoutError) as err_info:
+                    with limiter.limit('ENVIRONMENT'):
+                        pass
+            assert time.time() - start < 1
+        finally:
+            release.set()
+            thread.join()
+
+        assert 'environment ENVIRONMENT' in str(err_info.value)
+        assert (limiter.waits, limiter.timeouts) == (1, 1)
+        # Later operations on the environment are not affected.
+        with deadline_scope(time.time() + 5):
+            with limiter.limit('ENVIRONMENT'):
+                pass
+
+    @staticmethod
+    def test_wait_within_deadline():
+        limiter = EnvironmentLimiter(1)
+        holding = threading.Event()
+
+        def hold():
+            with limiter.limit('ENVIRONMENT'):
+                holding.set()
+                time.sleep(0.05)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        holding.wait(5)
+        with deadline_scope(time.time() + 5):
+            with limiter.limit('ENVIRONMENT'):
+                pass
+        thread.join()
+        assert (limiter.waits, limiter.timeouts) == (1, 0)
+
+    @staticmethod
+    def test_released_on_error():
+        limiter = EnvironmentLimiter(1)
+        with pytest.raises(RuntimeError):
+            with limiter.limit('ENVIRONMENT'):
+                raise RuntimeError()
+        with limiter.limit('ENVIRONMENT'):
+            pass
+        assert limiter.waits == 0
+
+
+class TestConcurrentPlugin:
+    @staticmethod
+    @pytest.fixture
+    def plugin_class():
+        mock_module = MagicMock()
+        mock_module.generated.definitions = fake_generated_definitions
+
+        modules = {
+            'generated': mock_module,
+            'generated.definitions': mock_module.generated.definitions
+        }
+        with patch.dict('sys.modules', modules):
+            from dlpx.virtualization.platform import Plugin
+            yield Plugin
+
+    @staticmethod
+    def register_all(plugin, hook=lambda environment: None):
+        """Registers a trivial implementation of every operation, which calls
+        hook with the reference of the environment it runs on.
+        """
+        from dlpx.virtualization.platform import (Mount, MountSpecification,
+                                                  OwnershipSpecification,
+                                                  Status)
+
+        def environment_of(kwargs):
+            if 'source_connection' in kwargs:
+                return kwargs['source_connection'].environment.reference
+            if 'staged_source' in kwargs:
+                staged_source = kwargs['staged_source']
+                return staged_source.staged_connection.environment.reference
+            source = kwargs.get('direct_source') or kwargs['virtual_source']
+            return source.connection.environment.reference
+
+        def impl(result):
+            def run(**kwargs):
+                hook(environment_of(kwargs))
+                return result(kwargs)
+            return run
+
+        none = impl(lambda kwargs: None)
+        status = impl(lambda kwargs: Status.ACTIVE)
+        snapshot = impl(lambda kwargs: SnapshotDefinition('snapshot'))
+        source_config = impl(
+            lambda kwargs: SourceConfigDefinition('source_config'))
+
+        plugin.discovery.repository()(
+            impl(lambda kwargs: [RepositoryDefinition('repository')]))
+        plugin.discovery.source_config()(
+            impl(lambda kwargs: [SourceConfigDefinition('source_config')]))
+
+        plugin.linked.pre_snapshot()(none)
+        plugin.linked.post_snapshot()(snapshot)
+        plugin.linked.start_staging()(none)
+        plugin.linked.stop_staging()(none)
+        plugin.linked.status(cache_ttl=60)(status)
+        plugin.linked.worker()(none)
+        plugin.linked.mount_specification()(impl(
+            lambda kwargs: MountSpecification([Mount(
+                kwargs['staged_source'].staged_connection.environment,
+                '/mnt')])))
+
+        plugin.virtual.configure()(source_config)
+        plugin.virtual.unconfigure()(none)
+        plugin.virtual.reconfigure()(source_config)
+        plugin.virtual.start()(none)
+        plugin.virtual.stop()(none)
+        plugin.virtual.pre_snapshot()(none)
+        plugin.virtual.post_snapshot()(snapshot)
+        plugin.virtual.status(cache_ttl=60)(status)
+        plugin.virtual.initialize()(none)
+        plugin.virtual.mount_specification()(impl(
+            lambda kwargs: MountSpecification(
+                [Mount(mount.remote_environment, mount.mount_path)
+                 for mount in kwargs['virtual_source'].mounts],
+                OwnershipSpecification(1, 2))))
+
+    @staticmethod
+    def test_all_wrappers_in_parallel(plugin_class):
+        plugin = plugin_class(definition_cache_size=16, lazy_definitions=True)
+        TestConcurrentPlugin.register_all(plugin)
+        plugin.enable_metrics()
+        requests = _requests('ENVIRONMENT')
+        specs = sorted(requests, key=lambda spec: spec.wrapper)
+        expected = dict((spec, _wrapper(plugin, spec)(requests[spec]))
+                        for spec in specs)
+        plugin.metrics.reset()
+
+        def run(index):
+            for iteration in range(20):
+                # Each thread goes through the wrappers in a different order.
+                for spec in specs[index:] + specs[:index]:
+                    response = _wrapper(plugin, spec)(requests[spec])
+                    assert response == expected[spec]
+
+        _run_threads(run)
+        snapshot = plugin.metrics.snapshot()
+        for spec in specs:
+            if spec.caches_status:
+                continue
+            count = snapshot[spec.operation.value]['impl']['count']
+            wrappers = [s for s in specs if s.operation == spec.operation]
+            assert count == THREADS * 20 * len(wrappers)
+
+    @staticmethod
+    def test_max_operations_per_environment(plugin_class):
+        plugin = plugin_class(max_operations_per_environment=2)
+        assert plugin.environment_limiter.max_operations == 2
+        tracker = _ConcurrencyTracker()
+        TestConcurrentPlugin.register_all(plugin, tracker)
+        requests = [_requests('ENVIRONMENT-{}'.format(i)) for i in range(2)]
+        specs = [_dispatch.REPOSITORY_DISCOVERY, _dispatch.DIRECT_PRE_SNAPSHOT,
+                 _dispatch.START_STAGING, _dispatch.VIRTUAL_START]
+
+        def run(index):
+            spec = specs[index % len(specs)]
+            _wrapper(plugin, spec)(requests[index % 2][spec])
+
+        _run_threads(run, 16)
+        assert tracker.max_running == {'ENVIRONMENT-0': 2, 'ENVIRONMENT-1': 2}
+
+    @staticmethod
+    def test_no_limit_by_default(plugin_class):
+        plugin = plugin_class()
+        assert plugin.environment_limiter is None
+        tracker = _ConcurrencyTracker()
+        TestConcurrentPlugin.register_all(plugin, tracker)
+        request = _requests('ENVIRONMENT')[_dispatch.VIRTUAL_START]
+
+        _run_threads(lambda index: plugin.virtual._internal_start(request))
+        assert tracker.max_running['ENVIRONMENT'] > 2
+
+    @staticmethod
+    def test_cached_status_not_limited(plugin_class):
+        plugin = plugin_class(max_operations_per_environment=1)
+        TestConcurrentPlugin.register_all(plugin)
+        status = _wrapper(plugin, _dispatch.VIRTUAL_STATUS)
+        request = _requests('ENVIRONMENT')[_dispatch.VIRTUAL_STATUS]
+        expected = status(request)
+        limiter = plugin.environment_limiter
+        holding = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            with limiter.limit('ENVIRONMENT'):
+                holding.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        try:
+            holding.wait(5)
+            start = time.time()
+            with deadline_scope(start + 0.05):
+                assert status(request) == expected
+            assert time.time() - start < 0.05
+        finally:
+            release.set()
+            thread.join()
+
+        assert (limiter.waits, limiter.timeouts) == (0, 0)
@@ -0,0 +1,237 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+import json
+import pytest
+from dlpx.virtualization.platform._definitions import (DefinitionCache,
+                                                       LazyDefinition,
+                                                       PluginDefinitions,
+                                                       type_of)
+
+from mock import MagicMock, patch
+import fake_generated_definitions
+from fake_generated_definitions import RepositoryDefinition
+
+TEST_REPOSITORY_JSON = '{"name": "TestRepository"}'
+
+
+@pytest.fixture
+def generated_definitions():
+    mock_module = MagicMock()
+    mock_module.generated.definitions = fake_generated_definitions
+
+    modules = {
+        'generated': mock_module,
+        'generated.definitions': mock_module.generated.definitions
+    }
+    with patch.dict('sys.modules', modules):
+        yield
+
+
+def from_json(definition_class, json_string):
+    return definition_class.from_dict(json.loads(json_string))
+
+
+class TestDefinitionCache:
+    @staticmethod
+    @pytest.mark.parametrize('max_size', [0, -1, 'bad', None, True, 1.5])
+    def test_bad_max_size(max_size):
+        with pytest.raises(ValueError):
+            DefinitionCache(max_size)
+
+    @staticmethod
+    def test_long_max_size():
+        assert DefinitionCache(long(2)).max_size == 2
+
+    @staticmethod
+    def test_hits_and_misses():
+        cache = DefinitionCache(2)
+        first = cache.get(
+            RepositoryDefinition, TEST_REPOSITORY_JSON, from_json)
+        second = cache.get(
+            RepositoryDefinition, TEST_REPOSITORY_JSON, from_json)
+
+        assert first.name == second.name == 'TestRepository'
+        assert cache.misses == 1
+        assert cache.hits == 1
+        assert len(cache) == 1
+
+    @staticmethod
+    def test_returns_copies():
+        cache = DefinitionCache(2)
+        first = cache.get(
+            RepositoryDefinition, TEST_REPOSITORY_JSON, from_json)
+        first._name = 'Mutated'
+        second = cache.get(
+            RepositoryDefinition, TEST_REPOSITORY_JSON, from_json)
+
+        assert first is not second
+        assert second.name == 'TestRepository'
+
+    @staticmethod
+    def test_keyed_by_class():
+        from fake_generated_definitions import SourceConfigDefinition
+        cache = DefinitionCache(2)
+        cache.get(RepositoryDefinition, TEST_REPOSITORY_JSON, from_json)
+        config = cache.get(
+            SourceConfigDefinition, TEST_REPOSITORY_JSON, from_json)
+
+        assert isinstance(config, SourceConfigDefinition)
+        assert cache.misses == 2
+
+    @staticmethod
+    def test_evicts_least_recently_used():
+        cache = DefinitionCache(2)
+        payloads = ['{{"name": "{}"}}'.format(i) for i in range(3)]
+        cache.get(RepositoryDefinition, payloads[0], from_json)
+        cache.get(RepositoryDefinition, payloads[1], from_json)
+        # Touch the first payload so the second one is evicted.
+        cache.get(RepositoryDefinition, payloads[0], from_json)
+        cache.get(RepositoryDefinition, payloads[2], from_json)
+
+        assert len(cache) == 2
+        cache.get(RepositoryDefinition, payloads[0], from_json)
+        assert cache.hits == 2
+        cache.get(RepositoryDefinition, payloads[1], from_json)
+        assert cache.misses == 4
+
+    @staticmethod
+    def test_clear():
+        cache = DefinitionCache(2)
+        cache.get(RepositoryDefinition, TEST_REPOSITORY_JSON, from_json)
+        cache.clear()
+
+        assert len(cache) == 0
+        assert cache.hits == 0
+        assert cache.misses == 0
+
+
+class TestPluginDefinitions:
+    @staticmethod
+    def test_decode_without_cache(generated_definitions):
+        definitions = PluginDefinitions()
+        repository = definitions.decode(
+            'RepositoryDefinition', TEST_REPOSITORY_JSON)
+
+        assert isinstance(repository, RepositoryDefinition)
+        assert repository.name == 'TestRepository'
+        assert definitions.cache is None
+
+    @staticmethod
+    def test_decode_with_cache(generated_definitions):
+        definitions = PluginDefinitions(DefinitionCache(4))
+        definitions.decode('RepositoryDefinition', TEST_REPOSITORY_JSON)
+        definitions.decode('RepositoryDefinition', TEST_REPOSITORY_JSON)
+
+        assert definitions.cache.hits == 1
+        assert definitions.cache.misses == 1
+
+    @staticmethod
+    def test_get_class_resolves_once(generated_definitions):
+        definitions = PluginDefinitions()
+        with patch('importlib.import_module',
+                   return_value=fake_generated_definitions) as import_module:
+            first = definitions.get_class('RepositoryDefinition')
+            second = definitions.get_class('RepositoryDefinition')
+
+        assert first is second is RepositoryDefinition
+        import_module.assert_called_once_with('generated.definitions')
+
+    @staticmethod
+    def test_resolve_all(generated_definitions):
+        definitions = PluginDefinitions()
+        definitions.resolve_all()
+
+        with patch('importlib.import_module') as import_module:
+            definitions.decode('RepositoryDefinition', TEST_REPOSITORY_JSON)
+            definitions.get_class('SnapshotParametersDefinition')
+
+        assert not import_module.called
+
+    @staticmethod
+    def test_encode():
+        encoded = PluginDefinitions().encode(
+            RepositoryDefinition('TestRepository'))
+        assert json.loads(encoded) == {'name': 'TestRepository'}
+
+    @staticmethod
+    def test_plugin_definition_cache(generated_definitions):
+        from dlpx.virtualization.platform import Plugin
+
+        assert Plugin().definition_cache is None
+
+        plugin = Plugin(definition_cache_size=8)
+        assert plugin.definition_cache.max_size == 8
+
+    @staticmethod
+    def test_plugin_warmup(generated_definitions):
+        from dlpx.virtualization.platform import Plugin
+
+        plugin = Plugin()
+        plugin.warmup()
+        plugin.warmup()
+
+        with patch('importlib.import_module') as import_module:
+            plugin.virtual._definitions.get_class('VirtualSourceDefinition')
+
+        assert not import_module.called
+
+
+class TestLazyDefinition:
+    @staticmethod
+    def test_decodes_on_first_access(generated_definitions):
+        definitions = PluginDefinitions(DefinitionCache(4), lazy=True)
+        repository = definitions.decode(
+            'RepositoryDefinition', TEST_REPOSITORY_JSON)
+
+        assert type(repository) is LazyDefinition
+        assert definitions.cache.misses == 0
+
+        assert repository.name == 'TestRepository'
+        assert repository.name == 'TestRepository'
+        assert definitions.cache.misses == 1
+        assert definitions.cache.hits == 0
+
+    @staticmethod
+    def test_isinstance(generated_definitions):
+        definitions = PluginDefinitions(lazy=True)
+        repository = definitions.decode(
+            'RepositoryDefinition', TEST_REPOSITORY_JSON)
+
+        assert isinstance(repository, RepositoryDefinition)
+        assert repository.__class__ is RepositoryDefinition
+        assert type_of(repository) is RepositoryDefinition
+
+    @staticmethod
+    def test_bad_json_raises_on_access(generated_definitions):
+        definitions = PluginDefinitions(lazy=True)
+        repository = definitions.decode('RepositoryDefinition', '{bad')
+
+        with pytest.raises(ValueError):
+            repository.name
+
+    @staticmethod
+    def test_set_attribute(generated_definitions):
+        definitions = PluginDefinitions(lazy=True)
+        repository = definitions.decode(
+            'RepositoryDefinition', TEST_REPOSITORY_JSON)
+        repository._name = 'Mutated'
+
+        assert repository.name == 'Mutated'
+
+    @staticmethod
+    def test_encode(generated_definitions):
+        definitions = PluginDefinitions(lazy=True)
+        repository = definitions.decode(
+            'RepositoryDefinition', TEST_REPOSITORY_JSON)
+
+        assert json.loads(definitions.encode(repository)) == {
+            'name': 'TestRepository'}
+
+    @staticmethod
+    def test_plugin_lazy_definitions(generated_definitions):
+        from dlpx.virtualization.platform import Plugin
+
+        assert not Plugin().discovery._definitions.lazy
+        assert Plugin(lazy_definitions=True).discovery._definitions.lazy
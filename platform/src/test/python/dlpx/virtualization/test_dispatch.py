@@ -0,0 +1,82 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+import pytest
+from dlpx.virtualization import common_pb2
+from dlpx.virtualization.common import RemoteEnvironment
+from dlpx.virtualization.platform import _dispatch
+from dlpx.virtualization.platform import _plugin
+from dlpx.virtualization.platform.exceptions import OperationNotDefinedError
+from dlpx.virtualization.platform.operation import Operation as Op
+from mock import patch
+
+
+class TestDispatch:
+    @staticmethod
+    def test_every_operation_is_registered():
+        assert set(_dispatch.OPERATIONS.keys()) == set(Op)
+        for operation, specs in _dispatch.OPERATIONS.items():
+            assert specs
+            for spec in specs:
+                assert spec.operation == operation
+
+    @staticmethod
+    def test_linked_snapshot_operations_have_direct_and_staged_specs():
+        assert _dispatch.OPERATIONS[Op.LINKED_PRE_SNAPSHOT] == (
+            _dispatch.DIRECT_PRE_SNAPSHOT, _dispatch.STAGED_PRE_SNAPSHOT)
+        assert _dispatch.OPERATIONS[Op.LINKED_POST_SNAPSHOT] == (
+            _dispatch.DIRECT_POST_SNAPSHOT, _dispatch.STAGED_POST_SNAPSHOT)
+
+    @staticmethod
+    @pytest.mark.parametrize('operations_class', [
+        _plugin.DiscoveryOperations,
+        _plugin.LinkedOperations,
+        _plugin.VirtualOperations])
+    def test_specs_match_wrappers(operations_class):
+        prefix = {
+            _plugin.DiscoveryOperations: 'discovery.',
+            _plugin.LinkedOperations: 'linked.',
+            _plugin.VirtualOperations: 'virtual.'}[operations_class]
+        operations = operations_class()
+        for specs in _dispatch.OPERATIONS.values():
+            for spec in specs:
+                if not spec.operation.value.startswith(prefix):
+                    continue
+                assert hasattr(operations, spec.wrapper)
+                assert getattr(operations, spec.impl) is None
+
+    @staticmethod
+    def test_dispatch_operation_not_defined():
+        request = _dispatch.VIRTUAL_STATUS.request_type()
+        with pytest.raises(OperationNotDefinedError) as err_info:
+            _dispatch.dispatch(
+                _plugin.VirtualOperations(), _dispatch.VIRTUAL_STATUS, request)
+
+        assert err_info.value.message == (
+            'An implementation for the virtual.status() operation has not'
+            ' been defined.')
+
+    @staticmethod
+    def test_subset_mounts_decode_each_environment_once():
+        virtual_source = common_pb2.VirtualSource()
+        for i in range(6):
+            mount = virtual_source.mounts.add()
+            mount.remote_environment.name = 'environment{}'.format(i % 2)
+            mount.remote_environment.reference = 'REFERENCE-{}'.format(i % 2)
+            mount.mount_path = '/mnt/{}'.format(i)
+            mount.shared_path = '/shared'
+
+        with patch.object(RemoteEnvironment, 'from_proto',
+                          wraps=RemoteEnvironment.from_proto) as from_proto:
+            mounts = _dispatch._subset_mounts(virtual_source.mounts)
+
+        assert from_proto.call_count == 2
+        assert [m.mount_path for m in mounts] == [
+            '/mnt/{}'.format(i) for i in range(6)]
+        assert all(m.shared_path == '/shared' for m in mounts)
+        assert mounts[0].remote_environment.name == 'environment0'
+        assert mounts[1].remote_environment.name == 'environment1'
+        for i in range(2, 6):
+            assert (mounts[i].remote_environment
+                    is mounts[i % 2].remote_environment)
@@ -0,0 +1,121 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+import pytest
+from dlpx.virtualization.platform import _dispatch
+from dlpx.virtualization.platform.operation import Operation
+
+from mock import MagicMock, patch
+import fake_generated_definitions
+from test_concurrency import _requests
+
+
+class TestHooks:
+    @staticmethod
+    @pytest.fixture
+    def plugin():
+        mock_module = MagicMock()
+        mock_module.generated.definitions = fake_generated_definitions
+
+        modules = {
+            'generated': mock_module,
+            'generated.definitions': mock_module.generated.definitions
+        }
+        with patch.dict('sys.modules', modules):
+            from dlpx.virtualization.platform import Plugin
+            plugin = Plugin()
+            plugin.virtual.start()(lambda virtual_source, repository,
+                                   source_config: None)
+            plugin.virtual.stop()(lambda virtual_source, repository,
+                                  source_config: None)
+            yield plugin
+
+    @staticmethod
+    @pytest.fixture
+    def requests():
+        requests = _requests('ENVIRONMENT')
+        return (requests[_dispatch.VIRTUAL_START],
+                requests[_dispatch.VIRTUAL_STOP])
+
+    @staticmethod
+    def test_no_hooks(plugin):
+        for operations in (plugin.discovery, plugin.linked, plugin.virtual):
+            assert operations._hook_chains is None
+
+    @staticmethod
+    def test_order(plugin, requests):
+        start_request, _ = requests
+        calls = []
+
+        def around(name):
+            def hook(operation, request, proceed):
+                calls.append((name, operation))
+                response = proceed(request)
+                calls.append(('end ' + name, operation))
+                return response
+            return hook
+
+        plugin.hooks.after()(
+            lambda operation, request, response: calls.append(
+                ('after', operation)))
+        plugin.hooks.around(Operation.VIRTUAL_START)(around('outer'))
+        plugin.hooks.before(Operation.VIRTUAL_START)(
+            lambda operation, request: calls.append(('before', operation)))
+        plugin.hooks.around()(around('inner'))
+
+        response = plugin.virtual._internal_start(start_request)
+        assert response.HasField('return_value')
+        assert calls == [(name, Operation.VIRTUAL_START)
+                         for name in ('before', 'outer', 'inner',
+                                      'end inner', 'end outer', 'after')]
+
+    @staticmethod
+    def test_selected_operations(plugin, requests):
+        start_request, stop_request = requests
+        calls = []
+
+        plugin.hooks.before(Operation.VIRTUAL_STOP)(
+            lambda operation, request: calls.append(request))
+
+        plugin.virtual._internal_start(start_request)
+        assert calls == []
+        plugin.virtual._internal_stop(stop_request)
+        assert calls == [stop_request]
+        assert Operation.VIRTUAL_START not in plugin.virtual._hook_chains
+
+    @staticmethod
+    def test_around_without_proceed(plugin, requests):
+        start_request, _ = requests
+        response = _dispatch.VIRTUAL_START.response_type()
+        response.return_value.SetInParent()
+
+        plugin.hooks.around(Operation.VIRTUAL_START)(
+            lambda operation, request, proceed: response)
+        plugin.virtual.start_impl = None
+
+        assert plugin.virtual._internal_start(start_request) is response
+
+    @staticmethod
+    def test_after_not_called_on_error(plugin, requests):
+        start_request, _ = requests
+        calls = []
+
+        def fail(operation, request):
+            raise RuntimeError('hook failed')
+
+        plugin.hooks.before()(fail)
+        plugin.hooks.after()(
+            lambda operation, request, response: calls.append(response))
+
+        with pytest.raises(RuntimeError) as err_info:
+            plugin.virtual._internal_start(start_request)
+        assert str(err_info.value) == 'hook failed'
+        assert calls == []
+
+    @staticmethod
+    @pytest.mark.parametrize('operation', ['virtual.start', None, 1])
+    def test_bad_operation(plugin, operation):
+        with pytest.raises(ValueError):
+            plugin.hooks.before(operation)
+        assert plugin.virtual._hook_chains is None
@@ -0,0 +1,307 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+import os
+import time
+
+import pytest
+from dlpx.virtualization import platform_pb2
+from dlpx.virtualization.platform import _dispatch
+from dlpx.virtualization.platform._memo import (DiskMemoStore,
+                                                MemoryMemoStore,
+                                                OperationMemo)
+from dlpx.virtualization.platform.operation import Operation
+
+from mock import MagicMock, patch
+import fake_generated_definitions
+from fake_generated_definitions import SourceConfigDefinition
+from test_concurrency import _requests
+from test_status_cache import FakeClock
+
+
+@pytest.fixture(params=['memory', 'disk'])
+def make_store(request, tmpdir):
+    def make(max_size=10, ttl=None):
+        if request.param == 'memory':
+            return MemoryMemoStore(max_size, ttl)
+        return DiskMemoStore(str(tmpdir.join('memo')), max_size, ttl)
+    return make
+
+
+class TestMemoStores:
+    @staticmethod
+    @pytest.mark.parametrize('max_size', [0, -1, None, 1.5, True])
+    def test_bad_max_size(make_store, max_size):
+        with pytest.raises(ValueError):
+            make_store(max_size=max_size)
+
+    @staticmethod
+    @pytest.mark.parametrize('ttl', [0, -1, 'bad', True])
+    def test_bad_ttl(make_store, ttl):
+        with pytest.raises(ValueError):
+            make_store(ttl=ttl)
+
+    @staticmethod
+    def test_get_and_put(make_store):
+        store = make_store()
+        assert store.get('key') is None
+
+        store.put('key', 'response')
+        store.put('other', 'other response')
+        assert store.get('key') == 'response'
+        assert store.get('other') == 'other response'
+        assert len(store) == 2
+
+        store.put('key', 'new response')
+        assert store.get('key') == 'new response'
+        assert len(store) == 2
+
+        store.clear()
+        assert len(store) == 0
+        assert store.get('key') is None
+
+    @staticmethod
+    def test_memory_expires():
+        clock = FakeClock()
+        store = MemoryMemoStore(10, 30, clock)
+        store.put('key', 'response')
+
+        clock.now += 29
+        assert store.get('key') == 'response'
+        clock.now += 1
+        assert store.get('key') is None
+
+    @staticmethod
+    def test_memory_evicts_least_recently_used():
+        store = MemoryMemoStore(2)
+        store.put('a', 'A')
+        store.put('b', 'B')
+        store.get('a')
+        store.put('c', 'C')
+
+        assert store.get('b') is None
+        assert store.get('a') == 'A'
+        assert store.get('c') == 'C'
+
+
+class TestDiskMemoStore:
+    @staticmethod
+    def set_last_used(store, key, seconds_ago):
+        last_used = time.time() - seconds_ago
+        os.utime(os.path.join(store.directory, key), (last_used, last_used))
+
+    @staticmethod
+    def test_survives_reload(tmpdir):
+        directory = str(tmpdir.join('memo'))
+        DiskMemoStore(directory).put('key', 'response')
+        assert DiskMemoStore(directory).get('key') == 'response'
+
+    @staticmethod
+    def test_expires(tmpdir):
+        store = DiskMemoStore(str(tmpdir), ttl=30)
+        store.put('key', 'response')
+
+        TestDiskMemoStore.set_last_used(store, 'key', 29)
+        assert store.get('key') == 'response'
+        # Using the response made it fresh again.
+        assert store.get('key') == 'response'
+        TestDiskMemoStore.set_last_used(store, 'key', 30)
+        assert store.get('key') is None
+        assert len(store) == 0
+
+    @staticmethod
+    def test_evicts_least_recently_used(tmpdir):
+        store = DiskMemoStore(str(tmpdir), max_size=2)
+        store.put('a', 'A')
+        store.put('b', 'B')
+        TestDiskMemoStore.set_last_used(store, 'a', 20)
+        TestDiskMemoStore.set_last_used(store, 'b', 10)
+        store.get('a')
+        store.put('c', 'C')
+
+        assert sorted(os.listdir(str(tmpdir))) == ['a', 'c']
+        assert store.errors == 0
+
+    @staticmethod
+    def test_unwritable_directory(tmpdir):
+        store = DiskMemoStore(str(tmpdir.join('memo')))
+        tmpdir.join('memo').remove()
+
+        store.put('key', 'response')
+        assert store.get('key') is None
+        assert store.errors == 1
+
+
+class TestOperationMemo:
+    @staticmethod
+    @pytest.mark.parametrize('operations', [(), ('virtual.configure',)])
+    def test_bad_operations(operations):
+        with pytest.raises(ValueError):
+            OperationMemo(MemoryMemoStore(), operations, 'plugin:1.0')
+
+    @staticmethod
+    @pytest.mark.parametrize('namespace', [None, '', 1])
+    def test_bad_namespace(namespace):
+        with pytest.raises(ValueError):
+            OperationMemo(
+                MemoryMemoStore(), [Operation.VIRTUAL_CONFIGURE], namespace)
+
+    @staticmethod
+    def test_key():
+        request = platform_pb2.ConfigureRequest()
+        request.repository.parameters.json = '{"name": "repository"}'
+        request.snapshot.parameters.json = '{"name": "snapshot"}'
+        same_request = platform_pb2.ConfigureRequest()
+        same_request.snapshot.parameters.json = '{"name": "snapshot"}'
+        same_request.repository.parameters.json = '{"name": "repository"}'
+
+        memo = OperationMemo(
+            MemoryMemoStore(), [Operation.VIRTUAL_CONFIGURE], 'plugin:1.0')
+
+        key = memo.key(Operation.VIRTUAL_CONFIGURE, request)
+        assert key == memo.key(Operation.VIRTUAL_CONFIGURE, same_request)
+        assert key != memo.key(Operation.VIRTUAL_RECONFIGURE, request)
+        same_request.snapshot.parameters.json = '{"name": "other"}'
+        assert key != memo.key(Operation.VIRTUAL_CONFIGURE, same_request)
+
+    @staticmethod
+    def test_key_namespace():
+        request = platform_pb2.ConfigureRequest()
+        operations = [Operation.VIRTUAL_CONFIGURE]
+        memo = OperationMemo(MemoryMemoStore(), operations, 'plugin:1.0')
+        same_memo = OperationMemo(MemoryMemoStore(), operations, u'plugin:1.0')
+        other_memo = OperationMemo(MemoryMemoStore(), operations, 'plugin:1.1')
+
+        key = memo.key(Operation.VIRTUAL_CONFIGURE, request)
+        assert key == same_memo.key(Operation.VIRTUAL_CONFIGURE, request)
+        assert key != other_memo.key(Operation.VIRTUAL_CONFIGURE, request)
+
+    @staticmethod
+    def test_key_message_type():
+        memo = OperationMemo(
+            MemoryMemoStore(), [Operation.VIRTUAL_CONFIGURE], 'plugin:1.0')
+        request = platform_pb2.ConfigureRequest()
+        other_request = platform_pb2.ReconfigureRequest()
+        assert (request.SerializeToString()
+                == other_request.SerializeToString())
+
+        assert (memo.key(Operation.VIRTUAL_CONFIGURE, request)
+                != memo.key(Operation.VIRTUAL_CONFIGURE, other_request))
+
+    @staticmethod
+    def test_damaged_response():
+        store = MemoryMemoStore()
+        memo = OperationMemo(
+            store, [Operation.VIRTUAL_CONFIGURE], 'plugin:1.0')
+        store.put('key', 'not a response')
+
+        assert memo.get('key', platform_pb2.ConfigureResponse) is None
+        assert memo.misses == 1
+
+
+class TestMemoizedPlugin:
+    @staticmethod
+    @pytest.fixture
+    def plugin():
+        mock_module = MagicMock()
+        mock_module.generated.definitions = fake_generated_definitions
+
+        modules = {
+            'generated': mock_module,
+            'generated.definitions': mock_module.generated.definitions
+        }
+        with patch.dict('sys.modules', modules):
+            from dlpx.virtualization.platform import Plugin
+            yield Plugin()
+
+    @staticmethod
+    def test_retry_skips_implementation(plugin, make_store):
+        calls = []
+
+        @plugin.virtual.configure()
+        def configure_impl(virtual_source, repository, snapshot):
+            calls.append(snapshot)
+            return SourceConfigDefinition('source_config')
+
+        memo = plugin.enable_memoization(
+            make_store(), 'plugin:1.0', Operation.VIRTUAL_CONFIGURE)
+        assert plugin.memo is memo
+        requests = _requests('ENVIRONMENT')
+        request = requests[_dispatch.VIRTUAL_CONFIGURE]
+
+        response = plugin.virtual._internal_configure(request)
+        assert plugin.virtual._internal_configure(request) == response
+        assert len(calls) == 1
+        assert (memo.hits, memo.misses) == (1, 1)
+
+        request.snapshot.parameters.json = '{"name": "other"}'
+        plugin.virtual._internal_configure(request)
+        assert len(calls) == 2
+
+        plugin.disable_memoization()
+        assert plugin.memo is None
+        plugin.virtual._internal_configure(request)
+        assert len(calls) == 3
+
+    @staticmethod
+    def test_failure_not_memoized(plugin):
+        calls = []
+
+        @plugin.virtual.configure()
+        def configure_impl(virtual_source, repository, snapshot):
+            calls.append(snapshot)
+            if len(calls) == 1:
+                raise RuntimeError('failed')
+            return SourceConfigDefinition('source_config')
+
+        plugin.enable_memoization(
+            MemoryMemoStore(), 'plugin:1.0', Operation.VIRTUAL_CONFIGURE)
+        request = _requests('ENVIRONMENT')[_dispatch.VIRTUAL_CONFIGURE]
+
+        with pytest.raises(RuntimeError):
+            plugin.virtual._internal_configure(request)
+        plugin.virtual._internal_configure(request)
+        plugin.virtual._internal_configure(request)
+        assert len(calls) == 2
+
+    @staticmethod
+    def test_only_chosen_operations(plugin):
+        calls = []
+
+        @plugin.virtual.start()
+        def start_impl(virtual_source, repository, source_config):
+            calls.append(virtual_source)
+
+        plugin.enable_memoization(
+            MemoryMemoStore(), 'plugin:1.0', Operation.VIRTUAL_CONFIGURE)
+        request = _requests('ENVIRONMENT')[_dispatch.VIRTUAL_START]
+
+        plugin.virtual._internal_start(request)
+        plugin.virtual._internal_start(request)
+        assert len(calls) == 2
+        assert plugin.memo.misses == 0
+
+    @staticmethod
+    def test_shared_store_namespaces(plugin):
+        from dlpx.virtualization.platform import Plugin
+        store = MemoryMemoStore()
+        other_plugin = Plugin()
+        calls = []
+
+        for memoized in (plugin, other_plugin):
+            @memoized.virtual.configure()
+            def configure_impl(virtual_source, repository, snapshot):
+                calls.append(snapshot)
+                return SourceConfigDefinition('source_config')
+
+        plugin.enable_memoization(
+            store, 'plugin:1.0', Operation.VIRTUAL_CONFIGURE)
+        other_plugin.enable_memoization(
+            store, 'plugin:1.1', Operation.VIRTUAL_CONFIGURE)
+        request = _requests('ENVIRONMENT')[_dispatch.VIRTUAL_CONFIGURE]
+
+        plugin.virtual._internal_configure(request)
+        other_plugin.virtual._internal_configure(request)
+        assert len(calls) == 2
+        assert len(store) == 2
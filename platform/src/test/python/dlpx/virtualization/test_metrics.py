@@ -0,0 +1,135 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+import logging
+import threading
+
+import pytest
+from dlpx.virtualization.platform import (LatencyHistogram, MetricsFlusher,
+                                          OperationMetrics, Phase)
+from dlpx.virtualization.platform.operation import Operation as Op
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super(RecordingHandler, self).__init__()
+        self.messages = []
+        self.flushed = threading.Event()
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+        self.flushed.set()
+
+
+class TestLatencyHistogram:
+    @staticmethod
+    def test_empty():
+        histogram = LatencyHistogram()
+
+        assert histogram.count == 0
+        assert histogram.mean is None
+        assert histogram.percentile(50) is None
+
+    @staticmethod
+    def test_record():
+        histogram = LatencyHistogram()
+        for seconds in (0.001, 0.002, 0.003, 0.5):
+            histogram.record(seconds)
+
+        assert histogram.count == 4
+        assert histogram.total == pytest.approx(0.506)
+        assert histogram.min == 0.001
+        assert histogram.max == 0.5
+        assert histogram.mean == pytest.approx(0.1265)
+
+    @staticmethod
+    def test_percentiles_within_a_factor_of_two():
+        histogram = LatencyHistogram()
+        for i in range(1, 101):
+            histogram.record(i / 1000.0)
+
+        assert 0.05 <= histogram.percentile(50) <= 0.1
+        assert 0.09 <= histogram.percentile(90) <= 0.18
+        assert histogram.percentile(100) == 0.1
+        assert histogram.percentile(0) == histogram.percentile(1)
+
+    @staticmethod
+    def test_overflow_bucket():
+        histogram = LatencyHistogram()
+        histogram.record(1e6)
+
+        assert histogram.percentile(99) == 1e6
+
+    @staticmethod
+    @pytest.mark.parametrize('percent', [-1, 101])
+    def test_bad_percentile(percent):
+        with pytest.raises(ValueError):
+            LatencyHistogram().percentile(percent)
+
+
+class TestOperationMetrics:
+    @staticmethod
+    def test_record_and_snapshot():
+        metrics = OperationMetrics()
+        metrics.record(Op.VIRTUAL_STATUS, Phase.IMPL, 0.25)
+        metrics.record(Op.VIRTUAL_STATUS, Phase.IMPL, 0.75)
+        metrics.record(Op.VIRTUAL_START, Phase.DECODE, 0.001)
+
+        snapshot = metrics.snapshot()
+        assert sorted(snapshot) == ['virtual.start()', 'virtual.status()']
+        assert snapshot['virtual.status()']['impl']['count'] == 2
+        assert snapshot['virtual.status()']['impl']['mean'] == 0.5
+        assert list(snapshot['virtual.start()']) == ['decode']
+
+    @staticmethod
+    def test_histogram_is_a_copy():
+        metrics = OperationMetrics()
+        assert metrics.histogram(Op.VIRTUAL_STATUS, Phase.IMPL) is None
+
+        metrics.record(Op.VIRTUAL_STATUS, Phase.IMPL, 0.25)
+        histogram = metrics.histogram(Op.VIRTUAL_STATUS, Phase.IMPL)
+        histogram.record(1)
+
+        assert metrics.histogram(Op.VIRTUAL_STATUS, Phase.IMPL).count == 1
+
+    @staticmethod
+    def test_reset():
+        metrics = OperationMetrics()
+        metrics.record(Op.VIRTUAL_STATUS, Phase.IMPL, 0.25)
+        metrics.reset()
+
+        assert metrics.snapshot() == {}
+
+    @staticmethod
+    def test_format():
+        metrics = OperationMetrics()
+        metrics.record(Op.VIRTUAL_STATUS, Phase.ENCODE, 0.002)
+        metrics.record(Op.VIRTUAL_STATUS, Phase.IMPL, 0.001)
+
+        lines = metrics.format().splitlines()
+        assert len(lines) == 3
+        assert lines[1].split()[:3] == ['virtual.status()', 'impl', '1']
+        assert lines[2].split()[:3] == ['virtual.status()', 'encode', '1']
+
+
+class TestMetricsFlusher:
+    @staticmethod
+    @pytest.mark.parametrize('interval', [0, -1, None, 'bad', True])
+    def test_bad_interval(interval):
+        with pytest.raises(ValueError):
+            MetricsFlusher(OperationMetrics(), RecordingHandler(), interval)
+
+    @staticmethod
+    def test_flushes_periodically():
+        metrics = OperationMetrics()
+        metrics.record(Op.VIRTUAL_STATUS, Phase.IMPL, 0.001)
+        handler = RecordingHandler()
+
+        flusher = MetricsFlusher(metrics, handler, 0.01)
+        flusher.start()
+        assert handler.flushed.wait(5)
+        flusher.stop()
+
+        assert len(handler.messages) >= 2
+        assert 'virtual.status()' in handler.messages[0]
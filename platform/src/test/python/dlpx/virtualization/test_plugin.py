@@ -7,6 +7,7 @@ import pytest
 import sys
 from dlpx.virtualization import platform_pb2
 from dlpx.virtualization.common import (RemoteConnection, RemoteEnvironment, RemoteHost, RemoteUser)
+from dlpx.virtualization.common import remaining_time
 from dlpx.virtualization import common_pb2
 from dlpx.virtualization.platform import _plugin
 from dlpx.virtualization.platform.exceptions import (
@@ -433,6 +434,150 @@ class TestPlugin:
         expected_source_config = TEST_SNAPSHOT_JSON
         assert config.parameters.json == expected_source_config
 
+    @staticmethod
+    def test_invoke_virtual_configure(
+            my_plugin, virtual_source, repository, snapshot):
+
+        @my_plugin.virtual.configure()
+        def virtual_configure_impl(virtual_source, repository, snapshot):
+            TestPlugin.assert_plugin_args(virtual_source=virtual_source,
+                                          repository=repository,
+                                          snapshot=snapshot)
+            return SourceConfigDefinition(snapshot.name)
+
+        configure_request = platform_pb2.ConfigureRequest()
+        TestPlugin.setup_request(request=configure_request,
+                                 virtual_source=virtual_source,
+                                 repository=repository,
+                                 snapshot=snapshot)
+
+        response_bytes = my_plugin.invoke(
+            'virtual.configure', configure_request.SerializeToString())
+        config_response = platform_pb2.ConfigureResponse.FromString(
+            response_bytes)
+        assert config_response == my_plugin.virtual._internal_configure(
+            configure_request)
+        config = config_response.return_value.source_config
+        assert config.parameters.json == TEST_SNAPSHOT_JSON
+
+    @staticmethod
+    def test_invoke_upgrade(my_plugin):
+
+        @my_plugin.upgrade.snapshot('1.1')
+        def upgrade_snapshot(snapshot):
+            snapshot['upgraded'] = True
+            return snapshot
+
+        upgrade_request = platform_pb2.UpgradeRequest()
+        upgrade_request.migration_ids.append('1.1')
+        upgrade_request.snapshots.add().snapshot.parameters.json = (
+            TEST_SNAPSHOT_JSON)
+
+        upgrade_response = platform_pb2.UpgradeResponse.FromString(
+            my_plugin.invoke('upgrade.upgrade',
+                             upgrade_request.SerializeToString()))
+        upgraded = upgrade_response.return_value.snapshots[0]
+        assert json.loads(upgraded.parameters.json) == {
+            'name': TEST_SNAPSHOT, 'upgraded': True}
+
+    @staticmethod
+    def test_invoke_operation_names(my_plugin):
+        names = my_plugin.operation_names()
+        assert len(names) == 23
+        assert 'linked.direct_pre_snapshot' in names
+        assert 'linked.staged_pre_snapshot' in names
+        assert 'discovery.source_config_batch' in names
+
+    @staticmethod
+    def test_invoke_unknown_operation(my_plugin):
+        with pytest.raises(ValueError) as err_info:
+            my_plugin.invoke('virtual.configure()', '')
+        assert str(err_info.value).startswith(
+            "Unknown operation 'virtual.configure()'. Expected one of"
+            " discovery.repository, ")
+
+    @staticmethod
+    def test_invoke_with_timeout(
+            my_plugin, virtual_source, repository, snapshot):
+        remaining = []
+
+        @my_plugin.virtual.configure()
+        def virtual_configure_impl(virtual_source, repository, snapshot):
+            remaining.append(remaining_time())
+            return SourceConfigDefinition(snapshot.name)
+
+        configure_request = platform_pb2.ConfigureRequest()
+        TestPlugin.setup_request(request=configure_request,
+                                 virtual_source=virtual_source,
+                                 repository=repository,
+                                 snapshot=snapshot)
+
+        my_plugin.invoke('virtual.configure',
+                         configure_request.SerializeToString())
+        my_plugin.invoke('virtual.configure',
+                         configure_request.SerializeToString(), timeout=30)
+        assert remaining[0] is None
+        assert 0 < remaining[1] <= 30
+        assert remaining_time() is None
+
+    @staticmethod
+    def test_operation_timeouts(virtual_source, repository, snapshot):
+        from dlpx.virtualization.platform import Plugin
+        from dlpx.virtualization.platform.operation import Operation
+
+        timed_plugin = Plugin(
+            operation_timeouts={Operation.VIRTUAL_CONFIGURE: 30})
+        remaining = []
+
+        @timed_plugin.virtual.configure()
+        def virtual_configure_impl(virtual_source, repository, snapshot):
+            remaining.append(remaining_time())
+            return SourceConfigDefinition(snapshot.name)
+
+        configure_request = platform_pb2.ConfigureRequest()
+        TestPlugin.setup_request(request=configure_request,
+                                 virtual_source=virtual_source,
+                                 repository=repository,
+                                 snapshot=snapshot)
+        request_bytes = configure_request.SerializeToString()
+
+        mock_module = MagicMock()
+        mock_module.generated.definitions = fake_generated_definitions
+        modules = {
+            'generated': mock_module,
+            'generated.definitions': mock_module.generated.definitions
+        }
+        with patch.dict('sys.modules', modules):
+            timed_plugin.virtual._internal_configure(configure_request)
+            # The shorter of the two timeouts applies.
+            timed_plugin.invoke('virtual.configure', request_bytes,
+                                timeout=5)
+            timed_plugin.invoke('virtual.configure', request_bytes,
+                                timeout=60)
+        assert 25 < remaining[0] <= 30
+        assert 0 < remaining[1] <= 5
+        assert 25 < remaining[2] <= 30
+
+    @staticmethod
+    @pytest.mark.parametrize('timeout', [0, -1, '10', True])
+    def test_bad_timeout(my_plugin, timeout):
+        from dlpx.virtualization.platform import Plugin
+        from dlpx.virtualization.platform.operation import Operation
+
+        with pytest.raises(ValueError):
+            Plugin(operation_timeouts={Operation.VIRTUAL_START: timeout})
+        with pytest.raises(ValueError):
+            my_plugin.invoke('virtual.start', '', timeout=timeout)
+
+    @staticmethod
+    def test_timeout_of_unknown_operation():
+        from dlpx.virtualization.platform import Plugin
+
+        with pytest.raises(ValueError) as err_info:
+            Plugin(operation_timeouts={'virtual.start': 10})
+        assert str(err_info.value) == (
+            "Timeouts can only be set for Operations. Found 'virtual.start'")
+
     @staticmethod
     def test_virtual_configure_return_incorrect_type(
         my_plugin, virtual_source, repository, snapshot):
@@ -676,6 +821,269 @@ class TestPlugin:
 
         assert virtual_status_response.return_value.status == expected_status
 
+    @staticmethod
+    def test_virtual_status_with_definition_cache(
+        virtual_source, repository, source_config):
+
+        from dlpx.virtualization.platform import Plugin, Status
+
+        cached_plugin = Plugin(definition_cache_size=16)
+
+        @cached_plugin.virtual.status()
+        def virtual_status_impl(virtual_source, repository, source_config):
+            TestPlugin.assert_plugin_args(virtual_source=virtual_source,
+                                          repository=repository,
+                                          source_config=source_config)
+            # Mutating the arguments must not leak into later operations.
+            repository._name = 'Mutated'
+            return Status.ACTIVE
+
+        virtual_status_request = platform_pb2.VirtualStatusRequest()
+        TestPlugin.setup_request(request=virtual_status_request,
+                                 virtual_source=virtual_source,
+                                 repository=repository,
+                                 source_config=source_config)
+
+        mock_module = MagicMock()
+        mock_module.generated.definitions = fake_generated_definitions
+        modules = {
+            'generated': mock_module,
+            'generated.definitions': mock_module.generated.definitions
+        }
+        with patch.dict('sys.modules', modules):
+            cached_plugin.virtual._internal_status(virtual_status_request)
+            cached_plugin.virtual._internal_status(virtual_status_request)
+
+        # The virtual source, repository and source config are decoded once.
+        assert cached_plugin.definition_cache.misses == 3
+        assert cached_plugin.definition_cache.hits == 3
+
+    @staticmethod
+    def test_virtual_reconfigure_with_lazy_definitions(
+        virtual_source, repository, source_config, snapshot):
+
+        from dlpx.virtualization.platform import Plugin
+
+        lazy_plugin = Plugin(definition_cache_size=16, lazy_definitions=True)
+
+        @lazy_plugin.virtual.reconfigure()
+        def reconfigure_impl(virtual_source, repository, source_config,
+                             snapshot):
+            assert isinstance(repository, RepositoryDefinition)
+            # Only the source config is used, and returned as is.
+            return source_config
+
+        reconfigure_request = platform_pb2.ReconfigureRequest()
+        TestPlugin.setup_request(request=reconfigure_request,
+                                 virtual_source=virtual_source,
+                                 repository=repository,
+                                 source_config=source_config,
+                                 snapshot=snapshot)
+
+        mock_module = MagicMock()
+        mock_module.generated.definitions = fake_generated_definitions
+        modules = {
+            'generated': mock_module,
+            'generated.definitions': mock_module.generated.definitions
+        }
+        with patch.dict('sys.modules', modules):
+            reconfigure_response = lazy_plugin.virtual._internal_reconfigure(
+                reconfigure_request)
+
+        expected_source_config = TEST_SOURCE_CONFIG_JSON
+        assert (reconfigure_response.return_value.source_config.parameters.json
+                == expected_source_config)
+        # Only the source config that was returned has been decoded.
+        assert lazy_plugin.definition_cache.misses == 1
+
+    @staticmethod
+    def test_virtual_status_metrics(
+        my_plugin, virtual_source, repository, source_config):
+        from dlpx.virtualization.platform import Status
+
+        @my_plugin.virtual.status()
+        def virtual_status_impl(virtual_source, repository, source_config):
+            return Status.ACTIVE
+
+        virtual_status_request = platform_pb2.VirtualStatusRequest()
+        TestPlugin.setup_request(request=virtual_status_request,
+                                 virtual_source=virtual_source,
+                                 repository=repository,
+                                 source_config=source_config)
+
+        assert my_plugin.metrics is None
+        metrics = my_plugin.enable_metrics()
+        assert my_plugin.metrics is metrics
+
+        my_plugin.virtual._internal_status(virtual_status_request)
+        my_plugin.virtual._internal_status(virtual_status_request)
+
+        phases = metrics.snapshot()['virtual.status()']
+        assert sorted(phases) == ['decode', 'encode', 'impl', 'validate']
+        for summary in phases.values():
+            assert summary['count'] == 2
+
+        my_plugin.disable_metrics()
+        my_plugin.virtual._internal_status(virtual_status_request)
+        assert my_plugin.metrics is None
+        assert metrics.snapshot()['virtual.status()']['impl']['count'] == 2
+
+    @staticmethod
+    def test_enable_metrics_flush_requires_handler(my_plugin):
+        with pytest.raises(ValueError):
+            my_plugin.enable_metrics(flush_interval=60)
+
+    @staticmethod
+    def test_enable_metrics_bad_flush_interval_keeps_metrics(my_plugin):
+        import logging
+        metrics = my_plugin.enable_metrics()
+
+        with pytest.raises(ValueError):
+            my_plugin.enable_metrics(
+                flush_interval=0, handler=logging.NullHandler())
+        assert my_plugin.metrics is metrics
+
+    @staticmethod
+    def test_metrics_time_yielded_results_as_impl(my_plugin, connection):
+        now = [0]
+
+        @my_plugin.discovery.repository()
+        def repository_discovery_impl(source_connection):
+            for _ in range(3):
+                now[0] += 1
+                yield RepositoryDefinition(TEST_REPOSITORY)
+
+        repository_discovery_request = (
+            platform_pb2.RepositoryDiscoveryRequest())
+        repository_discovery_request.source_connection.CopyFrom(connection)
+
+        metrics = my_plugin.enable_metrics()
+        with patch('timeit.default_timer', side_effect=lambda: now[0]):
+            my_plugin.discovery._internal_repository(
+                repository_discovery_request)
+
+        phases = metrics.snapshot()['discovery.repository()']
+        assert phases['impl']['total'] == 3
+        assert phases['encode']['total'] == 0
+
+    @staticmethod
+    def test_virtual_status_cache(
+        my_plugin, virtual_source, repository, source_config):
+        from dlpx.virtualization.platform import Status
+        statuses = [Status.ACTIVE, Status.INACTIVE, Status.ACTIVE]
+
+        @my_plugin.virtual.status(cache_ttl=30)
+        def virtual_status_impl(virtual_source, repository, source_config):
+            return statuses.pop(0)
+
+        @my_plugin.virtual.stop()
+        def stop_impl(virtual_source, repository, source_config):
+            pass
+
+        status_request = platform_pb2.VirtualStatusRequest()
+        stop_request = platform_pb2.StopRequest()
+        for request in (status_request, stop_request):
+            TestPlugin.setup_request(request=request,
+                                     virtual_source=virtual_source,
+                                     repository=repository,
+                                     source_config=source_config)
+
+        def status():
+            response = my_plugin.virtual._internal_status(status_request)
+            return response.return_value.status
+
+        assert status() == Status.ACTIVE.value
+        assert status() == Status.ACTIVE.value
+        my_plugin.virtual._internal_stop(stop_request)
+        assert status() == Status.INACTIVE.value
+
+        cache = my_plugin.virtual.status_cache
+        assert cache.ttl == 30
+        assert (cache.hits, cache.misses, cache.invalidations) == (1, 2, 1)
+
+    @staticmethod
+    def test_virtual_status_cache_overlapping_start(
+        my_plugin, virtual_source, repository, source_config):
+        import threading
+        from dlpx.virtualization.platform import Status
+        state = [Status.INACTIVE]
+        read = threading.Event()
+        started = threading.Event()
+
+        @my_plugin.virtual.status(cache_ttl=30)
+        def virtual_status_impl(virtual_source, repository, source_config):
+            status = state[0]
+            read.set()
+            # Returns the state read before start changed it.
+            started.wait(5)
+            return status
+
+        @my_plugin.virtual.start()
+        def start_impl(virtual_source, repository, source_config):
+            read.wait(5)
+            state[0] = Status.ACTIVE
+
+        status_request = platform_pb2.VirtualStatusRequest()
+        start_request = platform_pb2.StartRequest()
+        for request in (status_request, start_request):
+            TestPlugin.setup_request(request=request,
+                                     virtual_source=virtual_source,
+                                     repository=repository,
+                                     source_config=source_config)
+
+        def status():
+            response = my_plugin.virtual._internal_status(status_request)
+            return response.return_value.status
+
+        overlapping = []
+        thread = threading.Thread(
+            target=lambda: overlapping.append(status()))
+        thread.start()
+        my_plugin.virtual._internal_start(start_request)
+        started.set()
+        thread.join()
+
+        assert overlapping == [Status.INACTIVE.value]
+        assert status() == Status.ACTIVE.value
+        assert status() == Status.ACTIVE.value
+        assert my_plugin.virtual.status_cache.hits == 1
+
+    @staticmethod
+    def test_virtual_status_cache_per_source(
+        my_plugin, virtual_source, repository, source_config):
+        from dlpx.virtualization.platform import Status
+        calls = []
+
+        @my_plugin.virtual.status(cache_ttl=30, cache_size=1)
+        def virtual_status_impl(virtual_source, repository, source_config):
+            calls.append(virtual_source.guid)
+            return Status.ACTIVE
+
+        status_request = platform_pb2.VirtualStatusRequest()
+        TestPlugin.setup_request(request=status_request,
+                                 virtual_source=virtual_source,
+                                 repository=repository,
+                                 source_config=source_config)
+        other_request = platform_pb2.VirtualStatusRequest()
+        other_request.CopyFrom(status_request)
+        other_request.virtual_source.guid = 'other-guid'
+
+        my_plugin.virtual._internal_status(status_request)
+        my_plugin.virtual._internal_status(other_request)
+        my_plugin.virtual._internal_status(other_request)
+        # Only one source fits in the cache.
+        my_plugin.virtual._internal_status(status_request)
+
+        assert calls == [TEST_GUID, 'other-guid', TEST_GUID]
+
+    @staticmethod
+    def test_virtual_status_not_cached_by_default(my_plugin):
+        @my_plugin.virtual.status()
+        def virtual_status_impl(virtual_source, repository, source_config):
+            pass
+
+        assert my_plugin.virtual.status_cache is None
+
     @staticmethod
     def test_virtual_initialize(
         my_plugin, virtual_source, repository, source_config):
@@ -787,6 +1195,106 @@ class TestPlugin:
             ".fake_generated_definitions.RepositoryDefinition'.")
 
 
+    @staticmethod
+    def test_repository_discovery_generator(my_plugin, connection):
+
+        @my_plugin.discovery.repository()
+        def repository_discovery_impl(source_connection):
+            TestPlugin.assert_connection(source_connection)
+            for _ in range(3):
+                yield RepositoryDefinition(TEST_REPOSITORY)
+
+        repository_discovery_request = (
+            platform_pb2.RepositoryDiscoveryRequest())
+        repository_discovery_request.source_connection.CopyFrom(connection)
+
+        repository_discovery_response = (
+            my_plugin.discovery._internal_repository(
+                repository_discovery_request))
+        repositories = repository_discovery_response.return_value.repositories
+        assert len(repositories) == 3
+        for repository in repositories:
+            assert repository.parameters.json == TEST_REPOSITORY_JSON
+
+    @staticmethod
+    def test_repository_discovery_generator_bad_type(my_plugin, connection):
+
+        @my_plugin.discovery.repository()
+        def repository_discovery_impl(source_connection):
+            yield RepositoryDefinition(TEST_REPOSITORY)
+            yield 'string'
+
+        repository_discovery_request = (
+            platform_pb2.RepositoryDiscoveryRequest())
+        repository_discovery_request.source_connection.CopyFrom(connection)
+
+        with pytest.raises(IncorrectReturnTypeError) as err_info:
+            my_plugin.discovery._internal_repository(
+                repository_discovery_request)
+
+        message = err_info.value.message
+        assert message == (
+            "The returned object for the discovery.repository() operation was"
+            " a list of [class 'dlpx.virtualization.fake_generated_definitions"
+            ".RepositoryDefinition', type 'str'] but should be of type 'list"
+            " of dlpx.virtualization.fake_generated_definitions"
+            ".RepositoryDefinition'.")
+
+    @staticmethod
+    def test_repository_discovery_max_results(my_plugin, connection):
+        discovered = []
+
+        @my_plugin.discovery.repository(max_results=2)
+        def repository_discovery_impl(source_connection):
+            try:
+                for i in range(10):
+                    discovered.append(i)
+                    yield RepositoryDefinition(TEST_REPOSITORY)
+            finally:
+                discovered.append('closed')
+
+        repository_discovery_request = (
+            platform_pb2.RepositoryDiscoveryRequest())
+        repository_discovery_request.source_connection.CopyFrom(connection)
+
+        repository_discovery_response = (
+            my_plugin.discovery._internal_repository(
+                repository_discovery_request))
+        repositories = repository_discovery_response.return_value.repositories
+        assert len(repositories) == 2
+        # Discovery stopped as soon as the second repository was yielded.
+        assert discovered == [0, 1, 'closed']
+
+    @staticmethod
+    @pytest.mark.parametrize('max_results', [0, -1, 1.5, 'bad', True])
+    def test_discovery_bad_max_results(my_plugin, max_results):
+        with pytest.raises(ValueError):
+            my_plugin.discovery.repository(max_results=max_results)
+        with pytest.raises(ValueError):
+            my_plugin.discovery.source_config(max_results=max_results)
+
+    @staticmethod
+    def test_source_config_discovery_max_results(
+            my_plugin, connection, repository):
+
+        @my_plugin.discovery.source_config(max_results=1)
+        def source_config_discovery_impl(source_connection, repository):
+            return [SourceConfigDefinition(TEST_SOURCE_CONFIG),
+                    SourceConfigDefinition(TEST_REPOSITORY)]
+
+        source_config_discovery_request = (
+            platform_pb2.SourceConfigDiscoveryRequest())
+        source_config_discovery_request.source_connection.CopyFrom(connection)
+        source_config_discovery_request.repository.CopyFrom(repository)
+
+        source_config_discovery_response = (
+            my_plugin.discovery._internal_source_config(
+                source_config_discovery_request))
+
+        configs = source_config_discovery_response.return_value.source_configs
+        assert len(configs) == 1
+        assert configs[0].parameters.json == TEST_SOURCE_CONFIG_JSON
+
     @staticmethod
     def test_source_config_discovery(my_plugin, connection, repository):
 
@@ -810,6 +1318,148 @@ class TestPlugin:
         for source_config in configs:
             assert source_config.parameters.json == TEST_REPOSITORY_JSON
 
+    @staticmethod
+    def source_config_batch_request(connection, names):
+        batch_request = platform_pb2.SourceConfigDiscoveryBatchRequest()
+        batch_request.source_connection.CopyFrom(connection)
+        for name in names:
+            repository = batch_request.repositories.add()
+            repository.parameters.json = SIMPLE_JSON.format(name)
+        return batch_request
+
+    @staticmethod
+    def test_source_config_discovery_batch(my_plugin, connection):
+        from dlpx.virtualization.platform.exceptions import UserError
+
+        @my_plugin.discovery.source_config(max_workers=2)
+        def source_config_discovery_impl(source_connection, repository):
+            TestPlugin.assert_connection(source_connection)
+            if repository.name == 'user_error':
+                raise UserError('message', 'action', 'output')
+            if repository.name == 'bad_type':
+                return [repository]
+            if repository.name == 'crash':
+                raise KeyError('crash')
+            return [SourceConfigDefinition(repository.name)]
+
+        names = ['first', 'user_error', 'bad_type', 'crash', 'last']
+        batch_response = my_plugin.discovery._internal_source_config_batch(
+            TestPlugin.source_config_batch_request(connection, names))
+
+        responses = batch_response.responses
+        assert len(responses) == len(names)
+        for index in (0, 4):
+            configs = responses[index].return_value.source_configs
+            assert len(configs) == 1
+            assert configs[0].parameters.json == SIMPLE_JSON.format(
+                names[index])
+
+        user_error = responses[1].error.user_error
+        assert (user_error.message, user_error.action, user_error.output) == (
+            'message', 'action', 'output')
+        runtime_error = responses[2].error.plugin_runtime_error
+        assert runtime_error.message.startswith(
+            'The returned object for the discovery.source_config() operation')
+        assert 'Traceback' in runtime_error.call_stack
+        generic_error = responses[3].error.generic_plugin_error
+        assert generic_error.type == 'KeyError'
+        assert generic_error.message == "'crash'"
+
+    @staticmethod
+    def test_source_config_discovery_batch_concurrent(my_plugin, connection):
+        import threading
+        lock = threading.Lock()
+        all_started = threading.Event()
+        started = []
+
+        @my_plugin.discovery.source_config(max_workers=3)
+        def source_config_discovery_impl(source_connection, repository):
+            with lock:
+                started.append(repository.name)
+                if len(started) == 3:
+                    all_started.set()
+            # Only returns promptly if all three run at the same time.
+            assert all_started.wait(5)
+            return [SourceConfigDefinition(repository.name)]
+
+        batch_response = my_plugin.discovery._internal_source_config_batch(
+            TestPlugin.source_config_batch_request(
+                connection, ['a', 'b', 'c']))
+
+        assert [response.WhichOneof('result')
+                for response in batch_response.responses] == [
+                    'return_value'] * 3
+
+    @staticmethod
+    @pytest.mark.parametrize('max_workers', [1, 3])
+    def test_source_config_discovery_batch_system_exit(
+            my_plugin, connection, max_workers):
+        import sys
+        discovered = []
+
+        @my_plugin.discovery.source_config(max_workers=max_workers)
+        def source_config_discovery_impl(source_connection, repository):
+            discovered.append(repository.name)
+            if repository.name == 'exit':
+                # What libs does on an error the plugin can't handle.
+                sys.exit()
+            return [SourceConfigDefinition(repository.name)]
+
+        with pytest.raises(SystemExit):
+            my_plugin.discovery._internal_source_config_batch(
+                TestPlugin.source_config_batch_request(
+                    connection, ['a', 'exit', 'b']))
+        assert 'exit' in discovered
+
+    @staticmethod
+    def test_source_config_discovery_batch_unicode_error(
+            my_plugin, connection):
+
+        @my_plugin.discovery.source_config(max_workers=2)
+        def source_config_discovery_impl(source_connection, repository):
+            if repository.name == 'unicode':
+                raise ValueError(u'caf\xe9')
+            if repository.name == 'utf8':
+                raise ValueError('caf\xc3\xa9')
+            return [SourceConfigDefinition(repository.name)]
+
+        batch_response = my_plugin.discovery._internal_source_config_batch(
+            TestPlugin.source_config_batch_request(
+                connection, ['unicode', 'utf8', 'last']))
+
+        responses = batch_response.responses
+        for index in (0, 1):
+            generic_error = responses[index].error.generic_plugin_error
+            assert generic_error.type == 'ValueError'
+            assert generic_error.message == u'caf\xe9'
+        assert len(responses[2].return_value.source_configs) == 1
+
+    @staticmethod
+    def test_source_config_discovery_batch_empty(my_plugin, connection):
+
+        @my_plugin.discovery.source_config()
+        def source_config_discovery_impl(source_connection, repository):
+            return []
+
+        batch_response = my_plugin.discovery._internal_source_config_batch(
+            TestPlugin.source_config_batch_request(connection, []))
+        assert len(batch_response.responses) == 0
+
+    @staticmethod
+    def test_source_config_discovery_batch_not_defined(my_plugin, connection):
+        from dlpx.virtualization.platform.exceptions import (
+            OperationNotDefinedError)
+
+        with pytest.raises(OperationNotDefinedError):
+            my_plugin.discovery._internal_source_config_batch(
+                TestPlugin.source_config_batch_request(connection, ['a']))
+
+    @staticmethod
+    @pytest.mark.parametrize('max_workers', [0, None, 'bad', True])
+    def test_source_config_discovery_bad_max_workers(my_plugin, max_workers):
+        with pytest.raises(ValueError):
+            my_plugin.discovery.source_config(max_workers=max_workers)
+
     @staticmethod
     def test_direct_pre_snapshot(
         my_plugin, direct_source, repository, source_config):
@@ -1000,6 +1650,39 @@ class TestPlugin:
 
         assert staged_status_response.return_value.status == expected_status
 
+    @staticmethod
+    def test_staged_status_cache(
+        my_plugin, staged_source, repository, source_config):
+        from dlpx.virtualization.platform import Status
+        statuses = [Status.ACTIVE, Status.INACTIVE]
+
+        @my_plugin.linked.status(cache_ttl=30)
+        def staged_status_impl(staged_source, repository, source_config):
+            return statuses.pop(0)
+
+        @my_plugin.linked.start_staging()
+        def start_staging_impl(staged_source, repository, source_config):
+            raise RuntimeError('failed')
+
+        status_request = platform_pb2.StagedStatusRequest()
+        start_request = platform_pb2.StartStagingRequest()
+        for request in (status_request, start_request):
+            TestPlugin.setup_request(request=request,
+                                     staged_source=staged_source,
+                                     repository=repository,
+                                     source_config=source_config)
+
+        def status():
+            response = my_plugin.linked._internal_status(status_request)
+            return response.return_value.status
+
+        assert status() == Status.ACTIVE.value
+        assert status() == Status.ACTIVE.value
+        # Even a failed start may have changed the status.
+        with pytest.raises(RuntimeError):
+            my_plugin.linked._internal_start_staging(start_request)
+        assert status() == Status.INACTIVE.value
+
     @staticmethod
     def test_staged_worker(
         my_plugin, staged_source, repository, source_config):
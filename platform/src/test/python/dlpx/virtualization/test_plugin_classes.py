@@ -2,12 +2,18 @@
 # Copyright (c) 2019 by Delphix. All rights reserved.
 #
 
+import pickle
+
 import pytest
-from dlpx.virtualization.common._common_classes import RemoteEnvironment, RemoteHost
+from dlpx.virtualization.common._common_classes import (RemoteConnection,
+                                                        RemoteEnvironment,
+                                                        RemoteHost,
+                                                        RemoteUser)
 from dlpx.virtualization.common.exceptions import IncorrectTypeError
 from dlpx.virtualization.platform import Mount
 from dlpx.virtualization.platform import OwnershipSpecification
 from dlpx.virtualization.platform import MountSpecification
+from dlpx.virtualization.platform import VirtualSource
 
 
 @pytest.fixture
@@ -106,3 +112,82 @@ class TestPluginClasses:
             " type 'str' but should be of class 'dlpx.virtualization"
             ".platform._plugin_classes.OwnershipSpecification'"
             " if defined.")
+
+
+class TestValueSemantics:
+    @staticmethod
+    @pytest.fixture
+    def connection(remote_environment):
+        return RemoteConnection(remote_environment,
+                                RemoteUser('user', 'user-reference'))
+
+    @staticmethod
+    def test_mount_spec_equal_by_value(remote_environment):
+        def mount_spec():
+            return MountSpecification(
+                [Mount(remote_environment, 'mount_path', 'shared_path')],
+                OwnershipSpecification(10, 10))
+
+        assert mount_spec() == mount_spec()
+        assert not mount_spec() != mount_spec()
+        assert hash(mount_spec()) == hash(mount_spec())
+        assert mount_spec() != MountSpecification(
+            [Mount(remote_environment, 'other_path')])
+
+    @staticmethod
+    def test_mount_as_dict_key(remote_environment):
+        mounts = {Mount(remote_environment, 'mount_path'): 'value'}
+        assert mounts[Mount(remote_environment, 'mount_path')] == 'value'
+        assert Mount(remote_environment, 'other_path') not in mounts
+
+    @staticmethod
+    def test_mount_spec_immutable(remote_environment):
+        mounts = [Mount(remote_environment, 'mount_path')]
+        mount_spec = MountSpecification(mounts)
+        # The mounts are still the list given, as before the classes were
+        # made values.
+        assert mount_spec.mounts is mounts
+        assert mount_spec.mounts == [Mount(remote_environment, 'mount_path')]
+        with pytest.raises(AttributeError):
+            mount_spec.mounts = []
+        with pytest.raises(AttributeError):
+            mount_spec.other = 1
+
+    @staticmethod
+    def test_mount_spec_pickle(remote_environment):
+        mount_spec = MountSpecification(
+            [Mount(remote_environment, 'mount_path', 'shared_path')],
+            OwnershipSpecification(10, 10))
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            assert pickle.loads(
+                pickle.dumps(mount_spec, protocol)) == mount_spec
+
+    @staticmethod
+    def test_virtual_source_mounts_list(connection, remote_environment):
+        mounts = [Mount(remote_environment, 'mount_path')]
+        source = VirtualSource('guid', connection, {}, mounts)
+
+        assert source.mounts is mounts
+        with pytest.raises(AttributeError):
+            source.mounts = []
+
+    @staticmethod
+    def test_value_object_base():
+        from dlpx.virtualization.common import ValueObject
+        for cls in (VirtualSource, Mount, OwnershipSpecification,
+                    MountSpecification):
+            assert issubclass(cls, ValueObject)
+
+    @staticmethod
+    def test_virtual_source_hashed_without_parameters(
+            connection, remote_environment):
+        mounts = [Mount(remote_environment, 'mount_path')]
+        # Unhashable parameters don't prevent hashing the source.
+        source = VirtualSource('guid', connection, {'name': 'a'}, mounts)
+
+        assert source == VirtualSource('guid', connection, {'name': 'a'},
+                                       mounts)
+        assert source != VirtualSource('guid', connection, {'name': 'b'},
+                                       mounts)
+        assert hash(source) == hash(
+            VirtualSource('guid', connection, {'name': 'b'}, mounts))
@@ -0,0 +1,109 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+import pytest
+from dlpx.virtualization.platform._status_cache import StatusCache
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestStatusCache:
+    @staticmethod
+    @pytest.mark.parametrize('ttl', [0, -1, None, 'bad', True])
+    def test_bad_ttl(ttl):
+        with pytest.raises(ValueError):
+            StatusCache(ttl, 10)
+
+    @staticmethod
+    @pytest.mark.parametrize('max_size', [0, -1, None, 1.5, True])
+    def test_bad_max_size(max_size):
+        with pytest.raises(ValueError):
+            StatusCache(30, max_size)
+
+    @staticmethod
+    def test_hits_and_misses():
+        cache = StatusCache(30, 10)
+        assert cache.get('guid') is None
+
+        cache.put('guid', 'response')
+        assert cache.get('guid') == 'response'
+        assert cache.misses == 1
+        assert cache.hits == 1
+
+    @staticmethod
+    def test_expires():
+        clock = FakeClock()
+        cache = StatusCache(30, 10, clock=clock)
+        cache.put('guid', 'response')
+
+        clock.now += 29.9
+        assert cache.get('guid') == 'response'
+        clock.now += 0.1
+        assert cache.get('guid') is None
+        assert len(cache) == 0
+
+    @staticmethod
+    def test_evicts_least_recently_used():
+        cache = StatusCache(30, 2)
+        cache.put('first', 1)
+        cache.put('second', 2)
+        cache.get('first')
+        cache.put('third', 3)
+
+        assert len(cache) == 2
+        assert cache.get('second') is None
+        assert cache.get('first') == 1
+        assert cache.get('third') == 3
+
+    @staticmethod
+    def test_invalidate():
+        cache = StatusCache(30, 10)
+        cache.put('guid', 'response')
+        cache.invalidate('guid')
+        cache.invalidate('unknown')
+
+        assert cache.get('guid') is None
+        assert cache.invalidations == 1
+
+    @staticmethod
+    def test_put_after_invalidate():
+        cache = StatusCache(30, 10)
+        generation = cache.generation()
+        cache.invalidate('guid')
+        cache.put('guid', 'stale', generation)
+        cache.put('other', 'response', generation)
+
+        assert cache.get('guid') is None
+        assert cache.get('other') == 'response'
+
+        cache.put('guid', 'response', cache.generation())
+        assert cache.get('guid') == 'response'
+
+    @staticmethod
+    def test_put_after_forgotten_invalidate():
+        cache = StatusCache(30, 1)
+        generation = cache.generation()
+        cache.invalidate('guid')
+        # Only the last invalidated source is remembered.
+        cache.invalidate('other')
+        cache.put('guid', 'stale', generation)
+
+        assert cache.get('guid') is None
+
+    @staticmethod
+    def test_clear():
+        cache = StatusCache(30, 10)
+        cache.put('guid', 'response')
+        cache.get('guid')
+        cache.invalidate('guid')
+        cache.clear()
+
+        assert len(cache) == 0
+        assert (cache.hits, cache.misses, cache.invalidations) == (0, 0, 0)
@@ -0,0 +1,173 @@
+#
+# Copyright (c) 2019 by Delphix. All rights reserved.
+#
+
+import json
+
+import pytest
+from dlpx.virtualization import platform_pb2
+from dlpx.virtualization.platform import Plugin
+from dlpx.virtualization.platform._codec import JsonCodec
+from dlpx.virtualization.platform._definitions import PluginDefinitions
+from dlpx.virtualization.platform._plugin import UpgradeOperations
+from dlpx.virtualization.platform._upgrade import migration_key
+from dlpx.virtualization.platform.exceptions import (
+    IncorrectReturnTypeError, MigrationIdAlreadyUsedError)
+
+TEST_GUID = '8e1442c2-64ce-48cf-848c-ce4deacca579'
+
+
+@pytest.fixture
+def plugin():
+    return Plugin()
+
+
+def upgrade_request(migration_ids, snapshots=(), linked_sources=()):
+    request = platform_pb2.UpgradeRequest()
+    request.migration_ids.extend(migration_ids)
+    for parameters in snapshots:
+        request.snapshots.add().snapshot.parameters.json = json.dumps(
+            parameters)
+    for parameters in linked_sources:
+        linked_source = request.linked_sources.add().linked_source
+        linked_source.guid = TEST_GUID
+        linked_source.parameters.json = json.dumps(parameters)
+    return request
+
+
+def parameters(objects):
+    return [json.loads(obj.parameters.json) for obj in objects]
+
+
+class TestMigrationKey:
+    @staticmethod
+    def test_orders_numerically():
+        ids = ['1.10', '1.9', '2', '1.9.1', '2019.10.20']
+        assert sorted(ids, key=migration_key) == [
+            '1.9', '1.9.1', '1.10', '2', '2019.10.20']
+
+    @staticmethod
+    @pytest.mark.parametrize('migration_id',
+                             ['', '1.', '.1', '1..2', 'v1', '1.a', 1, None])
+    def test_bad_migration_id(migration_id):
+        with pytest.raises(ValueError):
+            migration_key(migration_id)
+
+
+class TestUpgrade:
+    @staticmethod
+    def test_chains_migrations_in_order(plugin):
+        @plugin.upgrade.snapshot('1.10')
+        def add_version(snapshot):
+            snapshot['version'] = snapshot['version'] + ' and 1.10'
+            return snapshot
+
+        @plugin.upgrade.snapshot('1.9')
+        def rename(snapshot):
+            return {'name': snapshot.pop('old_name'), 'version': '1.9'}
+
+        @plugin.upgrade.snapshot('3')
+        def not_requested(snapshot):
+            raise AssertionError('Migration 3 was not requested')
+
+        request = upgrade_request(
+            ['1.10', '1.9', '2'],
+            snapshots=[{'old_name': 'first'}, {'old_name': 'second'}])
+        response = plugin.upgrade._internal_upgrade(request)
+
+        assert parameters(response.return_value.snapshots) == [
+            {'name': 'first', 'version': '1.9 and 1.10'},
+            {'name': 'second', 'version': '1.9 and 1.10'}]
+
+    @staticmethod
+    def test_decodes_each_object_once():
+        loads = []
+
+        def counting_loads(payload):
+            loads.append(payload)
+            return json.loads(payload)
+
+        upgrade_operations = UpgradeOperations(PluginDefinitions(
+            codec=JsonCodec('counting', counting_loads, json.dumps)))
+
+        @upgrade_operations.snapshot('1')
+        def first(snapshot):
+            snapshot['first'] = True
+            return snapshot
+
+        @upgrade_operations.snapshot('2')
+        def second(snapshot):
+            snapshot['second'] = True
+            return snapshot
+
+        response = upgrade_operations._internal_upgrade(
+            upgrade_request(['1', '2'], snapshots=[{}] * 3))
+
+        assert len(loads) == 3
+        assert parameters(response.return_value.snapshots) == [
+            {'first': True, 'second': True}] * 3
+
+    @staticmethod
+    def test_keeps_objects_without_migrations(plugin):
+        @plugin.upgrade.snapshot('1')
+        def migrate(snapshot):
+            return {'migrated': True}
+
+        request = upgrade_request(
+            ['1'], snapshots=[{}], linked_sources=[{'name': 'linked'}])
+        response = plugin.upgrade._internal_upgrade(request)
+
+        linked_sources = response.return_value.linked_sources
+        assert len(linked_sources) == 1
+        assert linked_sources[0].guid == TEST_GUID
+        assert parameters(linked_sources) == [{'name': 'linked'}]
+        assert parameters(response.return_value.snapshots) == [
+            {'migrated': True}]
+
+    @staticmethod
+    def test_keeps_other_fields(plugin):
+        @plugin.upgrade.linked_source('1')
+        def migrate(linked_source):
+            return {'name': linked_source['name'].upper()}
+
+        request = upgrade_request(['1'], linked_sources=[{'name': 'linked'}])
+        response = plugin.upgrade._internal_upgrade(request)
+
+        linked_sources = response.return_value.linked_sources
+        assert linked_sources[0].guid == TEST_GUID
+        assert parameters(linked_sources) == [{'name': 'LINKED'}]
+
+    @staticmethod
+    def test_bad_return_type(plugin):
+        @plugin.upgrade.snapshot('1')
+        def migrate(snapshot):
+            return 'string'
+
+        with pytest.raises(IncorrectReturnTypeError) as err_info:
+            plugin.upgrade._internal_upgrade(
+                upgrade_request(['1'], snapshots=[{}]))
+
+        assert err_info.value.message == (
+            "The returned object for the upgrade.snapshot() operation was"
+            " type 'str' but should be of type 'dict'.")
+
+    @staticmethod
+    def test_migration_id_already_used(plugin):
+        @plugin.upgrade.snapshot('1.0')
+        def migrate(snapshot):
+            return snapshot
+
+        # The same id may be used by migrations of another type.
+        plugin.upgrade.source_config('1.0')(migrate)
+
+        with pytest.raises(MigrationIdAlreadyUsedError) as err_info:
+            plugin.upgrade.snapshot('1.0')(migrate)
+
+        assert err_info.value.message == (
+            "A migration for upgrade.snapshot() with the migration id '1.0'"
+            " has already been defined.")
+
+    @staticmethod
+    def test_bad_migration_id(plugin):
+        with pytest.raises(ValueError):
+            plugin.upgrade.virtual_source('latest')